@@ -1,106 +1,74 @@
-import os
-import xml.etree.ElementTree as ET
-
-def parse_atom_file(file_path):
+from atom_cache import ResultCache
+from atom_feed import ask_merge
+from atom_index import iter_segment_groups
+from atom_sort import iter_rows
+from atom_spatial import Within, BoundingBox, select_region
+from atom_textindex import select_place, select_text
+from atom_output import open_writer
+
+def search_atom_files(folder_path, search_place, merge=False, output_format='text'):
+    header = "The following took place in " + search_place
+    with ResultCache() as cache, open_writer('displayfiles\\display_search_results.txt', output_format, header=header, use_link=True) as writer:
+        for segment in iter_segment_groups(folder_path, merge):
+            rows = cache.rows(['place', search_place], segment, lambda: select_place(segment, search_place))
+            writer.write_group(segment.source, iter_rows(segment, rows))
+
+    print(f"Search results written to '{writer.path}'")
+
+def search_atom_text(folder_path, query, merge=False, output_format='text'):
+    header = "The following took place near " + query
+    with ResultCache() as cache, open_writer('displayfiles\\display_search_results.txt', output_format, header=header, use_link=True) as writer:
+        for segment in iter_segment_groups(folder_path, merge):
+            rows = cache.rows(['text', query], segment, lambda: select_text(segment, query))
+            writer.write_group(segment.source, iter_rows(segment, rows))
+
+    print(f"Search results written to '{writer.path}'")
+
+def search_atom_region(folder_path, region, description, merge=False, output_format='text'):
+    header = "The following took place " + description
+    key = ['region', type(region).__name__, vars(region)]
+    with ResultCache() as cache, open_writer('displayfiles\\display_search_results.txt', output_format, header=header, use_link=True) as writer:
+        for segment in iter_segment_groups(folder_path, merge):
+            rows = cache.rows(key, segment, lambda: select_region(segment, region))
+            writer.write_group(segment.source, iter_rows(segment, rows))
+
+    print(f"Search results written to '{writer.path}'")
+
+def parse_floats(text, count):
     try:
-        tree = ET.parse(file_path)
-        root = tree.getroot()
-        return root
-    except ET.ParseError as e:
-        print(f"Error parsing file {file_path}: {e}")
+        values = [float(value) for value in text.replace(',', ' ').split()]
+    except ValueError:
         return None
-
-def get_event_data(entry, namespace):
-    title = entry.find('atom:title', namespace).text
-    link = entry.find('atom:link', namespace).get('href')
-    published = entry.find('atom:updated', namespace).text
-    coordinates = entry.find('georss:point', namespace).text
-    elevation = entry.find('georss:elev', namespace).text
-
-    location_parts = title.split(' - ')
-    if len(location_parts) > 1:
-        city_place = location_parts[-1].split(', ')
-        if len(city_place) == 2:
-            city = city_place[0] 
-            place = city_place[1]  
-        else:
-            city, place = '', ''  
-    else:
-        city, place = '', ''
-
-    age = None
-    for category in entry.findall('atom:category', namespace):
-        if category.get('label') == 'Age':
-            age = category.get('term')
-
-    magnitude = None
-    for category in entry.findall('atom:category', namespace):
-        if category.get('label') == 'Magnitude':
-            magnitude = category.get('term')
-
-    event_data = {
-        'title': title,
-        'link': link,
-        'published': published,
-        'coordinates': coordinates,
-        'elevation': elevation,
-        'age': age,
-        'magnitude': magnitude,
-        'city': city,
-        'place': place
-    }
-
-    return event_data
-
-def search_atom_files(folder_path, search_place):
-    namespace = {'atom': 'http://www.w3.org/2005/Atom', 'georss': 'http://www.georss.org/georss'}
-    matching_entries = [] 
-
-    with open('displayfiles\\display_search_results.txt', 'w') as result_file:
-        for filename in os.listdir(folder_path):
-            if filename.endswith('.atom'):
-                file_path = os.path.join(folder_path, filename)
-                root = parse_atom_file(file_path)
-
-                if root is not None:
-                    result_file.write("\n\nThe following took place in " + search_place + "\n")
-                    result_file.write("=" * 40 + "\n\n")
-                    result_file.write(f"File path data was retrieved from: {file_path}\n")
-                    result_file.write("-" * 40 + "\n\n")
-                    result_file.write("All matching entries:\n")
-                    result_file.write("*" * 40 + "\n\n")
-
-                    matching_entries.clear()
-                    for entry in root.findall('atom:entry', namespace):
-                        event_data = get_event_data(entry, namespace)
-                        
-                        if search_place.lower() == event_data['place'].lower():
-                            matching_entries.append(event_data)
-
-                
-                    if matching_entries:
-                        for entry_data in matching_entries:
-                            result_file.write(f"Title: {entry_data['title']}\n")
-                            result_file.write(f"ID: {entry_data['link']}\n")
-                            result_file.write(f"Published: {entry_data['published']}\n")
-                            result_file.write(f"Coordinates: {entry_data['coordinates']}\n")
-                            result_file.write(f"Elevation/Depth: {entry_data['elevation']}\n")
-                            result_file.write(f"Occurred: {entry_data['age']}\n")
-                            result_file.write(f"Magnitude: {entry_data['magnitude']}\n")
-                            result_file.write("-" * 120 + "\n")
-                    else:
-                        result_file.write("No matching entries found.\n")
-
-                    
-                    result_file.write("*" * 40 + "\n")
-
-    print(f"Search results written to 'displayfiles\\display_search_results.txt'")
+    return values if len(values) == count else None
 
 def main():
     folder_path = '25-01-28'  
-    search_place = input("Enter the place (city) to search for: ").strip()
-
-    search_atom_files(folder_path, search_place)
+    search_type = input("Choose search type:\n1. Search by Place\n2. Search within a Radius of a Point\n3. Search inside a Bounding Box\n4. Search by Words in the Location (e.g. 'geysers ca', prefixes allowed)\nEnter choice (1/2/3/4): ").strip()
+
+    if search_type == '1':
+        search_place = input("Enter the place (city) to search for: ").strip()
+        search_atom_files(folder_path, search_place, ask_merge())
+
+    elif search_type == '2':
+        point = parse_floats(input("Enter the centre point (lat, lon): "), 2)
+        radius = parse_floats(input("Enter the radius in km: "), 1)
+        if point is None or radius is None:
+            print("Invalid point or radius.")
+            return
+        region = Within(point[0], point[1], radius[0])
+        search_atom_region(folder_path, region, f"within {radius[0]} km of {point[0]}, {point[1]}", ask_merge())
+
+    elif search_type == '3':
+        box = parse_floats(input("Enter the bounding box (south, west, north, east): "), 4)
+        if box is None or box[0] > box[2]:
+            print("Invalid bounding box.")
+            return
+        region = BoundingBox(*box)
+        search_atom_region(folder_path, region, f"inside {box[0]}, {box[1]} to {box[2]}, {box[3]}", ask_merge())
+
+    elif search_type == '4':
+        query = input("Enter the words to search for: ").strip()
+        search_atom_text(folder_path, query, ask_merge())
 
 if __name__ == "__main__":
     main()
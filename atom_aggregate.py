@@ -0,0 +1,204 @@
+import argparse
+import csv
+import json
+import sys
+from datetime import datetime, timezone
+
+import numpy as np
+
+from atom_cache import add_cache_arguments, cache_from_args
+from atom_filter import DEPTH_BANDS, SECONDS_PER_DAY, segment_columns
+from atom_parallel import find_feed_folders
+from atom_profile import add_profile_arguments, profiled
+from atom_query import EventStore, add_query_arguments, query_from_args
+
+GROUP_KEYS = ('magnitude', 'hour', 'day', 'hour_of_day', 'place', 'depth')
+PERCENTILES = (50, 90, 99)
+
+_BAND_NAMES = list(DEPTH_BANDS)
+_BAND_EDGES = [high for _, high in DEPTH_BANDS.values()][:-1]
+
+
+def group_values(segment, rows, key, width=1.0):
+    """The group of every row under `key`; NaN (or '' for place) where the event lacks the field.
+
+    'magnitude' buckets are `width` wide, 'hour' and 'day' are the epoch second
+    the bucket starts at, and 'depth' is the index of the DEPTH_BANDS band.
+    """
+    if key == 'place':
+        return np.asarray(segment.places, dtype=object)[np.asarray(segment.place, dtype=np.int32)[rows]]
+    columns = segment_columns(segment)
+    if key == 'magnitude':
+        return np.floor(columns['magnitude'][rows] / width) * width
+    if key == 'hour':
+        return np.floor(columns['time'][rows] / 3600) * 3600
+    if key == 'day':
+        return np.floor(columns['time'][rows] / SECONDS_PER_DAY) * SECONDS_PER_DAY
+    if key == 'hour_of_day':
+        return np.floor(np.mod(columns['time'][rows], SECONDS_PER_DAY) / 3600)
+    if key == 'depth':
+        depths = columns['depth'][rows]
+        return np.where(np.isnan(depths), np.nan, np.searchsorted(_BAND_EDGES, depths, 'right'))
+    raise ValueError(f"Unknown group key: {key}")
+
+
+def group_label(key, value):
+    if key == 'place':
+        return value or None
+    if value != value:
+        return None
+    if key == 'magnitude':
+        return round(float(value), 6)
+    if key in ('hour', 'day'):
+        stamp = datetime.fromtimestamp(value, timezone.utc)
+        return stamp.strftime('%Y-%m-%dT%H:00Z' if key == 'hour' else '%Y-%m-%d')
+    if key == 'hour_of_day':
+        return f"{int(value):02d}:00"
+    return _BAND_NAMES[int(value)]
+
+
+def _round(value):
+    return None if value != value else round(float(value), 3)
+
+
+class Aggregation:
+    """Group-by over the rows of any number of segments, reduced in one vectorized pass.
+
+    Each group reports its count, min/max/mean magnitude and the PERCENTILES
+    of depth; with a time key ('hour', 'day') the rows form a histogram.
+    """
+
+    def __init__(self, by, width=1.0):
+        if not by:
+            raise ValueError("Give at least one group key")
+        for key in by:
+            if key not in GROUP_KEYS:
+                raise ValueError(f"Unknown group key: {key}")
+        if width <= 0:
+            raise ValueError("The magnitude bucket width must be positive")
+        self.by = list(by)
+        self.width = width
+        self.groups = [[] for _ in self.by]
+        self.magnitudes = []
+        self.depths = []
+
+    def add(self, segment, rows):
+        columns = segment_columns(segment)
+        for values, key in zip(self.groups, self.by):
+            values.append(group_values(segment, rows, key, self.width))
+        self.magnitudes.append(columns['magnitude'][rows])
+        self.depths.append(columns['depth'][rows])
+
+    def result(self):
+        """One dict per group, in ascending group order."""
+        if not self.magnitudes or not sum(len(values) for values in self.magnitudes):
+            return []
+        labels, codes = [], []
+        for values in self.groups:
+            unique, inverse = np.unique(np.concatenate(values), return_inverse=True)
+            labels.append(unique)
+            codes.append(inverse.reshape(-1))
+        combined, group = np.unique(np.stack(codes, axis=1), axis=0, return_inverse=True)
+        group = group.reshape(-1)
+        count = len(combined)
+        magnitudes = np.concatenate(self.magnitudes)
+        depths = np.concatenate(self.depths)
+
+        counts = np.bincount(group, minlength=count)
+        known = ~np.isnan(magnitudes)
+        known_counts = np.bincount(group[known], minlength=count)
+        sums = np.bincount(group[known], weights=magnitudes[known], minlength=count)
+        with np.errstate(invalid='ignore', divide='ignore'):
+            means = sums / known_counts
+        lows = np.full(count, np.nan)
+        highs = np.full(count, np.nan)
+        np.fmin.at(lows, group, magnitudes)
+        np.fmax.at(highs, group, magnitudes)
+
+        # Depths ordered by (group, depth): each group's depths form one sorted run
+        order = np.lexsort((depths, group))
+        depth_runs = np.searchsorted(group[order], np.arange(count + 1))
+        sorted_depths = depths[order]
+
+        table = []
+        for g in range(count):
+            row = {key: group_label(key, labels[k][combined[g, k]]) for k, key in enumerate(self.by)}
+            row.update(count=int(counts[g]), magnitude_min=_round(lows[g]),
+                       magnitude_max=_round(highs[g]), magnitude_mean=_round(means[g]))
+            run = sorted_depths[depth_runs[g]:depth_runs[g + 1]]
+            run = run[~np.isnan(run)]
+            values = np.percentile(run, PERCENTILES) if len(run) else [np.nan] * len(PERCENTILES)
+            for percent, value in zip(PERCENTILES, values):
+                row[f'depth_p{percent}'] = _round(value)
+            table.append(row)
+        return table
+
+
+def aggregate(store, query, by, width=1.0):
+    """Group the matches of `query` over an EventStore by the `by` keys."""
+    aggregation = Aggregation(by, width)
+    for segment in store.segments():
+        aggregation.add(segment, store.select(query, segment))
+    store.save_cache()
+    return aggregation.result()
+
+
+def write_table(table, out, output_format='text'):
+    if not table:
+        if output_format == 'text':
+            out.write("No matching entries found.\n")
+        return
+    fields = list(table[0])
+    if output_format == 'jsonl':
+        for row in table:
+            out.write(json.dumps(row) + "\n")
+    elif output_format == 'csv':
+        writer = csv.writer(out)
+        writer.writerow(fields)
+        writer.writerows([['' if row[field] is None else row[field] for field in fields] for row in table])
+    else:
+        cells = [[str(field) for field in fields]] + [['-' if row[field] is None else str(row[field]) for field in fields]
+                                                     for row in table]
+        widths = [max(len(line[i]) for line in cells) for i in range(len(fields))]
+        for line in cells:
+            out.write('  '.join(cell.rjust(w) for cell, w in zip(line, widths)) + "\n")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Count and summarise matching events per group.")
+    parser.add_argument('folders', nargs='+', help="snapshot folders, folder globs or a root directory")
+    parser.add_argument('--merge', action='store_true', help="de-duplicate events across every feed")
+    parser.add_argument('--workers', type=int, help="processes used to (re)index feeds; 1 disables the pool")
+    parser.add_argument('--by', action='append', choices=GROUP_KEYS, required=True,
+                        help="group key; repeat for a combined grouping")
+    parser.add_argument('--width', type=float, default=1.0, help="magnitude bucket width")
+    add_query_arguments(parser)
+    add_cache_arguments(parser)
+    add_profile_arguments(parser)
+    parser.set_defaults(output=None)
+    args = parser.parse_args(argv)
+    if args.format == 'binary':
+        parser.error("aggregates are written as text, jsonl or csv")
+    try:
+        query = query_from_args(args)
+        aggregation = Aggregation(args.by, args.width)
+        folders = find_feed_folders(args.folders)
+    except ValueError as e:
+        parser.error(str(e))
+
+    with profiled(args.profile, args.profile_output):
+        store = EventStore(folders, args.merge, args.workers, cache=cache_from_args(args))
+        for segment in store.segments():
+            aggregation.add(segment, store.select(query, segment))
+        store.save_cache()
+        table = aggregation.result()
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8', newline='') as out:
+            write_table(table, out, args.format)
+        print(f"{len(table)} groups for {query.describe()} written to '{args.output}'")
+    else:
+        write_table(table, sys.stdout, args.format)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
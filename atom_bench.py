@@ -0,0 +1,186 @@
+import argparse
+import json
+import os
+import random
+import shutil
+import subprocess
+import sys
+import time
+from datetime import datetime, timedelta, timezone
+
+from atom_feed import ATOM_NS, GEORSS_NS
+from atom_filter import Magnitude, parse_magnitude, select
+from atom_index import INDEX_DIR, open_index
+from atom_output import open_writer
+from atom_sort import iter_rows, select_datetime
+from atom_textindex import select_place
+
+try:
+    import resource
+except ImportError:
+    resource = None
+
+PLACES = [
+    ('The Geysers', 'CA'), ('Cantwell', 'Alaska'), ('Anza', 'CA'), ('Pahala', 'Hawaii'),
+    ('Ridgecrest', 'CA'), ('Petrolia', 'CA'), ('Stanley', 'Idaho'), ('Tonopah', 'Nevada'),
+    ('Volcano', 'Hawaii'), ('Ponce', 'Puerto Rico'), ('Pawnee', 'Oklahoma'), ('Nikiski', 'Alaska'),
+]
+DIRECTIONS = ['N', 'NNE', 'NE', 'ENE', 'E', 'ESE', 'SE', 'SSE', 'S', 'SSW', 'SW', 'WSW', 'W', 'WNW', 'NW', 'NNW']
+AGES = ['Past Hour', 'Past Day', 'Past Week', 'Past Month']
+FEED_START = datetime(2025, 1, 1, tzinfo=timezone.utc)
+
+
+def synthetic_entry(rng, number, updated):
+    magnitude = round(rng.uniform(-0.5, 7.5), 1)
+    city, region = rng.choice(PLACES)
+    return (
+        f'<entry><id>urn:earthquake-usgs-gov:sy:{number}</id>'
+        f'<title>M {magnitude} - {rng.randint(1, 120)} km {rng.choice(DIRECTIONS)} of {city}, {region}</title>'
+        f'<updated>{updated.strftime("%Y-%m-%dT%H:%M:%S")}.{rng.randint(0, 999):03d}Z</updated>'
+        f'<link rel="alternate" type="text/html" href="https://earthquake.usgs.gov/earthquakes/eventpage/sy{number}"/>'
+        f'<summary type="html"><![CDATA[<dl><dt>Depth</dt><dd>synthetic</dd></dl>]]></summary>'
+        f'<georss:point>{rng.uniform(-60, 70):.4f} {rng.uniform(-180, 180):.4f}</georss:point>'
+        f'<georss:elev>{-rng.uniform(0, 700000):.3f}</georss:elev>'
+        f'<category label="Age" term="{rng.choice(AGES)}"/>'
+        f'<category label="Magnitude" term="Magnitude {max(int(magnitude), 0)}"/>'
+        f'</entry>'
+    )
+
+
+def generate_feed(path, first_number, count, start, rng):
+    """Write one USGS-style Atom feed of `count` entries spread over the 30 days after `start`."""
+    with open(path, 'w', encoding='utf-8', buffering=1 << 20) as feed:
+        feed.write(f'<?xml version="1.0"?>\n<feed xmlns="{ATOM_NS}" xmlns:georss="{GEORSS_NS}">'
+                   f'<title>USGS All Earthquakes (synthetic)</title>'
+                   f'<updated>{start.strftime("%Y-%m-%dT%H:%M:%SZ")}</updated>')
+        for number in range(first_number, first_number + count):
+            updated = start + timedelta(seconds=rng.uniform(0, 30 * 86400))
+            feed.write(synthetic_entry(rng, number, updated))
+        feed.write('</feed>\n')
+
+
+def generate_archive(root, entries, entries_per_file=10000, files_per_folder=4, seed=0):
+    """Lay out `entries` synthetic events as dated snapshot folders under `root`; returns the folders."""
+    rng = random.Random(seed)
+    folders = []
+    number = 0
+    while number < entries:
+        day = FEED_START + timedelta(days=len(folders))
+        folder_path = os.path.join(root, day.strftime('%y-%m-%d'))
+        os.makedirs(folder_path, exist_ok=True)
+        folders.append(folder_path)
+        for file_number in range(files_per_folder):
+            if number >= entries:
+                break
+            count = min(entries_per_file, entries - number)
+            file_path = os.path.join(folder_path, f'{day.year}_all_month_{file_number}.atom')
+            generate_feed(file_path, number, count, day, rng)
+            number += count
+    return folders
+
+
+def peak_rss_mb():
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is in kilobytes on Linux and bytes on macOS
+    return peak / (1024 * 1024) if sys.platform == 'darwin' else peak / 1024
+
+
+def mode_rows(mode, segment):
+    """Row numbers each interactive search mode would select, using its index path."""
+    if mode == 'datetime':
+        start = FEED_START.timestamp() + 5 * 86400
+        return select_datetime(segment, start, start + 10 * 86400, 0, 6 * 3600)
+    if mode == 'location':
+        return select_place(segment, 'CA')
+    if mode == 'magnitude_bucket':
+        return select(segment, Magnitude('>=', 3) & Magnitude('<', 4))
+    if mode == 'magnitude_size':
+        return select(segment, parse_magnitude('>=4.5'))
+    raise ValueError(f"Unknown mode: {mode}")
+
+
+MODES = ('datetime', 'location', 'magnitude_bucket', 'magnitude_size')
+
+
+def run_scale(folders, output_dir):
+    """Time ingest, filter and write for every mode over `folders`; returns result rows."""
+    results = []
+
+    def record(mode, phase, seconds, events, matches=None):
+        results.append({
+            'mode': mode, 'phase': phase, 'seconds': round(seconds, 4),
+            'events_per_second': round(events / seconds) if seconds else None,
+            'matches': matches, 'peak_rss_mb': peak_rss_mb(),
+        })
+
+    for folder_path in folders:
+        shutil.rmtree(os.path.join(folder_path, INDEX_DIR), ignore_errors=True)
+
+    started = time.perf_counter()
+    indexes = [open_index(folder_path) for folder_path in folders]
+    total = sum(len(segment) for index in indexes for segment in index.segments)
+    record('all', 'parse', time.perf_counter() - started, total)
+
+    started = time.perf_counter()
+    indexes = [open_index(folder_path) for folder_path in folders]
+    record('all', 'load_index', time.perf_counter() - started, total)
+
+    for mode in MODES:
+        started = time.perf_counter()
+        selections = [(segment, mode_rows(mode, segment)) for index in indexes for segment in index.segments]
+        matches = sum(len(rows) for _, rows in selections)
+        record(mode, 'filter', time.perf_counter() - started, total, matches)
+
+        started = time.perf_counter()
+        with open_writer(os.path.join(output_dir, f'{mode}.txt'), header=mode) as writer:
+            for segment, rows in selections:
+                writer.write_group(segment.source, iter_rows(segment, rows))
+        record(mode, 'write', time.perf_counter() - started, matches, matches)
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the search pipeline on synthetic Atom feeds.")
+    parser.add_argument('--sizes', type=int, nargs='+', default=[1000, 10000, 100000],
+                        help="total entries per run, e.g. 1000 100000 10000000")
+    parser.add_argument('--entries-per-file', type=int, default=10000)
+    parser.add_argument('--files-per-folder', type=int, default=4)
+    parser.add_argument('--workdir', default='bench_data')
+    parser.add_argument('--json', help="also write the results to this JSON file")
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--run', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.run:
+        # Child process: measure one generated archive so peak RSS is per size
+        folders = sorted(os.path.join(args.run, name) for name in os.listdir(args.run)
+                         if os.path.isdir(os.path.join(args.run, name)) and name != 'output')
+        output_dir = os.path.join(args.run, 'output')
+        os.makedirs(output_dir, exist_ok=True)
+        print(json.dumps(run_scale(folders, output_dir)))
+        return
+
+    report = []
+    print(f"{'entries':>10} {'mode':<17} {'phase':<10} {'seconds':>9} {'events/s':>12} {'matches':>9} {'peak MB':>8}")
+    for size in args.sizes:
+        root = os.path.join(args.workdir, str(size))
+        if not os.path.isdir(root):
+            generate_archive(root, size, args.entries_per_file, args.files_per_folder, args.seed)
+        output = subprocess.run([sys.executable, os.path.abspath(__file__), '--run', root],
+                                check=True, capture_output=True, text=True).stdout
+        for row in json.loads(output):
+            row['entries'] = size
+            report.append(row)
+            peak = f"{row['peak_rss_mb']:.1f}" if row['peak_rss_mb'] is not None else 'n/a'
+            print(f"{size:>10} {row['mode']:<17} {row['phase']:<10} {row['seconds']:>9.4f} "
+                  f"{row['events_per_second'] or 0:>12} {row['matches'] if row['matches'] is not None else '':>9} {peak:>8}")
+
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as json_file:
+            json.dump(report, json_file, indent=2)
+
+
+if __name__ == "__main__":
+    main()
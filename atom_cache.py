@@ -0,0 +1,183 @@
+import hashlib
+import json
+import os
+import time
+
+import numpy as np
+
+from atom_index import feed_stat, pack_events, read_segment, write_segment
+
+CACHE_DIR = '.atomcache'
+CACHE_BYTES = 256 << 20
+_MANIFEST = 'entries.json'
+
+
+def fingerprint(segment):
+    """[source, mtime, size] of the feed (or store file) a segment was read from."""
+    return [segment.source, segment.mtime, segment.size]
+
+
+def _write_rows(path, rows):
+    with open(path + '.tmp', 'wb') as rows_file:
+        np.save(rows_file, rows)
+    os.replace(path + '.tmp', path)
+
+
+class ResultCache:
+    """Persistent, size-bounded LRU cache of query results, kept per feed.
+
+    An entry holds the matches of one query in one feed: the selected rows of
+    its index segment, or the matching events themselves when the raw feed is
+    scanned. Entries are keyed on the normalized query and the feed, and
+    stamped with the feed's fingerprint (path, mtime, size). When a feed
+    changes, only that feed's entries are dropped and recomputed; every other
+    feed's results are still served from the cache.
+
+    Entries are files under `path` listed in a JSON manifest. save() evicts the
+    least recently used entries beyond `max_bytes` and writes the manifest
+    back, keeping entries other processes added in the meantime.
+    """
+
+    def __init__(self, path=CACHE_DIR, max_bytes=CACHE_BYTES):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.entries = self._load()
+        self.dropped = set()
+        self.dirty = False
+        self.hits = self.misses = 0
+
+    def _load(self):
+        try:
+            with open(os.path.join(self.path, _MANIFEST), encoding='utf-8') as manifest_file:
+                entries = json.load(manifest_file)
+        except (OSError, ValueError):
+            return {}
+        return entries if isinstance(entries, dict) else {}
+
+    def _name(self, key, source, suffix):
+        return hashlib.sha1(json.dumps([key, source]).encode('utf-8')).hexdigest() + suffix
+
+    def _lookup(self, name, source, stamp):
+        """Path of a current entry, or None; finding a changed feed drops all of its entries."""
+        entry = self.entries.get(name)
+        if entry is not None and entry['fingerprint'] == stamp:
+            self.hits += 1
+            entry['used'] = time.time()
+            self.dirty = True
+            return os.path.join(self.path, name)
+        if entry is not None:
+            self.invalidate(source, stamp)
+        self.misses += 1
+        return None
+
+    def _store(self, name, key, source, stamp, write):
+        path = os.path.join(self.path, name)
+        try:
+            os.makedirs(self.path, exist_ok=True)
+            write(path)
+            size = os.path.getsize(path)
+        except OSError as e:
+            print(f"Could not cache results for {source}: {e}")
+            return
+        self.entries[name] = {'key': key, 'source': source, 'fingerprint': stamp, 'bytes': size, 'used': time.time()}
+        self.dropped.discard(name)
+        self.dirty = True
+
+    def _drop(self, name):
+        self.entries.pop(name, None)
+        self.dropped.add(name)
+        self.dirty = True
+        try:
+            os.remove(os.path.join(self.path, name))
+        except OSError:
+            pass
+
+    def rows(self, key, segment, select):
+        """Rows of `segment` matching `key`: cached, or computed with select() and cached."""
+        name, stamp = self._name(key, segment.source, '.npy'), fingerprint(segment)
+        path = self._lookup(name, segment.source, stamp)
+        if path is not None:
+            try:
+                return np.load(path)
+            except (OSError, ValueError):
+                self._drop(name)
+        rows = select()
+        self._store(name, key, segment.source, stamp, lambda path: _write_rows(path, rows))
+        return rows
+
+    def cached_events(self, key, file_path):
+        """The Events of raw feed `file_path` matching `key`, or None if they are not cached."""
+        stat = feed_stat(file_path)
+        name = self._name(key, file_path, '.idx')
+        path = self._lookup(name, file_path, [file_path, stat.st_mtime_ns, stat.st_size])
+        if path is None:
+            return None
+        segment = read_segment(path, file_path)
+        if segment is None:
+            self._drop(name)
+            return None
+        return list(segment)
+
+    def store_events(self, key, file_path, events):
+        """Cache the Events of raw feed `file_path` matching `key`, packed like an index segment."""
+        stat = feed_stat(file_path)
+        self._store(self._name(key, file_path, '.idx'), key, file_path, [file_path, stat.st_mtime_ns, stat.st_size],
+                    lambda path: write_segment(pack_events(events, file_path), path))
+
+    def invalidate(self, source, stamp=None):
+        """Drop the entries of a feed, or with `stamp` only those made from another version of it."""
+        for name, entry in list(self.entries.items()):
+            if entry['source'] == source and entry['fingerprint'] != stamp:
+                self._drop(name)
+
+    def save(self):
+        """Evict least recently used entries beyond max_bytes and write the manifest."""
+        if not self.dirty:
+            return
+        for name, entry in self._load().items():
+            if name not in self.entries and name not in self.dropped:
+                self.entries[name] = entry
+        total = sum(entry['bytes'] for entry in self.entries.values())
+        for name in sorted(self.entries, key=lambda name: self.entries[name]['used']):
+            if total <= self.max_bytes:
+                break
+            total -= self.entries[name]['bytes']
+            self._drop(name)
+        manifest_path = os.path.join(self.path, _MANIFEST)
+        try:
+            os.makedirs(self.path, exist_ok=True)
+            with open(manifest_path + '.tmp', 'w', encoding='utf-8') as manifest_file:
+                json.dump(self.entries, manifest_file)
+            os.replace(manifest_path + '.tmp', manifest_path)
+        except OSError as e:
+            print(f"Could not save the result cache: {e}")
+            return
+        self.dropped.clear()
+        self.dirty = False
+
+    def stats(self):
+        return {
+            'entries': len(self.entries),
+            'bytes': sum(entry['bytes'] for entry in self.entries.values()),
+            'hits': self.hits,
+            'misses': self.misses,
+        }
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.save()
+
+
+def add_cache_arguments(parser):
+    parser.add_argument('--cache-dir', default=CACHE_DIR, help="where query results are kept between runs")
+    parser.add_argument('--cache-limit', type=float, default=CACHE_BYTES >> 20, metavar='MB',
+                        help="size of the result cache; least recently used results are evicted beyond it")
+    parser.add_argument('--no-cache', action='store_true', help="neither read nor store cached results")
+
+
+def cache_from_args(args):
+    if args.no_cache:
+        return None
+    return ResultCache(args.cache_dir, int(args.cache_limit * (1 << 20)))
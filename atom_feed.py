@@ -0,0 +1,419 @@
+import bz2
+import gzip
+import html
+import io
+import lzma
+import os
+import re
+import tarfile
+import xml.etree.ElementTree as ET
+import zipfile
+import zlib
+from collections import namedtuple
+from datetime import datetime
+
+from atom_profile import counters
+
+ATOM_NS = 'http://www.w3.org/2005/Atom'
+GEORSS_NS = 'http://www.georss.org/georss'
+namespace = {'atom': ATOM_NS, 'georss': GEORSS_NS}
+
+ENTRY_TAG = f'{{{ATOM_NS}}}entry'
+_ID_TAG = f'{{{ATOM_NS}}}id'
+_TITLE_TAG = f'{{{ATOM_NS}}}title'
+_UPDATED_TAG = f'{{{ATOM_NS}}}updated'
+_LINK_TAG = f'{{{ATOM_NS}}}link'
+_CATEGORY_TAG = f'{{{ATOM_NS}}}category'
+_POINT_TAG = f'{{{GEORSS_NS}}}point'
+_ELEV_TAG = f'{{{GEORSS_NS}}}elev'
+
+# Feeds may be stored compressed, alone or inside tar and zip archives, and
+# are decompressed as they are read
+_DECOMPRESSORS = {'.gz': gzip.open, '.bz2': bz2.open, '.xz': lzma.open}
+FEED_SUFFIXES = ('.atom',) + tuple('.atom' + suffix for suffix in _DECOMPRESSORS)
+ARCHIVE_SUFFIXES = ('.tar', '.tar.gz', '.tgz', '.tar.bz2', '.tbz2', '.tar.xz', '.txz', '.zip')
+
+# Raised while reading a damaged compressed feed or archive
+DECODE_ERRORS = (EOFError, zlib.error, lzma.LZMAError, gzip.BadGzipFile, tarfile.TarError, zipfile.BadZipFile)
+
+_MAGNITUDE_RE = re.compile(r'^M\s*(-?[\d.]+)')
+_WORD_RE = re.compile(r'[^\W\d_]+')
+
+# Raw text fields as they appear in the feed, followed by the typed fields
+# derived from them (epoch seconds, magnitude, degrees and depth in km).
+Event = namedtuple('Event', [
+    'id', 'title', 'link', 'updated', 'point', 'elev', 'age', 'magnitude_term',
+    'time', 'magnitude', 'latitude', 'longitude', 'depth',
+])
+
+
+def parse_updated(updated):
+    """Convert an Atom 'updated' timestamp to epoch seconds."""
+    try:
+        return datetime.fromisoformat(updated.replace('Z', '+00:00')).timestamp()
+    except (AttributeError, ValueError):
+        return None
+
+
+def parse_title_magnitude(title):
+    match = _MAGNITUDE_RE.match(title or '')
+    if match:
+        try:
+            return float(match.group(1))
+        except ValueError:
+            return None
+    return None
+
+
+def parse_point(point):
+    try:
+        lat, lon = point.split()
+        return float(lat), float(lon)
+    except (AttributeError, ValueError):
+        return None, None
+
+
+def parse_depth(elev):
+    """georss:elev is metres above sea level; depth is returned in km."""
+    try:
+        return -float(elev) / 1000.0
+    except (TypeError, ValueError):
+        return None
+
+
+def split_place(title):
+    """Split a title like 'M 1.0 - 2 km NNE of The Geysers, CA' into (city, place)."""
+    location_parts = (title or '').split(' - ')
+    if len(location_parts) > 1:
+        city_place = location_parts[-1].split(', ')
+        if len(city_place) == 2:
+            return city_place[0], city_place[1]
+    return '', ''
+
+
+def tokenize(text):
+    """Lower-cased words of a piece of text, ignoring numbers and punctuation."""
+    return _WORD_RE.findall((text or '').lower())
+
+
+def location_tokens(title):
+    """Distinct words of a title's location text, e.g. 'NNE of The Geysers, CA'."""
+    return set(tokenize((title or '').split(' - ', 1)[-1]))
+
+
+def parse_entry(entry):
+    """Build an Event from an atom:entry element in a single pass over its children."""
+    entry_id = title = link = updated = point = elev = age = magnitude_term = None
+    for child in entry:
+        tag = child.tag
+        if tag == _CATEGORY_TAG:
+            label = child.get('label')
+            if label == 'Age':
+                age = child.get('term')
+            elif label == 'Magnitude':
+                magnitude_term = child.get('term')
+        elif tag == _TITLE_TAG:
+            title = child.text
+        elif tag == _ID_TAG:
+            entry_id = child.text
+        elif tag == _UPDATED_TAG:
+            updated = child.text
+        elif tag == _LINK_TAG:
+            if link is None:
+                link = child.get('href')
+        elif tag == _POINT_TAG:
+            point = child.text
+        elif tag == _ELEV_TAG:
+            elev = child.text
+
+    latitude, longitude = parse_point(point)
+    return Event(
+        entry_id, title, link, updated, point, elev, age, magnitude_term,
+        parse_updated(updated), parse_title_magnitude(title), latitude, longitude, parse_depth(elev),
+    )
+
+
+def iter_events(source, skip_ids=None):
+    """Stream Events from an Atom feed path or binary file, clearing every entry once it has been read.
+
+    Entries whose atom:id is in `skip_ids` are dropped before they are decoded.
+    """
+    stream = open_feed(source) if isinstance(source, str) else source
+    try:
+        context = ET.iterparse(stream, events=('start', 'end'))
+        _, root = next(context)
+        for kind, elem in context:
+            if kind == 'end' and elem.tag == ENTRY_TAG:
+                if not skip_ids or elem.findtext(_ID_TAG) not in skip_ids:
+                    yield parse_entry(elem)
+                root.clear()
+    except (ET.ParseError, *DECODE_ERRORS) as e:
+        print(f"Error parsing file {source_name(source)}: {e}")
+    finally:
+        if stream is not source:
+            stream.close()
+
+
+_XML_DECLARATION_RE = re.compile(rb'<\?xml[^>]*\?>')
+_ENCODING_RE = re.compile(rb'encoding\s*=\s*["\']([\w.-]+)["\']')
+_ROOT_RE = re.compile(rb'<([\w.-]+:)?feed(?=[\s/>])[^>]*')
+_NAMESPACE_RE = re.compile(rb'xmlns(?::([\w.-]+))?\s*=\s*["\']([^"\']*)["\']')
+# Comments, CDATA sections and processing instructions are matched whole, so
+# that markup quoted inside them never counts as an entry boundary or a field
+_SECTIONS = ((b'<!--', b'-->'), (b'<![CDATA[', b']]>'), (b'<?', b'?>'))
+_SKIPPED = b'|'.join(re.escape(opener) + b'.*?' + re.escape(closer) for opener, closer in _SECTIONS)
+
+
+# Where each raw text field lives, as (namespace, local name), and how the
+# typed fields are derived from them
+_TEXT_FIELDS = {
+    'id': (ATOM_NS, 'id'), 'title': (ATOM_NS, 'title'), 'updated': (ATOM_NS, 'updated'),
+    'point': (GEORSS_NS, 'point'), 'elev': (GEORSS_NS, 'elev'),
+}
+_TYPED_FIELDS = {
+    'time': ('updated', parse_updated),
+    'magnitude': ('title', parse_title_magnitude),
+    'latitude': ('point', lambda point: parse_point(point)[0]),
+    'longitude': ('point', lambda point: parse_point(point)[1]),
+    'depth': ('elev', parse_depth),
+}
+
+
+class RawFeed:
+    """A feed held as bytes, whose entries are decoded one field at a time on demand.
+
+    A field is read straight from the entry's bytes with a regular expression
+    for that one element, so filtering on magnitude or time never builds the
+    XML tree of an entry. Anything the expression cannot read unambiguously
+    (CDATA, child elements, namespaces declared inside the entry, a feed not
+    in UTF-8) falls back to parsing just that entry with ElementTree, and
+    event() fully parses only the entries that are asked for.
+    """
+
+    def __init__(self, data):
+        self.data = data
+        declaration = _XML_DECLARATION_RE.match(data)
+        encoding = _ENCODING_RE.search(declaration.group()) if declaration else None
+        self.utf8 = encoding is None or encoding.group(1).lower() in (b'utf-8', b'utf8', b'us-ascii', b'ascii')
+        root = _ROOT_RE.search(data)
+        if root is None:
+            raise ET.ParseError("no <feed> element")
+        prefixes = {uri: prefix for prefix, uri in _NAMESPACE_RE.findall(root.group())}
+        # Entry start and end tags, spelled out when the feed declares the Atom prefix
+        entry = prefixes.get(ATOM_NS.encode())
+        entry = rb'(?:[\w.-]+:)?entry' if entry is None else re.escape(entry + b':' if entry else b'') + b'entry'
+        tokens = re.compile(_SKIPPED + b'|<(/?)' + entry + rb'(?=[\s/>])', re.S)
+        # Re-wrapping an entry in the feed's own start tag keeps its namespaces in scope
+        self.wrapper = (declaration.group() if declaration else b'') + root.group() + b'>'
+        self.closer = b'</' + (root.group(1) or b'') + b'feed>'
+        self.patterns = {}
+        for field, (uri, local) in _TEXT_FIELDS.items():
+            prefix = prefixes.get(uri.encode())
+            if prefix is not None:
+                name = re.escape(prefix + b':' + local.encode() if prefix else local.encode())
+                self.patterns[field] = (re.compile(b'<' + name + rb'(?:\s[^>]*)?>([^<]*)</' + name + b'>'),
+                                        re.compile(b'<' + name + rb'[\s/>]'))
+        self.spans = []
+        start = None
+        for token in tokens.finditer(data):
+            close = token.group(1)
+            if close is None:
+                continue
+            if not close:
+                start = token.start()
+            elif start is not None:
+                end = data.find(b'>', token.end())
+                if end < 0:
+                    break
+                self.spans.append((start, end + 1))
+                start = None
+
+    def __len__(self):
+        return len(self.spans)
+
+    def element(self, i):
+        start, end = self.spans[i]
+        return ET.fromstring(self.wrapper + self.data[start:end] + self.closer)[0]
+
+    def _quoted(self, i, match):
+        """Whether a match may lie in a comment, CDATA section or processing instruction of entry i.
+
+        A section opened before the match and not closed before it may hold
+        it; the rare false alarm only sends the field to the ElementTree path.
+        """
+        start, position = self.spans[i][0], match.start()
+        for opener, closer in _SECTIONS:
+            section = self.data.rfind(opener, start, position)
+            if section >= 0 and self.data.find(closer, section + len(opener), position) < 0:
+                return True
+        return False
+
+    def text(self, i, field):
+        """One raw text field ('id', 'title', 'updated', 'point' or 'elev') of entry i."""
+        patterns = self.patterns.get(field)
+        start, end = self.spans[i]
+        if patterns is not None and self.utf8 and self.data.find(b'xmlns', start, end) < 0:
+            match = patterns[0].search(self.data, start, end)
+            if match is not None and not self._quoted(i, match):
+                value = match.group(1)
+                if b'\r' not in value:
+                    value = value.decode('utf-8')
+                    return (html.unescape(value) if '&' in value else value) or None
+            elif match is None and all(self._quoted(i, element)
+                                       for element in patterns[1].finditer(self.data, start, end)):
+                return None
+        uri, local = _TEXT_FIELDS[field]
+        child = self.element(i).find(f'{{{uri}}}{local}')
+        return None if child is None else child.text
+
+    def values(self, field, rows):
+        """A typed field ('time', 'magnitude', 'latitude', 'longitude' or 'depth') of the given entries."""
+        source, parse = _TYPED_FIELDS[field]
+        return [parse(self.text(i, source)) for i in rows]
+
+    def event(self, i):
+        return parse_entry(self.element(i))
+
+
+def read_feed(source):
+    """RawFeed of a feed path or binary file."""
+    with counters.timer('read'):
+        if hasattr(source, 'read'):
+            data = source.read()
+        else:
+            with open_feed(source) as feed:
+                data = feed.read()
+    with counters.timer('parse'):
+        return RawFeed(data)
+
+
+def is_feed_file(path):
+    return path.endswith(FEED_SUFFIXES)
+
+
+def is_archive(path):
+    return path.lower().endswith(ARCHIVE_SUFFIXES)
+
+
+def source_name(source):
+    """A feed path, or the name of a feed stream, for messages."""
+    return source if isinstance(source, str) else getattr(source, 'name', source)
+
+
+def _decompressed(stream, name):
+    """`stream` decompressed on the fly when `name` is a compressed feed."""
+    for suffix, opener in _DECOMPRESSORS.items():
+        if name.endswith(suffix):
+            return opener(stream)
+    return stream
+
+
+def split_archive_path(path):
+    """(archive, member) for a feed inside an archive, e.g. 'old/25-01.tar.gz/25-01-28/day.atom'; else (path, None)."""
+    if os.path.exists(path):
+        return path, None
+    archive = path
+    while True:
+        parent = os.path.dirname(archive)
+        if parent == archive:
+            return path, None
+        archive = parent
+        if is_archive(archive) and os.path.isfile(archive):
+            return archive, os.path.relpath(path, archive).replace(os.sep, '/')
+
+
+def open_feed(path):
+    """Binary stream of a feed's XML: a plain or compressed feed file, or a feed inside an archive.
+
+    Compressed data is decompressed as it is read. A member of a tar archive
+    is found by reading the archive from the start, so iter_feed_sources is
+    the way to read every feed of one.
+    """
+    archive_path, member = split_archive_path(path)
+    if member is None:
+        return _decompressed(path, path) if path.endswith(tuple(_DECOMPRESSORS)) else open(path, 'rb')
+    if archive_path.lower().endswith('.zip'):
+        with zipfile.ZipFile(archive_path) as archive:
+            stream = archive.open(member)
+    else:
+        with tarfile.open(archive_path) as archive:
+            try:
+                stream = io.BytesIO(archive.extractfile(member).read())
+            except (KeyError, AttributeError):
+                raise FileNotFoundError(f"No feed {member} in {archive_path}") from None
+    return _decompressed(stream, member)
+
+
+def archive_members(archive_path):
+    """Names of the feeds inside a tar or zip archive."""
+    if archive_path.lower().endswith('.zip'):
+        with zipfile.ZipFile(archive_path) as archive:
+            return [name for name in archive.namelist() if is_feed_file(name)]
+    with tarfile.open(archive_path) as archive:
+        return [info.name for info in archive if info.isfile() and is_feed_file(info.name)]
+
+
+def list_feed_files(folder_path):
+    """Paths of the feeds in a folder or archive; archive members are named as paths under the archive."""
+    if is_archive(folder_path):
+        return [os.path.join(folder_path, name) for name in archive_members(folder_path)]
+    return [os.path.join(folder_path, filename)
+            for filename in os.listdir(folder_path)
+            if is_feed_file(filename)]
+
+
+def iter_feed_sources(folder_path):
+    """Yield (file_path, source) for every feed in a folder or archive.
+
+    For a folder the source is the feed's path. An archive is read front to
+    back in one streaming pass without extracting anything to disk, and the
+    source is a binary stream of the (decompressed) member that stays valid
+    only until the next feed is requested.
+    """
+    if not is_archive(folder_path):
+        for file_path in list_feed_files(folder_path):
+            yield file_path, file_path
+        return
+    try:
+        if folder_path.lower().endswith('.zip'):
+            with zipfile.ZipFile(folder_path) as archive:
+                for info in archive.infolist():
+                    if not info.is_dir() and is_feed_file(info.filename):
+                        with archive.open(info) as member, _decompressed(member, info.filename) as stream:
+                            yield os.path.join(folder_path, info.filename), stream
+            return
+        with tarfile.open(folder_path, 'r|*') as archive:
+            for info in archive:
+                if info.isfile() and is_feed_file(info.name):
+                    with archive.extractfile(info) as member, _decompressed(member, info.name) as stream:
+                        yield os.path.join(folder_path, info.name), stream
+    except (OSError, *DECODE_ERRORS) as e:
+        print(f"Error reading archive {folder_path}: {e}")
+
+
+def merge_events(event_streams):
+    """Union several event streams keyed on atom:id, keeping the most recently updated record."""
+    merged = {}
+    for events in event_streams:
+        for event in events:
+            current = merged.get(event.id)
+            if current is None or (event.time or 0) > (current.time or 0):
+                merged[event.id] = event
+    return list(merged.values())
+
+
+def ask_merge():
+    """Prompt shared by the interactive scripts for the de-duplicated merge mode."""
+    answer = input("Merge overlapping feeds into one de-duplicated pass? (y/n): ")
+    return answer.strip().lower() == 'y'
+
+
+def format_event(event, use_link=False, magnitude=None):
+    """Render an event in the text layout shared by the search scripts."""
+    entry_id = event.link if use_link else event.id
+    if magnitude is None:
+        magnitude = event.magnitude_term
+    return (f"Title: {event.title}\nID: {entry_id}\nPublished: {event.updated}\n"
+            f"Coordinates: {event.point}\nElevation/Depth: {event.elev}\n"
+            f"Occurred: {event.age if event.age else 'N/A'}\n"
+            f"Magnitude: {magnitude if magnitude else 'N/A'}\n{'-'*120}")
@@ -0,0 +1,425 @@
+import calendar
+import math
+import re
+import time
+import weakref
+import xml.etree.ElementTree as ET
+from datetime import timedelta
+from itertools import islice
+
+import numpy as np
+
+from atom_feed import DECODE_ERRORS, iter_events, read_feed, source_name
+from atom_index import NUMERIC_COLUMNS
+from atom_profile import counters
+
+SECONDS_PER_DAY = 86400
+SCAN_BLOCK = 1024
+
+# Magnitude ranges whose partitions hold more than this share of a segment
+# are cheaper to answer with one pass over the whole column.
+PARTITION_SHARE = 0.25
+
+# Conventional earthquake depth classes in km, each [low, high)
+DEPTH_BANDS = {'shallow': (None, 70), 'intermediate': (70, 300), 'deep': (300, None)}
+
+_OPERATORS = {
+    '<=': np.less_equal,
+    '>=': np.greater_equal,
+    '<': np.less,
+    '>': np.greater,
+    '=': np.equal,
+}
+
+_RANGE_RE = re.compile(r'^(-?[\d.]+)\s*-\s*(-?[\d.]+)$')
+
+
+class Predicate:
+    """Base class for filters evaluated as boolean masks over a segment's columns."""
+
+    def mask(self, columns):
+        raise NotImplementedError
+
+    def __and__(self, other):
+        return And(self, other)
+
+    def __or__(self, other):
+        return Or(self, other)
+
+
+class And(Predicate):
+    def __init__(self, *predicates):
+        self.predicates = predicates
+
+    def mask(self, columns):
+        if not self.predicates:
+            return np.ones(len(columns['time']), dtype=bool)
+        result = self.predicates[0].mask(columns)
+        for predicate in self.predicates[1:]:
+            # Later predicates are skipped once nothing is left, so their
+            # columns are never decoded by a lazy column source
+            if not result.any():
+                break
+            result &= predicate.mask(columns)
+        return result
+
+
+class Or(Predicate):
+    def __init__(self, *predicates):
+        self.predicates = predicates
+
+    def mask(self, columns):
+        if not self.predicates:
+            return np.zeros(len(columns['time']), dtype=bool)
+        result = self.predicates[0].mask(columns)
+        for predicate in self.predicates[1:]:
+            if result.all():
+                break
+            result |= predicate.mask(columns)
+        return result
+
+
+class Magnitude(Predicate):
+    """Compare the magnitude from the title with one of <, <=, >, >=, =."""
+
+    def __init__(self, operator, value):
+        if operator not in _OPERATORS:
+            raise ValueError(f"Unknown magnitude operator: {operator}")
+        self.operator = operator
+        self.value = float(value)
+
+    def mask(self, columns):
+        return _OPERATORS[self.operator](columns['magnitude'], self.value)
+
+
+class TimeWindow(Predicate):
+    """Events updated at or after `start` and before `end` (epoch seconds, either may be None)."""
+
+    def __init__(self, start=None, end=None):
+        self.start = start
+        self.end = end
+
+    def mask(self, columns):
+        times = columns['time']
+        result = ~np.isnan(times)
+        if self.start is not None:
+            result &= times >= self.start
+        if self.end is not None:
+            result &= times < self.end
+        return result
+
+
+class TimeOfDay(Predicate):
+    """Events whose UTC time of day lies between `start` and `end` seconds, inclusive."""
+
+    def __init__(self, start, end):
+        self.start = start
+        self.end = end
+
+    def mask(self, columns):
+        seconds = np.mod(columns['time'], SECONDS_PER_DAY)
+        return (seconds >= self.start) & (seconds <= self.end)
+
+
+class DepthRange(Predicate):
+    """Events whose depth in km lies between `low` and `high`, inclusive by default (either may be None)."""
+
+    def __init__(self, low=None, high=None, low_inclusive=True, high_inclusive=True):
+        self.low = low
+        self.high = high
+        self.low_inclusive = low_inclusive
+        self.high_inclusive = high_inclusive
+
+    def mask(self, columns):
+        depths = columns['depth']
+        result = ~np.isnan(depths)
+        if self.low is not None:
+            result &= depths >= self.low if self.low_inclusive else depths > self.low
+        if self.high is not None:
+            result &= depths <= self.high if self.high_inclusive else depths < self.high
+        return result
+
+
+def parse_magnitude(expression):
+    """Turn '2.5', '=2.5', '>2', '<=3.0' and similar into a Magnitude predicate.
+
+    A range such as '1.0-3.7' includes both ends.
+    """
+    expression = expression.strip()
+    match = _RANGE_RE.match(expression)
+    if match:
+        low, high = float(match.group(1)), float(match.group(2))
+        if low > high:
+            raise ValueError(f"Empty magnitude range: {expression}")
+        return And(Magnitude('>=', low), Magnitude('<=', high))
+    for operator in ('<=', '>=', '<', '>', '='):
+        if expression.startswith(operator):
+            return Magnitude(operator, expression[len(operator):])
+    return Magnitude('=', expression)
+
+
+def parse_depth_range(expression):
+    """Turn a DEPTH_BANDS name, '<10', '>=300' or a km range such as '0-10' into a DepthRange.
+
+    Bands include their upper edge only as the lower edge of the next band;
+    a range includes both ends.
+    """
+    expression = expression.strip()
+    if expression.lower() in DEPTH_BANDS:
+        low, high = DEPTH_BANDS[expression.lower()]
+        return DepthRange(low, high, high_inclusive=False)
+    match = _RANGE_RE.match(expression)
+    if match:
+        low, high = float(match.group(1)), float(match.group(2))
+        if low > high:
+            raise ValueError(f"Empty depth range: {expression}")
+        return DepthRange(low, high)
+    operator = next((operator for operator in ('<=', '>=', '<', '>', '=') if expression.startswith(operator)), '')
+    try:
+        value = float(expression[len(operator):])
+    except ValueError:
+        raise ValueError(f"Unknown depth: {expression}; give a band ({', '.join(DEPTH_BANDS)}) or km") from None
+    if operator in ('', '='):
+        return DepthRange(value, value)
+    if operator.startswith('<'):
+        return DepthRange(None, value, high_inclusive=operator == '<=')
+    return DepthRange(value, None, low_inclusive=operator == '>=')
+
+
+def depth_bounds(predicates):
+    """(low, high, low_inclusive, high_inclusive) allowed by the DepthRange predicates among `predicates`.
+
+    As with magnitude_bounds, And is looked through and anything else is
+    ignored. None if no predicate limits the depth.
+    """
+    low = high = None
+    low_inclusive = high_inclusive = True
+    found = False
+    pending = list(predicates)
+    while pending:
+        predicate = pending.pop()
+        if isinstance(predicate, And):
+            pending.extend(predicate.predicates)
+            continue
+        if not isinstance(predicate, DepthRange):
+            continue
+        found = True
+        if predicate.low is not None and (low is None or predicate.low > low or
+                                          (predicate.low == low and not predicate.low_inclusive)):
+            low, low_inclusive = predicate.low, predicate.low_inclusive
+        if predicate.high is not None and (high is None or predicate.high < high or
+                                           (predicate.high == high and not predicate.high_inclusive)):
+            high, high_inclusive = predicate.high, predicate.high_inclusive
+    return (low, high, low_inclusive, high_inclusive) if found else None
+
+
+def magnitude_bounds(predicates):
+    """(low, high, low_inclusive, high_inclusive) allowed by the Magnitude predicates among `predicates`.
+
+    And is looked through; other predicates are ignored, so the bounds may
+    be wider than the predicates but never narrower. None if no predicate
+    limits the magnitude.
+    """
+    low = high = None
+    low_inclusive = high_inclusive = True
+    found = False
+    pending = list(predicates)
+    while pending:
+        predicate = pending.pop()
+        if isinstance(predicate, And):
+            pending.extend(predicate.predicates)
+            continue
+        if not isinstance(predicate, Magnitude):
+            continue
+        found = True
+        operator, value = predicate.operator, predicate.value
+        if operator in ('>', '>=', '='):
+            inclusive = operator != '>'
+            if low is None or value > low or (value == low and not inclusive):
+                low, low_inclusive = value, inclusive
+        if operator in ('<', '<=', '='):
+            inclusive = operator != '<'
+            if high is None or value < high or (value == high and not inclusive):
+                high, high_inclusive = value, inclusive
+    return (low, high, low_inclusive, high_inclusive) if found else None
+
+
+def date_window(start_date, end_date):
+    """TimeWindow covering whole UTC days from start_date through end_date."""
+    start = calendar.timegm(start_date.timetuple()) if start_date else None
+    end = calendar.timegm((end_date + timedelta(days=1)).timetuple()) if end_date else None
+    return TimeWindow(start, end)
+
+
+def time_of_day(start_time, end_time):
+    """TimeOfDay between two datetime.time values."""
+    def seconds(value):
+        return value.hour * 3600 + value.minute * 60 + value.second + value.microsecond / 1e6
+    return TimeOfDay(seconds(start_time), seconds(end_time))
+
+
+def segment_columns(segment):
+    """Zero-copy NumPy views over a segment's numeric columns."""
+    return {name: np.asarray(segment.columns[name], dtype=np.float64) for name in NUMERIC_COLUMNS}
+
+
+def select(segment, predicate):
+    """Row numbers of the events in a segment that satisfy the predicate."""
+    if predicate is None:
+        return np.arange(len(segment))
+    return np.flatnonzero(predicate.mask(segment_columns(segment)))
+
+
+_partitions = weakref.WeakKeyDictionary()
+
+
+def magnitude_partitions(segment):
+    """(buckets, offsets, rows): rows whose magnitude rounds down to buckets[i] are rows[offsets[i]:offsets[i + 1]].
+
+    Index segments are partitioned at ingest; for anything else (such as a
+    memory-mapped store) the partitions are built on first use and cached.
+    """
+    if hasattr(segment, 'buckets'):
+        return (np.asarray(segment.buckets, dtype=np.float64), np.asarray(segment.bucket_offsets, dtype=np.int64),
+                np.asarray(segment.bucket_rows, dtype=np.int32))
+    if segment not in _partitions:
+        magnitudes = segment_columns(segment)['magnitude']
+        present = np.flatnonzero(~np.isnan(magnitudes))
+        floors = np.floor(magnitudes[present])
+        buckets, counts = np.unique(floors, return_counts=True)
+        rows = present[np.argsort(floors, kind='stable')].astype(np.int32)
+        _partitions[segment] = (buckets, np.concatenate([[0], np.cumsum(counts)]), rows)
+    return _partitions[segment]
+
+
+def _partition_span(buckets, low, high):
+    # None and an infinite bound both leave that end of the partitions open
+    first = 0 if low is None or low == -math.inf else np.searchsorted(buckets, math.floor(low), 'left')
+    last = len(buckets) if high is None or high == math.inf else np.searchsorted(buckets, math.floor(high), 'right')
+    return first, max(first, last)
+
+
+def partition_size(segment, low=None, high=None):
+    """Number of rows in the magnitude partitions overlapping [low, high]."""
+    buckets, offsets, _ = magnitude_partitions(segment)
+    first, last = _partition_span(buckets, low, high)
+    return int(offsets[last] - offsets[first])
+
+
+def partition_selective(segment, low=None, high=None):
+    """Whether the magnitude partitions overlapping [low, high] hold at most PARTITION_SHARE of the segment."""
+    return partition_size(segment, low, high) <= PARTITION_SHARE * len(segment)
+
+
+def select_magnitude(segment, low=None, high=None, low_inclusive=True, high_inclusive=True):
+    """Rows whose magnitude is between `low` and `high` (either may be None), in feed order.
+
+    Only the partitions overlapping the range are read, and only the two at
+    its ends are checked row by row; a range covering much of the segment is
+    answered with one pass over the magnitude column instead.
+    """
+    buckets, offsets, rows = magnitude_partitions(segment)
+    first, last = _partition_span(buckets, low, high)
+    if offsets[last] - offsets[first] > PARTITION_SHARE * len(segment):
+        predicates = []
+        if low is not None:
+            predicates.append(Magnitude('>=' if low_inclusive else '>', low))
+        if high is not None:
+            predicates.append(Magnitude('<=' if high_inclusive else '<', high))
+        return select(segment, And(*predicates))
+    magnitudes = None
+    parts = []
+    for i in range(first, last):
+        part = rows[offsets[i]:offsets[i + 1]]
+        bucket = buckets[i]
+        if (low is not None and (bucket < low or (bucket == low and not low_inclusive))) or \
+                (high is not None and bucket + 1 > high):
+            if magnitudes is None:
+                magnitudes = segment_columns(segment)['magnitude']
+            values = magnitudes[part]
+            keep = np.ones(len(part), dtype=bool)
+            if low is not None:
+                keep &= values >= low if low_inclusive else values > low
+            if high is not None:
+                keep &= values <= high if high_inclusive else values < high
+            part = part[keep]
+        parts.append(part)
+    if not parts:
+        return np.empty(0, dtype=np.int32)
+    return np.sort(np.concatenate(parts))
+
+
+class RowColumns(dict):
+    """Numeric columns (as from segment_columns) taken at `rows`, each gathered only when a predicate reads it."""
+
+    def __init__(self, columns, rows):
+        super().__init__()
+        self.columns = columns
+        self.rows = rows
+
+    def __missing__(self, name):
+        values = self.columns[name][self.rows]
+        self[name] = values
+        return values
+
+
+class FeedColumns(dict):
+    """Numeric columns of a block of RawFeed entries, each decoded only when a predicate reads it."""
+
+    def __init__(self, feed, rows):
+        super().__init__()
+        self.feed = feed
+        self.rows = rows
+
+    def __missing__(self, name):
+        values = np.array(self.feed.values(name, self.rows), dtype=np.float64)
+        self[name] = values
+        return values
+
+
+def scan_feed(source, filters, block_size=SCAN_BLOCK, name=None):
+    """Filter a raw feed without an index, yielding one list of matching Events per filter for each block.
+
+    `filters` are (predicate, accept) pairs; either may be None. The
+    predicate sees lazily decoded columns, so a magnitude query reads only
+    titles and a time query only <updated>. accept(feed, row) then checks
+    the survivors, and only entries that pass are decoded into Events,
+    once even when several filters match them. `name` labels the feed in
+    messages and counters (by default its path).
+    """
+    name = name or source_name(source)
+    if all(predicate is None and accept is None for predicate, accept in filters):
+        # Nothing to skip: a streaming parse of every entry is cheaper
+        events = iter_events(source)
+        while True:
+            with counters.timer('parse'):
+                block = list(islice(events, block_size))
+            if not block:
+                return
+            counters.count_file(name, entries=len(block))
+            yield [block] * len(filters)
+    try:
+        feed = read_feed(source)
+    except (ET.ParseError, *DECODE_ERRORS) as e:
+        print(f"Error parsing file {name}: {e}")
+        return
+    counters.count_file(name, entries=len(feed), bytes_in=len(feed.data))
+    for first in range(0, len(feed), block_size):
+        started = time.perf_counter()
+        block = range(first, min(first + block_size, len(feed)))
+        columns = FeedColumns(feed, block)
+        selected = []
+        for predicate, accept in filters:
+            rows = block if predicate is None else (np.flatnonzero(predicate.mask(columns)) + first).tolist()
+            selected.append([row for row in rows if accept is None or accept(feed, row)])
+        filtered = time.perf_counter()
+        # Entries matched by several filters are decoded once, in one timed pass per block
+        decoded = {}
+        for row in sorted(set().union(*selected)):
+            try:
+                decoded[row] = feed.event(row)
+            except ET.ParseError as e:
+                print(f"Error parsing entry {row} of {name}: {e}")
+        counters.add_time('filter', filtered - started)
+        counters.add_time('parse', time.perf_counter() - filtered)
+        yield [[decoded[row] for row in rows if row in decoded] for rows in selected]
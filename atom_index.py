@@ -0,0 +1,525 @@
+import json
+import math
+import os
+import struct
+import sys
+from array import array
+from urllib.parse import quote
+
+import numpy as np
+
+from atom_feed import (Event, is_archive, iter_events, iter_feed_sources, list_feed_files, location_tokens,
+                       split_archive_path, split_place)
+from atom_profile import counters
+
+INDEX_DIR = '.atomindex'
+ARCHIVE_MANIFEST = 'members.json'
+_MAGIC = b'ATOMIDX3'
+_HEADER = struct.Struct('<8sQ')
+
+NUMERIC_COLUMNS = ('time', 'magnitude', 'latitude', 'longitude', 'depth')
+STRING_FIELDS = ('id', 'title', 'link', 'updated', 'point', 'elev', 'age', 'magnitude_term')
+
+
+class Segment:
+    """Columnar copy of one source feed.
+
+    Numeric fields live in float64 arrays (NaN for missing values), the place
+    named at the end of each title is interned into `places`, and the raw text
+    fields are packed into a UTF-8 heap addressed by `offsets`. The words of
+    each title's location text are kept as an inverted index: the sorted
+    `tokens` list, with the rows for tokens[i] stored in
+    postings[posting_offsets[i]:posting_offsets[i + 1]]. Rows are also
+    partitioned by whole-number magnitude: rows whose magnitude rounds down to
+    buckets[i] are bucket_rows[bucket_offsets[i]:bucket_offsets[i + 1]].
+    """
+
+    __slots__ = ('source', 'mtime', 'size', 'columns', 'place', 'places', 'offsets', 'heap',
+                 'tokens', 'postings', 'posting_offsets', 'buckets', 'bucket_rows', 'bucket_offsets',
+                 '__weakref__')
+
+    def __init__(self, source, mtime, size, columns, place, places, offsets, heap,
+                 tokens, postings, posting_offsets, buckets, bucket_rows, bucket_offsets):
+        self.source = source
+        self.mtime = mtime
+        self.size = size
+        self.columns = columns
+        self.place = place
+        self.places = places
+        self.offsets = offsets
+        self.heap = heap
+        self.tokens = tokens
+        self.postings = postings
+        self.posting_offsets = posting_offsets
+        self.buckets = buckets
+        self.bucket_rows = bucket_rows
+        self.bucket_offsets = bucket_offsets
+
+    def __len__(self):
+        return len(self.place)
+
+    def __iter__(self):
+        for i in range(len(self)):
+            yield self.event(i)
+
+    def text(self, i, field):
+        k = i * len(STRING_FIELDS) + STRING_FIELDS.index(field)
+        return self.heap[self.offsets[k]:self.offsets[k + 1]].decode('utf-8') or None
+
+    def event(self, i):
+        width = len(STRING_FIELDS)
+        offsets = self.offsets
+        base = i * width
+        texts = [self.heap[offsets[base + k]:offsets[base + k + 1]].decode('utf-8') or None
+                 for k in range(width)]
+        numbers = [self.columns[name][i] for name in NUMERIC_COLUMNS]
+        return Event(*texts, *[None if math.isnan(value) else value for value in numbers])
+
+
+class SegmentBuilder:
+    """Accumulates Events one at a time into the compact Segment layout."""
+
+    def __init__(self):
+        self.columns = {name: array('d') for name in NUMERIC_COLUMNS}
+        self.place = array('i')
+        self.places = []
+        self.place_ids = {}
+        self.offsets = array('q', [0])
+        self.heap = bytearray()
+        self.token_rows = {}
+        self.magnitude_rows = {}
+
+    def __len__(self):
+        return len(self.place)
+
+    def append(self, event):
+        row = len(self.place)
+        for name in NUMERIC_COLUMNS:
+            value = getattr(event, name)
+            self.columns[name].append(math.nan if value is None else value)
+        if event.magnitude is not None:
+            self.magnitude_rows.setdefault(math.floor(event.magnitude), []).append(row)
+        name = split_place(event.title)[1]
+        if name not in self.place_ids:
+            self.place_ids[name] = len(self.places)
+            self.places.append(name)
+        self.place.append(self.place_ids[name])
+        for token in location_tokens(event.title):
+            self.token_rows.setdefault(token, []).append(row)
+        for field in STRING_FIELDS:
+            self.heap += (getattr(event, field) or '').encode('utf-8')
+            self.offsets.append(len(self.heap))
+
+    def finish(self, source, mtime=0, size=0):
+        tokens = sorted(self.token_rows)
+        postings = array('i')
+        posting_offsets = array('q', [0])
+        for token in tokens:
+            postings.extend(self.token_rows[token])
+            posting_offsets.append(len(postings))
+        buckets = sorted(self.magnitude_rows)
+        bucket_rows = array('i')
+        bucket_offsets = array('q', [0])
+        for bucket in buckets:
+            bucket_rows.extend(self.magnitude_rows[bucket])
+            bucket_offsets.append(len(bucket_rows))
+        return Segment(source, mtime, size, self.columns, self.place, self.places, self.offsets, bytes(self.heap),
+                       tokens, postings, posting_offsets, buckets, bucket_rows, bucket_offsets)
+
+
+def pack_events(events, source, mtime=0, size=0):
+    """Pack an iterable of Events into an in-memory Segment."""
+    builder = SegmentBuilder()
+    for event in events:
+        builder.append(event)
+    return builder.finish(source, mtime, size)
+
+
+def _text_layout(segment):
+    """(starts, lengths): where each row's packed text fields begin in the heap, and their byte lengths."""
+    width = len(STRING_FIELDS)
+    records = getattr(segment, 'records', None)
+    if records is not None:
+        # A memory-mapped store keeps the layout in its records
+        return np.asarray(records['heap_offset'], dtype=np.int64), np.asarray(records['lengths'], dtype=np.int64)
+    offsets = np.asarray(segment.offsets, dtype=np.int64)
+    return offsets[:-1:width][:len(segment)], np.diff(offsets).reshape(len(segment), width)
+
+
+def _merged_places(segments, keep):
+    """(place, places) of the kept rows, with names numbered in order of first appearance."""
+    names, name_ids, place = [], {}, [np.zeros(0, dtype=np.int64)]
+    for segment in segments:
+        remap = []
+        for name in segment.places:
+            if name not in name_ids:
+                name_ids[name] = len(names)
+                names.append(name)
+            remap.append(name_ids[name])
+        if len(segment):
+            place.append(np.array(remap, dtype=np.int64)[np.asarray(segment.place, dtype=np.int64)])
+    present, first_rows, inverse = np.unique(np.concatenate(place)[keep], return_index=True, return_inverse=True)
+    ranks = np.argsort(first_rows, kind='stable')
+    renumber = np.empty(len(present), dtype=np.int32)
+    renumber[ranks] = np.arange(len(present), dtype=np.int32)
+    return renumber[inverse.reshape(-1)], [names[i] for i in present[ranks].tolist()]
+
+
+def _merged_postings(segments, bases, new_row):
+    """(tokens, postings, posting_offsets) of the inputs' location words, for the rows kept at new_row."""
+    tokens = sorted({token for segment in segments for token in segment.tokens})
+    token_ids = {token: i for i, token in enumerate(tokens)}
+    token_of, row_of = [np.zeros(0, dtype=np.int64)], [np.zeros(0, dtype=np.int64)]
+    for base, segment in zip(bases, segments):
+        ids = np.array([token_ids[token] for token in segment.tokens], dtype=np.int64)
+        token_of.append(np.repeat(ids, np.diff(np.asarray(segment.posting_offsets, dtype=np.int64))))
+        row_of.append(new_row[np.asarray(segment.postings, dtype=np.int64) + base])
+    token_of, row_of = np.concatenate(token_of), np.concatenate(row_of)
+    kept = row_of >= 0
+    token_of, row_of = token_of[kept], row_of[kept]
+    counts = np.bincount(token_of, minlength=len(tokens))
+    used = np.flatnonzero(counts)
+    posting_offsets = np.zeros(len(used) + 1, dtype=np.int64)
+    np.cumsum(counts[used], out=posting_offsets[1:])
+    postings = row_of[np.lexsort((row_of, token_of))].astype(np.int32)
+    return [tokens[i] for i in used.tolist()], postings, posting_offsets
+
+
+def merge_segments(segments, source):
+    """Pack the de-duplicated events of several segments into one Segment.
+
+    Events are keyed on atom:id and the most recently updated record is kept,
+    as merge_events does, but the rows are chosen on the id and time columns
+    and copied over as they are, text bytes and postings included, so no
+    Event is decoded. Its mtime and size are the newest mtime and the total
+    size of the inputs, so replacing, adding or removing a feed behind it
+    changes them.
+    """
+    segments = list(segments)
+    mtime = max((segment.mtime for segment in segments), default=0)
+    size = sum(segment.size for segment in segments)
+    width = len(STRING_FIELDS)
+    bases = [0]
+    heaps, starts, lengths, group, ids = [], [], [], [], {}
+    heap_size = 0
+    for segment in segments:
+        heap = bytes(segment.heap)
+        row_starts, row_lengths = _text_layout(segment)
+        # Ids are numbered by first appearance, the order merge_events keeps
+        group.extend(ids.setdefault(heap[start:start + length], len(ids))
+                     for start, length in zip(row_starts.tolist(), row_lengths[:, 0].tolist()))
+        starts.append(row_starts + heap_size)
+        lengths.append(row_lengths)
+        heaps.append(heap)
+        heap_size += len(heap)
+        bases.append(bases[-1] + len(segment))
+    count = bases[-1]
+    group = np.array(group, dtype=np.int64)
+    starts = np.concatenate([np.zeros(0, dtype=np.int64)] + starts)
+    lengths = np.concatenate([np.zeros((0, width), dtype=np.int64)] + lengths)
+    columns = {name: np.concatenate([np.zeros(0)] + [np.asarray(segment.columns[name], dtype=np.float64)
+                                                     for segment in segments])
+               for name in NUMERIC_COLUMNS}
+
+    # Within each id the newest record wins and the earliest breaks ties
+    order = np.lexsort((np.arange(count), -np.nan_to_num(columns['time']), group))
+    first = np.ones(count, dtype=bool)
+    first[1:] = group[order[1:]] != group[order[:-1]]
+    keep = order[first]
+    new_row = np.full(count, -1, dtype=np.int64)
+    new_row[keep] = np.arange(len(keep))
+
+    columns = {name: values[keep] for name, values in columns.items()}
+    place, places = _merged_places(segments, keep)
+    # Each kept row's text fields are one contiguous run of its input heap
+    kept_lengths = lengths[keep]
+    offsets = np.zeros(len(keep) * width + 1, dtype=np.int64)
+    np.cumsum(kept_lengths.reshape(-1), out=offsets[1:])
+    gather = np.repeat(starts[keep] - offsets[:-1:width][:len(keep)], kept_lengths.sum(axis=1))
+    heap = np.frombuffer(b''.join(heaps), dtype=np.uint8)[gather + np.arange(offsets[-1])].tobytes()
+    tokens, postings, posting_offsets = _merged_postings(segments, bases, new_row)
+
+    magnitudes = columns['magnitude']
+    rated = np.flatnonzero(~np.isnan(magnitudes))
+    floors = np.floor(magnitudes[rated])
+    buckets, bucket_counts = np.unique(floors, return_counts=True)
+    bucket_offsets = np.zeros(len(buckets) + 1, dtype=np.int64)
+    np.cumsum(bucket_counts, out=bucket_offsets[1:])
+    bucket_rows = rated[np.argsort(floors, kind='stable')].astype(np.int32)
+    return Segment(source, mtime, size, columns, place, places, offsets, heap, tokens, postings, posting_offsets,
+                   [int(bucket) for bucket in buckets.tolist()], bucket_rows, bucket_offsets)
+
+
+def feed_stat(file_path):
+    """os.stat of a feed file, or of the archive holding it."""
+    return os.stat(split_archive_path(file_path)[0])
+
+
+def build_segment(file_path, stat=None):
+    """Parse a feed once and pack it into a Segment."""
+    stat = stat or feed_stat(file_path)
+    with counters.timer('parse'):
+        segment = pack_events(iter_events(file_path), file_path, stat.st_mtime_ns, stat.st_size)
+    counters.count_file(file_path, bytes_in=stat.st_size)
+    return segment
+
+
+def write_segment_block(segment, out, source):
+    """Write `segment` to the open binary file `out` as one self-contained block recording `source`."""
+    meta = json.dumps({
+        'source': source,
+        'mtime': segment.mtime,
+        'size': segment.size,
+        'count': len(segment),
+        'places': segment.places,
+        'tokens': segment.tokens,
+        'postings': len(segment.postings),
+        'buckets': segment.buckets,
+        'bucket_rows': len(segment.bucket_rows),
+        'byteorder': sys.byteorder,
+    }).encode('utf-8')
+    out.write(_HEADER.pack(_MAGIC, len(meta)))
+    out.write(meta)
+    for name in NUMERIC_COLUMNS:
+        segment.columns[name].tofile(out)
+    segment.place.tofile(out)
+    segment.offsets.tofile(out)
+    segment.posting_offsets.tofile(out)
+    segment.postings.tofile(out)
+    segment.bucket_offsets.tofile(out)
+    segment.bucket_rows.tofile(out)
+    out.write(segment.heap)
+
+
+def write_segment(segment, index_path):
+    tmp_path = index_path + '.tmp'
+    with open(tmp_path, 'wb') as index_file:
+        write_segment_block(segment, index_file, os.path.basename(segment.source))
+    os.replace(tmp_path, index_path)
+
+
+def read_segment_meta(index_path):
+    """The JSON header of an index file (source, mtime, size, counts), or None if it is missing or unreadable."""
+    try:
+        with open(index_path, 'rb') as index_file:
+            magic, meta_size = _HEADER.unpack(index_file.read(_HEADER.size))
+            if magic != _MAGIC:
+                return None
+            return json.loads(index_file.read(meta_size))
+    except (OSError, ValueError, struct.error):
+        return None
+
+
+def _read_block(index_file, source=None):
+    """Read the next block written by write_segment_block, or None at the end of the file.
+
+    The Segment's source is `source`, or the one recorded in the block.
+    Raises ValueError, EOFError or struct.error if the block is damaged.
+    """
+    header = index_file.read(_HEADER.size)
+    if not header:
+        return None
+    magic, meta_size = _HEADER.unpack(header)
+    if magic != _MAGIC:
+        raise ValueError("not a segment block")
+    meta = json.loads(index_file.read(meta_size))
+    count = meta['count']
+    columns = {}
+    for name in NUMERIC_COLUMNS:
+        columns[name] = array('d')
+        columns[name].fromfile(index_file, count)
+    place = array('i')
+    place.fromfile(index_file, count)
+    offsets = array('q')
+    offsets.fromfile(index_file, count * len(STRING_FIELDS) + 1)
+    posting_offsets = array('q')
+    posting_offsets.fromfile(index_file, len(meta['tokens']) + 1)
+    postings = array('i')
+    postings.fromfile(index_file, meta['postings'])
+    bucket_offsets = array('q')
+    bucket_offsets.fromfile(index_file, len(meta['buckets']) + 1)
+    bucket_rows = array('i')
+    bucket_rows.fromfile(index_file, meta['bucket_rows'])
+    if meta['byteorder'] != sys.byteorder:
+        for column in (*columns.values(), place, offsets, posting_offsets, postings, bucket_offsets, bucket_rows):
+            column.byteswap()
+    heap = index_file.read(offsets[-1])
+    if len(heap) != offsets[-1]:
+        raise EOFError("segment heap is truncated")
+    return Segment(meta['source'] if source is None else source, meta['mtime'], meta['size'], columns, place,
+                   meta['places'], offsets, heap, meta['tokens'], postings, posting_offsets, meta['buckets'],
+                   bucket_rows, bucket_offsets)
+
+
+def read_segment(index_path, source):
+    """Load a Segment written by write_segment, or None if it is missing or unreadable."""
+    try:
+        with counters.timer('read'), open(index_path, 'rb') as index_file:
+            segment = _read_block(index_file, source)
+            trailing = index_file.read(1)
+            size = index_file.tell()
+    except (OSError, EOFError, ValueError, KeyError, struct.error):
+        return None
+    if segment is None or trailing:
+        return None
+    counters.count_file(source, bytes_in=size)
+    return segment
+
+
+def iter_segment_blocks(path):
+    """Yield the Segments of a file of blocks written one after another, such as the binary results output.
+
+    Each Segment's source is the one recorded in its block.
+    """
+    with open(path, 'rb') as block_file:
+        while True:
+            start = block_file.tell()
+            with counters.timer('read'):
+                segment = _read_block(block_file)
+            if segment is None:
+                return
+            counters.count_file(segment.source, bytes_in=block_file.tell() - start)
+            yield segment
+
+
+class FeedIndex:
+    """On-disk columnar index of every feed in a folder, refreshed incrementally.
+
+    Segments are stored under <folder>/.atomindex and keyed on the source file's
+    mtime and size, so only new or changed feeds are parsed again.
+
+    A tar or zip archive is indexed like a folder of its feeds, under
+    .atomindex/<archive name> beside it. Its segments are keyed on the
+    archive itself: when it changes, every member is re-read in a single
+    streaming pass, since a compressed tar cannot be read member by member.
+    """
+
+    def __init__(self, folder_path):
+        self.folder_path = folder_path
+        if is_archive(folder_path):
+            self.index_dir = os.path.join(os.path.dirname(folder_path), INDEX_DIR, os.path.basename(folder_path))
+        else:
+            self.index_dir = os.path.join(folder_path, INDEX_DIR)
+        self.segments = []
+
+    def index_path(self, file_path):
+        if is_archive(self.folder_path):
+            name = quote(os.path.relpath(file_path, self.folder_path).replace(os.sep, '/'), safe='')
+        else:
+            name = os.path.basename(file_path)
+        return os.path.join(self.index_dir, name + '.idx')
+
+    def is_fresh(self, file_path, stat=None):
+        """Whether the index of a feed matches its mtime and size, judged from the index header alone."""
+        stat = stat or feed_stat(file_path)
+        meta = read_segment_meta(self.index_path(file_path))
+        return meta is not None and meta.get('mtime') == stat.st_mtime_ns and meta.get('size') == stat.st_size
+
+    def archive_members(self):
+        """Member paths of an indexed archive if its manifest and every member index are current, else None."""
+        stat = os.stat(self.folder_path)
+        try:
+            with open(os.path.join(self.index_dir, ARCHIVE_MANIFEST), encoding='utf-8') as manifest_file:
+                manifest = json.load(manifest_file)
+            if manifest['mtime'] != stat.st_mtime_ns or manifest['size'] != stat.st_size:
+                return None
+            file_paths = [os.path.join(self.folder_path, member) for member in manifest['members']]
+        except (OSError, ValueError, KeyError, TypeError):
+            return None
+        return file_paths if all(self.is_fresh(file_path, stat) for file_path in file_paths) else None
+
+    def load_segment(self, file_path, current=None):
+        stat = feed_stat(file_path)
+        segment = current
+        if segment is None and self.is_fresh(file_path, stat):
+            segment = read_segment(self.index_path(file_path), file_path)
+        if segment is not None and segment.mtime == stat.st_mtime_ns and segment.size == stat.st_size:
+            return segment, False
+
+        segment = build_segment(file_path, stat)
+        try:
+            os.makedirs(self.index_dir, exist_ok=True)
+            write_segment(segment, self.index_path(file_path))
+        except OSError as e:
+            print(f"Could not write index for {file_path}: {e}")
+        return segment, True
+
+    def refresh(self):
+        """Re-ingest new or changed feeds and drop removed ones; returns the number re-parsed."""
+        if is_archive(self.folder_path):
+            return self.refresh_archive()
+        known = {segment.source: segment for segment in self.segments}
+        file_paths = list_feed_files(self.folder_path)
+        segments = []
+        rebuilt = 0
+        for file_path in file_paths:
+            segment, changed = self.load_segment(file_path, known.get(file_path))
+            segments.append(segment)
+            rebuilt += changed
+        self.segments = segments
+        self.remove_stale(file_paths)
+        return rebuilt
+
+    def refresh_archive(self):
+        stat = os.stat(self.folder_path)
+
+        def fresh(segment):
+            return segment is not None and segment.mtime == stat.st_mtime_ns and segment.size == stat.st_size
+
+        if self.segments and all(fresh(segment) for segment in self.segments):
+            return 0
+        file_paths = self.archive_members()
+        if file_paths is not None:
+            segments = [read_segment(self.index_path(file_path), file_path) for file_path in file_paths]
+            if all(fresh(segment) for segment in segments):
+                self.segments = segments
+                return 0
+
+        with counters.timer('parse'):
+            segments = [pack_events(iter_events(source), file_path, stat.st_mtime_ns, stat.st_size)
+                        for file_path, source in iter_feed_sources(self.folder_path)]
+        counters.count_file(self.folder_path, bytes_in=stat.st_size)
+        manifest_path = os.path.join(self.index_dir, ARCHIVE_MANIFEST)
+        try:
+            os.makedirs(self.index_dir, exist_ok=True)
+            for segment in segments:
+                write_segment(segment, self.index_path(segment.source))
+            members = [os.path.relpath(segment.source, self.folder_path).replace(os.sep, '/') for segment in segments]
+            with open(manifest_path + '.tmp', 'w', encoding='utf-8') as manifest_file:
+                json.dump({'mtime': stat.st_mtime_ns, 'size': stat.st_size, 'members': members}, manifest_file)
+            os.replace(manifest_path + '.tmp', manifest_path)
+        except OSError as e:
+            print(f"Could not write index for {self.folder_path}: {e}")
+        self.segments = segments
+        self.remove_stale([segment.source for segment in segments])
+        return len(segments)
+
+    def remove_stale(self, file_paths):
+        """Delete index files for feeds that are no longer in `file_paths`."""
+        if os.path.isdir(self.index_dir):
+            live = {os.path.basename(self.index_path(file_path)) for file_path in file_paths}
+            for name in os.listdir(self.index_dir):
+                if name.endswith('.idx') and name not in live:
+                    try:
+                        os.remove(os.path.join(self.index_dir, name))
+                    except OSError:
+                        pass
+
+    def __iter__(self):
+        for segment in self.segments:
+            yield from segment
+
+
+def open_index(folder_path):
+    index = FeedIndex(folder_path)
+    index.refresh()
+    return index
+
+
+def iter_segment_groups(folder_path, merge=False):
+    """Yield one Segment per feed, or a single de-duplicated Segment with merge=True."""
+    index = open_index(folder_path)
+    if merge:
+        yield merge_segments(index.segments, folder_path)
+        return
+    yield from index.segments
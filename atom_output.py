@@ -0,0 +1,214 @@
+import csv
+import io
+import json
+import os
+from itertools import islice
+
+from atom_feed import Event, format_event
+from atom_index import SegmentBuilder, write_segment_block
+from atom_profile import counters
+
+BUFFER_SIZE = 1 << 20
+# Events are rendered and written in blocks, so formatting and writing can
+# be timed separately without a timer per event
+WRITE_BLOCK = 256
+# Most events held by the binary writer before a block is written out
+BINARY_BLOCK = 1 << 16
+
+FORMATS = {
+    'text': '.txt',
+    'jsonl': '.jsonl',
+    'csv': '.csv',
+    'binary': '.idx',
+}
+
+
+class EventWriter:
+    """Streams matching events to a buffered file, one group per source feed.
+
+    Subclasses render events with format(), or format_block() for a whole
+    block, into `file`.
+    """
+
+    def __init__(self, path, append=False):
+        self.path = path
+        self.count = 0
+        self.group_count = 0
+        self.source = None
+        self.file = None
+        self.initial_size = os.path.getsize(path) if append and os.path.exists(path) else 0
+
+    def begin(self, source):
+        self.source = source
+        self.group_count = 0
+
+    def format(self, event):
+        raise NotImplementedError
+
+    def format_block(self, events):
+        return ''.join([self.format(event) for event in events])
+
+    def write_block(self, events):
+        with counters.timer('format'):
+            data = self.format_block(events)
+        with counters.timer('write'):
+            self.file.write(data)
+        self.count += len(events)
+        self.group_count += len(events)
+
+    def write(self, event):
+        self.write_block([event])
+
+    def write_group(self, source, events):
+        self.begin(source)
+        events = iter(events)
+        while True:
+            # Pulling the events decodes them (from the index or the feed)
+            with counters.timer('parse'):
+                block = list(islice(events, WRITE_BLOCK))
+            if not block:
+                break
+            self.write_block(block)
+        counters.count_file(source, matches=self.group_count)
+        self.end()
+
+    def end(self):
+        pass
+
+    def close(self):
+        if self.file is not None:
+            self.file.close()
+            self.file = None
+            counters.count_output(os.path.getsize(self.path) - self.initial_size)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+class TextWriter(EventWriter):
+    """The human-readable report layout shared by the search scripts."""
+
+    def __init__(self, path, header='', use_link=False, magnitude_value=False, append=False):
+        super().__init__(path, append)
+        self.header = header
+        self.use_link = use_link
+        self.magnitude_value = magnitude_value
+        self.file = open(path, 'a' if append else 'w', encoding='utf-8', buffering=BUFFER_SIZE)
+
+    def begin(self, source):
+        super().begin(source)
+        self.file.write(f"\n\n{self.header}\n{'=' * 40}\n\n"
+                        f"File path data was retrieved from: {source}\n{'-' * 40}\n\n"
+                        f"All matching entries:\n{'*' * 40}\n\n")
+
+    def format(self, event):
+        magnitude = event.magnitude if self.magnitude_value else None
+        return format_event(event, self.use_link, magnitude) + "\n"
+
+    def end(self):
+        if not self.group_count:
+            self.file.write("No matching entries found.\n")
+        self.file.write("*" * 40 + "\n")
+
+
+class JsonLinesWriter(EventWriter):
+    """One JSON object per event, tagged with the feed it came from."""
+
+    def __init__(self, path, append=False, **options):
+        super().__init__(path, append)
+        self.file = open(path, 'a' if append else 'w', encoding='utf-8', buffering=BUFFER_SIZE)
+
+    def format(self, event):
+        record = {'source': self.source}
+        record.update(event._asdict())
+        return json.dumps(record) + "\n"
+
+
+class CsvWriter(EventWriter):
+    """CSV with a header row of the Event fields plus the source feed."""
+
+    def __init__(self, path, append=False, **options):
+        append = append and os.path.exists(path) and os.path.getsize(path) > 0
+        super().__init__(path, append)
+        self.file = open(path, 'a' if append else 'w', encoding='utf-8', newline='', buffering=BUFFER_SIZE)
+        self.buffer = io.StringIO()
+        self.writer = csv.writer(self.buffer)
+        if not append:
+            csv.writer(self.file).writerow(('source',) + Event._fields)
+
+    def format_block(self, events):
+        self.buffer.seek(0)
+        self.buffer.truncate()
+        self.writer.writerows((self.source,) + tuple('' if value is None else value for value in event)
+                              for event in events)
+        return self.buffer.getvalue()
+
+
+class BinaryWriter(EventWriter):
+    """Columnar blocks in the index segment format, one or more per source feed.
+
+    Each group is written out as soon as it completes, so memory is bounded by
+    one group (at most BINARY_BLOCK events). Read the file back with
+    atom_index.iter_segment_blocks; every Segment carries its source feed.
+    """
+
+    def __init__(self, path, append=False, **options):
+        if append:
+            raise ValueError("The binary format cannot be appended to")
+        super().__init__(path)
+        self.file = open(path, 'wb', buffering=BUFFER_SIZE)
+        self.builder = SegmentBuilder()
+
+    def write_block(self, events):
+        with counters.timer('format'):
+            for event in events:
+                self.builder.append(event)
+        self.count += len(events)
+        self.group_count += len(events)
+        if len(self.builder) >= BINARY_BLOCK:
+            self.flush()
+
+    def flush(self):
+        if len(self.builder):
+            with counters.timer('write'):
+                write_segment_block(self.builder.finish(self.source), self.file, self.source)
+            self.builder = SegmentBuilder()
+
+    def end(self):
+        self.flush()
+
+    def close(self):
+        if self.file is not None:
+            self.flush()
+        super().close()
+
+
+_WRITERS = {
+    'text': TextWriter,
+    'jsonl': JsonLinesWriter,
+    'csv': CsvWriter,
+    'binary': BinaryWriter,
+}
+
+
+def result_path(path, output_format):
+    """Swap the extension of a results path for the one matching `output_format`."""
+    if output_format == 'text':
+        return path
+    return os.path.splitext(path)[0] + FORMATS[output_format]
+
+
+def open_writer(path, output_format='text', **options):
+    """Open a streaming writer; text-layout options are ignored by the machine formats.
+
+    The folder holding the results is created if it does not exist yet.
+    """
+    if output_format not in _WRITERS:
+        raise ValueError(f"Unknown output format: {output_format}")
+    path = result_path(path, output_format)
+    if os.path.dirname(path):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+    return _WRITERS[output_format](path, **options)
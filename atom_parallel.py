@@ -0,0 +1,138 @@
+import glob
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+from atom_feed import is_archive, iter_feed_sources, list_feed_files
+from atom_filter import scan_feed
+from atom_index import FeedIndex, INDEX_DIR
+from atom_profile import counters
+from atom_sort import sort_events
+
+
+def find_feed_folders(patterns, strict=True):
+    """Expand folder globs or root directories into the folders and archives that hold feeds.
+
+    A pattern naming a folder without feeds of its own is treated as a root and
+    its immediate sub-folders (one per dated snapshot) and tar or zip archives
+    are searched instead. With `strict`, patterns that find no feeds at all
+    (a typo'd folder, an empty glob) raise ValueError rather than giving an
+    empty result.
+    """
+    folders = []
+    unmatched = []
+    for pattern in patterns:
+        found = len(folders)
+        paths = sorted(glob.glob(pattern)) if glob.has_magic(pattern) else [pattern]
+        for path in paths:
+            if is_archive(path) and os.path.isfile(path):
+                folders.append(path)
+                continue
+            if not os.path.isdir(path):
+                continue
+            if list_feed_files(path):
+                folders.append(path)
+                continue
+            for name in sorted(os.listdir(path)):
+                child = os.path.join(path, name)
+                if is_archive(child) and os.path.isfile(child):
+                    folders.append(child)
+                elif name != INDEX_DIR and os.path.isdir(child) and list_feed_files(child):
+                    folders.append(child)
+        if len(folders) == found:
+            unmatched.append(pattern)
+    if strict and unmatched:
+        raise ValueError(f"No feed folders found for: {', '.join(unmatched)}")
+    return folders
+
+
+def worker_count(workers=None):
+    """Processes a pool of `workers` runs: one per CPU by default."""
+    return workers or os.cpu_count() or 1
+
+
+def _counted(task):
+    """Worker: run one task and return its result with the counters it added in this process."""
+    worker, task = task
+    counters.reset()
+    return worker(task), counters.snapshot()
+
+
+def _run(worker, tasks, workers):
+    """Map `worker` over `tasks` in a process pool, yielding results in task order.
+
+    The workers' pipeline counters are added to this process's. With a
+    single worker the tasks run in this process instead.
+    """
+    if worker_count(workers) == 1:
+        yield from map(worker, tasks)
+        return
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        for result, snapshot in executor.map(_counted, [(worker, task) for task in tasks]):
+            counters.merge(snapshot)
+            yield result
+
+
+def _stale_tasks(folders):
+    """One task per feed whose index is missing or out of date, and one per such archive (file_path None).
+
+    Only the index headers are read, so a folder that is already up to date
+    costs a stat and a small read per feed.
+    """
+    tasks = []
+    for folder_path in folders:
+        index = FeedIndex(folder_path)
+        if is_archive(folder_path):
+            if index.archive_members() is None:
+                tasks.append((folder_path, None))
+        else:
+            tasks.extend((folder_path, file_path) for file_path in list_feed_files(folder_path)
+                         if not index.is_fresh(file_path))
+    return tasks
+
+
+def _refresh_file(task):
+    """Worker: bring the index of one feed, or of every feed of an archive, up to date; returns the number re-parsed."""
+    folder_path, file_path = task
+    if file_path is None:
+        return FeedIndex(folder_path).refresh()
+    return int(FeedIndex(folder_path).load_segment(file_path)[1])
+
+
+def refresh_folders(folders, workers=None):
+    """Bring every folder's on-disk index up to date in parallel; returns the number of feeds re-parsed.
+
+    Only stale feeds are handed to the pool, and no pool is started when
+    there are none.
+    """
+    tasks = _stale_tasks(folders)
+    if not tasks:
+        return 0
+    return sum(_run(_refresh_file, tasks, 1 if len(tasks) == 1 else workers))
+
+
+def _scan_file(task):
+    """Worker: scan one raw feed, or every feed of an archive, for several queries in one pass.
+
+    Returns [(file_path, [matches of each query, in the query's order])] in feed order.
+    """
+    folder_path, file_path, queries = task
+    filters = [query.scan_filter() for query in queries]
+    sources = [(file_path, file_path)] if file_path is not None else iter_feed_sources(folder_path)
+    results = []
+    for path, source in sources:
+        scanned = [[] for _ in queries]
+        for matches in scan_feed(source, filters, name=path):
+            for events, block_events in zip(scanned, matches):
+                events.extend(block_events)
+        results.append((path, [sort_events(events, query.sort) for events, query in zip(scanned, queries)]))
+    return results
+
+
+def scan_files(tasks, workers=None):
+    """Scan (folder_path, file_path, queries) tasks in a process pool, one raw feed per task.
+
+    A task with file_path None reads every feed of the archive `folder_path`
+    in a single streaming pass. Yields the result of each task in task order:
+    [(file_path, [matches of each query])].
+    """
+    return _run(_scan_file, tasks, 1 if len(tasks) <= 1 else workers)
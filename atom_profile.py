@@ -0,0 +1,138 @@
+import cProfile
+import io
+import json
+import pstats
+import sys
+import time
+from contextlib import contextmanager
+
+PHASES = ('read', 'parse', 'filter', 'format', 'write')
+PROFILE_MODES = ('stats', 'cprofile')
+
+
+class Counters:
+    """Process-wide timers and counters for the search pipeline.
+
+    Phases are timed around whole files, segments and blocks of events, never
+    single entries, so the counters cost a few perf_counter() calls per file
+    and stay on all the time:
+
+    read   -- raw feed bytes and index files read from disk
+    parse  -- XML parsed into events, and index rows decoded into events
+    filter -- predicates and index lookups selecting the matching rows
+    format -- matches rendered in the output format
+    write  -- rendered output written to its file
+
+    Per file, `entries` counts the events a search examined, `matches` the
+    events written out and `bytes_in` the feed or index bytes read.
+    """
+
+    def __init__(self):
+        self.reset()
+
+    def reset(self):
+        self.seconds = dict.fromkeys(PHASES, 0.0)
+        self.calls = dict.fromkeys(PHASES, 0)
+        self.files = {}
+        self.bytes_in = 0
+        self.bytes_out = 0
+
+    def add_time(self, phase, seconds, calls=1):
+        self.seconds[phase] += seconds
+        self.calls[phase] += calls
+
+    @contextmanager
+    def timer(self, phase):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add_time(phase, time.perf_counter() - started)
+
+    def count_file(self, source, entries=0, matches=0, bytes_in=0):
+        counts = self.files.get(source)
+        if counts is None:
+            counts = self.files[source] = {'entries': 0, 'matches': 0, 'bytes_in': 0}
+        counts['entries'] += entries
+        counts['matches'] += matches
+        counts['bytes_in'] += bytes_in
+        self.bytes_in += bytes_in
+
+    def count_output(self, size):
+        self.bytes_out += size
+
+    def snapshot(self, files=True):
+        """The counters as a JSON-ready dict; files=False leaves out the per-file counts."""
+        stats = {
+            'phases': {phase: {'seconds': round(self.seconds[phase], 6), 'calls': self.calls[phase]}
+                       for phase in PHASES},
+            'entries': sum(counts['entries'] for counts in self.files.values()),
+            'matches': sum(counts['matches'] for counts in self.files.values()),
+            'bytes_in': self.bytes_in,
+            'bytes_out': self.bytes_out,
+        }
+        if files:
+            stats['files'] = {source: dict(counts) for source, counts in self.files.items()}
+        return stats
+
+    def merge(self, snapshot):
+        """Add a snapshot taken in another process, such as an indexing worker."""
+        for phase, timing in snapshot['phases'].items():
+            self.add_time(phase, timing['seconds'], timing['calls'])
+        for source, counts in snapshot['files'].items():
+            self.count_file(source, counts['entries'], counts['matches'], counts['bytes_in'])
+        self.bytes_out += snapshot['bytes_out']
+
+
+counters = Counters()
+
+
+def add_profile_arguments(parser):
+    parser.add_argument('--profile', choices=PROFILE_MODES,
+                        help="report where the time went: the pipeline counters as JSON, or a cProfile listing")
+    parser.add_argument('--profile-output', metavar='PATH',
+                        help="write the profile to PATH (a .prof file for cprofile) instead of stderr")
+
+
+@contextmanager
+def profiled(mode=None, path=None):
+    """Report on the enclosed block: counters JSON ('stats') or cProfile output ('cprofile').
+
+    Without a path the report goes to stderr; cProfile data written to a
+    path is in the binary pstats format, for tools such as snakeviz.
+    """
+    if mode is None:
+        yield
+        return
+    if mode not in PROFILE_MODES:
+        raise ValueError(f"Unknown profile mode: {mode}")
+    profiler = cProfile.Profile() if mode == 'cprofile' else None
+    counters.reset()
+    started = time.perf_counter()
+    if profiler is not None:
+        profiler.enable()
+    try:
+        yield
+    finally:
+        if profiler is not None:
+            profiler.disable()
+        _report(profiler, path, time.perf_counter() - started)
+
+
+def _report(profiler, path, wall_seconds):
+    if profiler is not None and path:
+        profiler.dump_stats(path)
+        return
+    if profiler is not None:
+        listing = io.StringIO()
+        pstats.Stats(profiler, stream=listing).sort_stats('cumulative').print_stats(40)
+        text = listing.getvalue()
+    else:
+        stats = counters.snapshot()
+        stats['wall_seconds'] = round(wall_seconds, 6)
+        text = json.dumps(stats, indent=2) + "\n"
+    if path:
+        with open(path, 'w', encoding='utf-8') as out:
+            out.write(text)
+    else:
+        sys.stderr.write(text)
@@ -0,0 +1,673 @@
+import argparse
+import base64
+import binascii
+import calendar
+import copy
+import heapq
+import json
+import os
+import shlex
+import sys
+from datetime import date, datetime, time, timezone
+from itertools import groupby, islice
+from operator import itemgetter
+
+import numpy as np
+
+from atom_cache import add_cache_arguments, cache_from_args
+from atom_feed import is_archive, iter_feed_sources, list_feed_files, location_tokens, split_place, tokenize
+from atom_filter import (DEPTH_BANDS, PARTITION_SHARE, And, RowColumns, TimeOfDay, TimeWindow, depth_bounds,
+                         magnitude_bounds, parse_depth_range, parse_magnitude, partition_selective, partition_size,
+                         scan_feed, segment_columns, select, select_magnitude)
+from atom_index import merge_segments, open_index
+from atom_output import FORMATS, open_writer, result_path
+from atom_parallel import find_feed_folders, refresh_folders, scan_files, worker_count
+from atom_profile import add_profile_arguments, counters, profiled
+from atom_sort import (SORT_KEYS, iter_rows, ordered, row_key, select_datetime, select_depth, sort_events,
+                       sort_sequence)
+from atom_store import STORE_SUFFIX, open_store
+from atom_spatial import BoundingBox, Within, select_region
+from atom_textindex import select_place, select_text
+
+RESULTS_PATH = os.path.join('displayfiles', 'display_search_results.txt')
+
+# Paged queries test rows in blocks that grow from FIRST_BLOCK to MAX_BLOCK,
+# so a small page reads little more than it returns.
+FIRST_BLOCK = 64
+MAX_BLOCK = 1 << 16
+
+
+def encode_cursor(key):
+    return base64.urlsafe_b64encode(json.dumps(key).encode('utf-8')).decode('ascii').rstrip('=')
+
+
+def decode_cursor(cursor):
+    try:
+        missing, value, source, row = json.loads(base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)))
+        return int(missing), float(value), str(source), int(row)
+    except (binascii.Error, TypeError, ValueError) as e:
+        raise ValueError(f"Invalid cursor: {cursor}") from e
+
+
+class Query:
+    """A composable search over indexed feeds; every given criterion must match.
+
+    magnitude  -- one or more expressions such as '>=2.5', '1.0-3.7' or ['>=2', '<4']
+    depth      -- one or more depth bands or km expressions such as 'shallow', '<10' or '70-300'
+    start, end -- epoch-second window [start, end) on the updated time; start must be before end
+    last       -- a duration such as '24h' or '7d': only events updated that long
+                  before the query is evaluated, counted again on every run
+    day_start, day_end -- UTC time-of-day window in seconds, inclusive; a missing side is
+                  midnight (0 or 86400), and the window cannot cross midnight
+    place      -- exact place at the end of the title, e.g. 'CA'
+    text       -- words (or word prefixes) of the location text, e.g. 'nne geysers'
+    near       -- (latitude, longitude, radius_km)
+    bbox       -- (south, west, north, east)
+    sort       -- one of SORT_KEYS, '-' prefixed for descending; feed order by default
+    limit      -- return at most this many matches, e.g. the top 20 with sort='-magnitude'
+    after      -- cursor of the previous page, as returned by EventStore.page
+    """
+
+    FIELDS = ('magnitude', 'depth', 'start', 'end', 'last', 'day_start', 'day_end', 'place', 'text', 'near', 'bbox',
+              'sort', 'limit', 'after')
+
+    def __init__(self, magnitude=None, start=None, end=None, day_start=None, day_end=None,
+                 place=None, text=None, near=None, bbox=None, sort=None, limit=None, after=None, depth=None,
+                 last=None):
+        if isinstance(magnitude, str):
+            magnitude = [magnitude]
+        if isinstance(depth, str):
+            depth = [depth]
+        self.magnitude = list(magnitude) if magnitude else []
+        self.depth = list(depth) if depth else []
+        if start is not None and end is not None and start >= end:
+            raise ValueError(f"Invalid date range: start {_instant(start)} is not before end {_instant(end)}")
+        if day_start is not None or day_end is not None:
+            day_start = 0 if day_start is None else day_start
+            day_end = 86400 if day_end is None else day_end
+            if day_start > day_end:
+                raise ValueError(f"Invalid time range: {_clock(day_start)} is after {_clock(day_end)}; "
+                                 "a time-of-day window cannot cross midnight")
+        self.start = start
+        self.end = end
+        self.last = last or None
+        self.last_seconds = duration_seconds(last) if last else None
+        self.day_start = day_start
+        self.day_end = day_end
+        self.place = place
+        self.text = text
+        self.near = tuple(near) if near else None
+        self.bbox = tuple(bbox) if bbox else None
+        if sort and sort.lstrip('-') not in SORT_KEYS:
+            raise ValueError(f"Unknown sort key: {sort}")
+        self.sort = sort
+        if limit is not None and limit < 1:
+            raise ValueError("The limit must be at least 1")
+        self.limit = limit
+        self.after = after
+        self.after_key = decode_cursor(after) if after else None
+        # Parse the expressions once up front so bad input fails before any scan
+        self.magnitude_predicates = [parse_magnitude(expression) for expression in self.magnitude]
+        self.depth_predicates = [parse_depth_range(expression) for expression in self.depth]
+
+    def to_dict(self):
+        return {field: getattr(self, field) for field in self.FIELDS if getattr(self, field) not in (None, [])}
+
+    @classmethod
+    def from_dict(cls, values):
+        return cls(**{field: values[field] for field in cls.FIELDS if field in values})
+
+    def key(self):
+        """Normalized, hashable form of the query, for caching."""
+        return json.dumps(self.to_dict(), sort_keys=True)
+
+    def describe(self):
+        return ', '.join(f"{field} {value}" for field, value in self.to_dict().items()) or 'all events'
+
+    def relative(self):
+        """Whether the matches depend on when the query runs, so they must not be cached."""
+        return self.last is not None
+
+    def resolved(self):
+        """This query with `last` turned into a start time counted back from now."""
+        if self.last is None:
+            return self
+        # A copy rather than a new Query: once `since` passes `end` the window
+        # is empty, which matches nothing instead of being rejected
+        query = copy.copy(self)
+        query.last = query.last_seconds = None
+        since = datetime.now(timezone.utc).timestamp() - self.last_seconds
+        query.start = since if self.start is None else max(self.start, since)
+        return query
+
+    def region(self):
+        if self.near:
+            return Within(*self.near)
+        if self.bbox:
+            return BoundingBox(*self.bbox)
+        return None
+
+    def predicate(self):
+        """The column predicates of this query combined with And."""
+        predicates = list(self.magnitude_predicates) + self.depth_predicates
+        if self.start is not None or self.end is not None:
+            predicates.append(TimeWindow(self.start, self.end))
+        if self.day_start is not None:
+            predicates.append(TimeOfDay(self.day_start, self.day_end))
+        region = self.region()
+        if region is not None:
+            predicates.append(region)
+        return And(*predicates)
+
+    def candidates(self, segment):
+        """Rows from the most selective index this query can use, or None for a full scan."""
+        rows = None
+        if self.place:
+            rows = select_place(segment, self.place)
+        if self.text:
+            text_rows = select_text(segment, self.text)
+            rows = text_rows if rows is None else np.intersect1d(rows, text_rows)
+        if rows is not None:
+            return rows
+        region = self.region()
+        if region is not None:
+            return select_region(segment, region)
+        # Otherwise the smallest of the time, depth and magnitude candidates;
+        # the predicate checks every other criterion on them in the same pass
+        if self.start is not None or self.end is not None or self.day_start is not None:
+            rows = select_datetime(segment, self.start, self.end, self.day_start, self.day_end)
+        depth = depth_bounds(self.depth_predicates)
+        if depth is not None:
+            depth_rows = select_depth(segment, *depth)
+            # Like magnitude partitions, a wide depth range is cheaper as one pass over the column
+            if len(depth_rows) <= PARTITION_SHARE * len(segment) and (rows is None or len(depth_rows) < len(rows)):
+                rows = depth_rows
+        bounds = magnitude_bounds(self.magnitude_predicates)
+        if bounds is not None and partition_selective(segment, bounds[0], bounds[1]) and \
+                (rows is None or partition_size(segment, bounds[0], bounds[1]) < len(rows)):
+            return select_magnitude(segment, *bounds)
+        return rows
+
+    def select(self, segment):
+        """Matching rows of a segment, in the requested order."""
+        if self.relative():
+            return self.resolved().select(segment)
+        with counters.timer('filter'):
+            predicate = self.predicate()
+            rows = self.candidates(segment)
+            if rows is None:
+                rows = select(segment, predicate)
+            elif len(rows) and predicate.predicates:
+                columns = segment_columns(segment)
+                rows = rows[predicate.mask(RowColumns(columns, rows))]
+            counters.count_file(segment.source, entries=len(segment))
+            return ordered(segment, rows, self.sort)
+
+    def scan_filter(self):
+        """(predicate, accept) pair for atom_filter.scan_feed: the column predicates, then place and text on the title."""
+        if self.relative():
+            return self.resolved().scan_filter()
+        predicate = self.predicate()
+        checks = []
+        if self.place:
+            place = self.place.lower()
+            checks.append(lambda title: split_place(title)[1].lower() == place)
+        if self.text:
+            terms = set(tokenize(self.text))
+
+            def has_terms(title):
+                tokens = location_tokens(title)
+                return bool(terms) and all(any(token.startswith(term) for token in tokens) for term in terms)
+            checks.append(has_terms)
+        accept = None
+        if checks:
+            def accept(feed, row):
+                title = feed.text(row, 'title')
+                return all(check(title) for check in checks)
+        return (predicate if predicate.predicates else None), accept
+
+    def scan(self, source, name=None):
+        """Matching Events of a raw feed path or stream, read without an index, in the requested order."""
+        events = [event for matches in scan_feed(source, [self.scan_filter()], name=name) for event in matches[0]]
+        return sort_events(events, self.sort)
+
+    def paged(self):
+        return self.limit is not None or self.after is not None
+
+    def iter_select(self, segment):
+        """Matching rows of a segment after the cursor, in the requested order, produced lazily.
+
+        Rows are read from the sorted index in growing blocks and tested
+        against the predicate, so a caller that stops early never touches the
+        rest of the segment.
+        """
+        if self.relative():
+            yield from self.resolved().iter_select(segment)
+            return
+        predicate = self.predicate()
+        candidates = self.candidates(segment)
+        member = None
+        if candidates is not None:
+            member = np.zeros(len(segment), dtype=bool)
+            member[candidates] = True
+        columns = segment_columns(segment)
+        block = FIRST_BLOCK
+        for rows in sort_sequence(segment, self.sort, self.after_key):
+            start = 0
+            while start < len(rows):
+                chunk = rows[start:start + block]
+                start += len(chunk)
+                block = min(block * 2, MAX_BLOCK)
+                keep = member[chunk] if member is not None else np.ones(len(chunk), dtype=bool)
+                if predicate.predicates:
+                    keep &= predicate.mask(RowColumns(columns, chunk))
+                yield from chunk[keep]
+
+
+class EventStore:
+    """Indexes for a set of folders, loaded once and shared by any number of queries.
+
+    `stores` are memory-mapped store files (see atom_store) searched alongside
+    the folders. With scan=True no index is built or read: every query
+    streams the raw feeds, decoding only the fields its filters need, and a
+    batch scans its feeds in a pool of `workers` processes.
+
+    With a `cache` (an atom_cache.ResultCache) the matches of each query are
+    kept per feed across runs, so repeating a query only re-reads what changed.
+    Paged queries stop early and are not cached, nor are queries over the
+    last hours or days, whose window moves with the clock.
+    """
+
+    def __init__(self, folders, merge=False, workers=None, stores=(), scan=False, cache=None):
+        self.folders = list(folders)
+        self.merge = merge
+        self.workers = workers
+        self.scan = scan
+        self.cache = cache
+        self.indexes = []
+        self.stores = []
+        self._merged = None
+        if scan:
+            if merge or stores:
+                raise ValueError("Scanning reads raw feeds one at a time; it cannot merge them or read stores")
+            return
+        if workers != 1 and self.folders:
+            refresh_folders(self.folders, workers)
+        self.indexes = [open_index(folder_path) for folder_path in self.folders]
+        self.stores = [open_store(store_path) for store_path in stores]
+
+    def refresh(self):
+        """Pick up new or changed feeds; returns the number of feeds re-parsed."""
+        if self.scan:
+            return 0
+        rebuilt = sum(index.refresh() for index in self.indexes)
+        if rebuilt:
+            self._merged = None
+        return rebuilt
+
+    def set_folders(self, folders):
+        """Serve `folders` from now on, indexing new ones and dropping the rest; returns how many came or went."""
+        folders = list(folders)
+        changed = len(set(folders) ^ set(self.folders))
+        if not changed:
+            return 0
+        if not self.scan:
+            indexes = {index.folder_path: index for index in self.indexes}
+            self.indexes = [indexes.get(folder_path) or open_index(folder_path) for folder_path in folders]
+            self._merged = None
+        self.folders = folders
+        return changed
+
+    def feed_sources(self):
+        """(file_path, source) for every raw feed, as atom_feed.iter_feed_sources gives them."""
+        for folder_path in self.folders:
+            yield from iter_feed_sources(folder_path)
+
+    def segments(self):
+        segments = [segment for index in self.indexes for segment in index.segments] + self.stores
+        if not self.merge:
+            return segments
+        if self._merged is None:
+            label = ', '.join(self.folders + [store.source for store in self.stores])
+            self._merged = merge_segments(segments, label)
+        return [self._merged]
+
+    def caches(self, query):
+        """Whether results of `query` go through the result cache; relative time windows never do."""
+        return self.cache is not None and not query.relative()
+
+    def select(self, query, segment):
+        """query.select(segment), through the result cache."""
+        if not self.caches(query):
+            return query.select(segment)
+        return self.cache.rows(query.key(), segment, lambda: query.select(segment))
+
+    def scan_events(self, query, file_path, source):
+        """query.scan of one raw feed, through the result cache."""
+        events = self.cache.cached_events(query.key(), file_path) if self.caches(query) else None
+        if events is None:
+            events = query.scan(source, file_path)
+            if self.caches(query):
+                self.cache.store_events(query.key(), file_path, events)
+        return events
+
+    def save_cache(self):
+        if self.cache is not None:
+            self.cache.save()
+
+    def page(self, query):
+        """The first `query.limit` matches after `query.after`, as [(segment, row)], and the next cursor.
+
+        Each segment streams its matches in order and heapq.merge keeps one
+        pending row per segment, so the work done is bounded by the page size
+        rather than by the number of matches. The cursor is None on the last page.
+        """
+        if self.scan:
+            raise ValueError("Paged queries need the index")
+        descending = bool(query.sort) and query.sort.startswith('-')
+        segments = self.segments()
+        ranks = {source: rank for rank, source in enumerate(sorted(segment.source for segment in segments))}
+
+        def keyed(segment):
+            for row in query.iter_select(segment):
+                missing, value, source, row = row_key(segment, query.sort, row)
+                # Rows without a value come last in both directions, in (source, row)
+                # order; the merge runs in reverse when descending, so their key is negated
+                if descending:
+                    key = (0, 0.0, -ranks[source], -row) if missing else (1, value, ranks[source], row)
+                else:
+                    key = (missing, value, source, row)
+                yield key, segment, row
+
+        merged = heapq.merge(*(keyed(segment) for segment in segments), key=itemgetter(0), reverse=descending)
+        limit = None if query.limit is None else query.limit + 1
+        results = [(segment, row) for _, segment, row in islice(merged, limit)]
+        cursor = None
+        if query.limit is not None and len(results) > query.limit:
+            results = results[:query.limit]
+            segment, row = results[-1]
+            cursor = encode_cursor(row_key(segment, query.sort, row))
+        return results, cursor
+
+    def run(self, query):
+        """Yield (source, events) for every feed, with the events matching `query`."""
+        if self.scan and not query.paged():
+            for file_path, source in self.feed_sources():
+                yield file_path, self.scan_events(query, file_path, source)
+            return
+        if query.paged():
+            results, _ = self.page(query)
+            yield from page_groups(results)
+            return
+        for segment in self.segments():
+            yield segment.source, iter_rows(segment, self.select(query, segment))
+
+    def write(self, query, path=RESULTS_PATH, output_format='text'):
+        """Run a query and stream its matches to `path`; returns the writer."""
+        return self.write_batch([(query, path, output_format)])[0]
+
+    def write_batch(self, jobs):
+        """Run several (query, path, output_format) jobs in a single pass over the segments.
+
+        Each segment is visited once: every query is evaluated against its
+        columns while they are hot, rows matched by several queries are decoded
+        only once, and each match is routed to its own query's writer.
+        """
+        paths = [result_path(path, output_format) for _, path, output_format in jobs]
+        if len(set(paths)) != len(paths):
+            raise ValueError("Every query in a batch needs its own output path")
+        if self.scan and any(query.paged() for query, _, _ in jobs):
+            raise ValueError("Paged queries need the index")
+
+        writers = []
+        try:
+            for query, path, output_format in jobs:
+                writers.append(open_writer(path, output_format, header=f"The following match {query.describe()}"))
+            if self.scan:
+                self._scan_batch(jobs, writers)
+            else:
+                self._index_batch(jobs, writers)
+        finally:
+            for writer in writers:
+                writer.close()
+            self.save_cache()
+        return writers
+
+    def _index_batch(self, jobs, writers):
+        batch = [(query, writer) for (query, _, _), writer in zip(jobs, writers) if not query.paged()]
+        for segment in self.segments():
+            selections = [self.select(query, segment) for query, _ in batch]
+            uses, decoded = _shared_rows(selections), {}
+            for (query, writer), rows in zip(batch, selections):
+                writer.write_group(segment.source, _decode(segment, rows, uses, decoded))
+        # Paged queries stop early instead of joining the shared pass
+        for (query, _, _), writer in zip(jobs, writers):
+            if query.paged():
+                results, writer.next_cursor = self.page(query)
+                for source, events in page_groups(results):
+                    writer.write_group(source, events)
+
+    def _scan_batch(self, jobs, writers):
+        queries = [query for query, _, _ in jobs]
+        scans = self._scan_serial(queries) if worker_count(self.workers) == 1 else self._scan_pooled(queries)
+        for file_path, found in scans:
+            for writer, events in zip(writers, found):
+                writer.write_group(file_path, events)
+
+    def _cached_scans(self, queries, file_path):
+        return [self.cache.cached_events(query.key(), file_path) if self.caches(query) else None
+                for query in queries]
+
+    def _store_scans(self, queries, file_path, found, scanned):
+        for i in scanned:
+            if self.caches(queries[i]):
+                self.cache.store_events(queries[i].key(), file_path, found[i])
+
+    def _scan_serial(self, queries):
+        """Yield (file_path, [matches of each query]) for every raw feed, scanned in this process."""
+        filters = [query.scan_filter() for query in queries]
+        for file_path, source in self.feed_sources():
+            found = self._cached_scans(queries, file_path)
+            # The queries without cached results share one pass over the feed
+            missing = [i for i, events in enumerate(found) if events is None]
+            if missing:
+                scanned = [[] for _ in missing]
+                for matches in scan_feed(source, [filters[i] for i in missing], name=file_path):
+                    for events, block_events in zip(scanned, matches):
+                        events.extend(block_events)
+                for i, events in zip(missing, scanned):
+                    found[i] = sort_events(events, queries[i].sort)
+                self._store_scans(queries, file_path, found, missing)
+            yield file_path, found
+
+    def _scan_pooled(self, queries):
+        """Like _scan_serial, with each feed file and each archive scanned by a pool worker.
+
+        Feeds whose results are all cached are not handed to the pool. An
+        archive is read in one streaming pass, so its members are only known,
+        and its results only cached, once a worker has scanned it.
+        """
+        # Relative windows are fixed here, so every worker counts back from the same time
+        resolved = [query.resolved() for query in queries]
+        plan = []
+        tasks = []
+        for folder_path in self.folders:
+            if is_archive(folder_path):
+                plan.append((folder_path, None, None))
+                tasks.append((folder_path, None, resolved))
+                continue
+            for file_path in list_feed_files(folder_path):
+                found = self._cached_scans(queries, file_path)
+                missing = [i for i, events in enumerate(found) if events is None]
+                plan.append((file_path, found, missing))
+                if missing:
+                    tasks.append((folder_path, file_path, [resolved[i] for i in missing]))
+        results = scan_files(tasks, self.workers)
+        for file_path, found, missing in plan:
+            if missing is None:
+                for member_path, scanned in next(results):
+                    self._store_scans(queries, member_path, scanned, range(len(queries)))
+                    yield member_path, scanned
+                continue
+            if missing:
+                [(_, scanned)] = next(results)
+                for i, events in zip(missing, scanned):
+                    found[i] = events
+                self._store_scans(queries, file_path, found, missing)
+            yield file_path, found
+
+
+def page_groups(results):
+    """(source, events) for runs of consecutive page rows from the same segment."""
+    for segment, group in groupby(results, key=itemgetter(0)):
+        yield segment.source, [segment.event(row) for _, row in group]
+
+
+def _shared_rows(selections):
+    """{row: number of selections holding it} for the rows that more than one selection holds."""
+    if len(selections) < 2:
+        return {}
+    rows, counts = np.unique(np.concatenate(selections), return_counts=True)
+    shared = counts > 1
+    return dict(zip(rows[shared].tolist(), counts[shared].tolist()))
+
+
+def _decode(segment, rows, uses, decoded):
+    """Events of `rows`; a row still due in `uses` is kept in `decoded` until its last use."""
+    for row in rows:
+        row = int(row)
+        remaining = uses.get(row)
+        if remaining is None:
+            yield segment.event(row)
+            continue
+        event = decoded.pop(row) if row in decoded else segment.event(row)
+        if remaining > 1:
+            decoded[row] = event
+        uses[row] = remaining - 1
+        yield event
+
+
+def date_start(value):
+    """Epoch seconds at the start of a YYYY-MM-DD day."""
+    return calendar.timegm(date.fromisoformat(value).timetuple())
+
+
+def day_seconds(value):
+    """Seconds since midnight for HH, HH:MM or HH:MM:SS."""
+    if len(value) <= 2:
+        value = f'{int(value):02d}:00'
+    parsed = time.fromisoformat(value)
+    return parsed.hour * 3600 + parsed.minute * 60 + parsed.second + parsed.microsecond / 1e6
+
+
+def _instant(seconds):
+    return datetime.fromtimestamp(seconds, timezone.utc).isoformat(timespec='seconds')
+
+
+def _clock(seconds):
+    seconds = int(seconds)
+    return f'{seconds // 3600:02d}:{seconds % 3600 // 60:02d}:{seconds % 60:02d}'
+
+
+def duration_seconds(text):
+    """Seconds in a duration such as '90m', '24h' or '7d'."""
+    units = {'s': 1, 'm': 60, 'h': 3600, 'd': 86400}
+    try:
+        return float(text[:-1]) * units[text[-1:].lower()]
+    except (KeyError, ValueError):
+        raise ValueError(f"Invalid duration: {text}; use a number of s, m, h or d, e.g. 24h") from None
+
+
+def _floats(count):
+    def parse(text):
+        values = [float(value) for value in text.replace(',', ' ').split()]
+        if len(values) != count:
+            raise argparse.ArgumentTypeError(f"expected {count} numbers, got {text!r}")
+        return values
+    return parse
+
+
+def add_query_arguments(parser):
+    parser.add_argument('--magnitude', action='append',
+                        help="magnitude filter, e.g. '>=2.5' or '1.0-3.7'; repeat to combine")
+    parser.add_argument('--depth', action='append',
+                        help=f"depth band ({', '.join(DEPTH_BANDS)}) or km filter, e.g. '<10' or '70-300'; "
+                             "repeat to combine")
+    parser.add_argument('--from', dest='date_from', help="first day, YYYY-MM-DD")
+    parser.add_argument('--to', dest='date_to', help="last day (inclusive), YYYY-MM-DD")
+    parser.add_argument('--last', metavar='DURATION', help="only events updated in the last DURATION, e.g. 24h or 7d")
+    parser.add_argument('--time-from', help="start of a UTC time-of-day window, HH[:MM[:SS]]")
+    parser.add_argument('--time-to', help="end of the time-of-day window (inclusive)")
+    parser.add_argument('--place', help="exact place at the end of the title, e.g. CA")
+    parser.add_argument('--text', help="words or word prefixes of the location, e.g. 'nne geysers'")
+    parser.add_argument('--near', type=_floats(3), metavar='LAT,LON,KM', help="radius search")
+    parser.add_argument('--bbox', type=_floats(4), metavar='S,W,N,E', help="bounding-box search")
+    parser.add_argument('--sort', choices=SORT_KEYS, help="order results by time, magnitude or depth")
+    parser.add_argument('--desc', action='store_true', help="sort in descending order")
+    parser.add_argument('--limit', type=int, help="return only the first N matches (top N with --sort)")
+    parser.add_argument('--after', metavar='CURSOR', help="continue after the cursor printed for the previous page")
+    parser.add_argument('--format', choices=sorted(FORMATS), default='text', help="output format")
+    parser.add_argument('--output', default=RESULTS_PATH)
+
+
+def query_from_args(args):
+    start = date_start(args.date_from) if args.date_from else None
+    end = date_start(args.date_to) + 86400 if args.date_to else None
+    if start is not None and end is not None and start >= end:
+        # Query rejects this too, but in terms of the window rather than the days given
+        raise ValueError(f"Invalid date range: --from {args.date_from} is after --to {args.date_to}")
+    day_start = day_seconds(args.time_from) if args.time_from else None
+    day_end = day_seconds(args.time_to) if args.time_to else None
+    return Query(magnitude=args.magnitude, depth=args.depth, start=start, end=end, last=args.last,
+                 day_start=day_start, day_end=day_end, place=args.place, text=args.text, near=args.near, bbox=args.bbox,
+                 sort=('-' + args.sort if args.desc else args.sort) if args.sort else None,
+                 limit=args.limit, after=args.after)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Search Atom earthquake feeds without prompts.")
+    parser.add_argument('folders', nargs='+',
+                        help=f"snapshot folders, folder globs, a root directory or *{STORE_SUFFIX} store files")
+    parser.add_argument('--merge', action='store_true', help="de-duplicate events across every feed")
+    parser.add_argument('--workers', type=int, help="processes used to (re)index or --scan feeds; 1 disables the pool")
+    parser.add_argument('--queries', help="file with one query per line, in the same --option syntax")
+    parser.add_argument('--scan', action='store_true',
+                        help="read the raw feeds instead of building or using indexes, e.g. for one-off queries")
+    add_query_arguments(parser)
+    add_cache_arguments(parser)
+    add_profile_arguments(parser)
+    args = parser.parse_args(argv)
+
+    query_parser = argparse.ArgumentParser(prog='query line')
+    add_query_arguments(query_parser)
+    try:
+        jobs = [(query_from_args(args), args.output, args.format)]
+        if args.queries:
+            with open(args.queries, encoding='utf-8') as query_file:
+                lines = [line for line in query_file if line.strip() and not line.lstrip().startswith('#')]
+            jobs = []
+            for line in lines:
+                line_args = query_parser.parse_args(shlex.split(line))
+                jobs.append((query_from_args(line_args), line_args.output, line_args.format))
+    except ValueError as e:
+        parser.error(str(e))
+
+    if len({result_path(output, output_format) for _, output, output_format in jobs}) != len(jobs):
+        parser.error("every query needs its own --output")
+
+    stores = [path for path in args.folders if path.endswith(STORE_SUFFIX)]
+    try:
+        folders = find_feed_folders([path for path in args.folders if path not in stores])
+        with profiled(args.profile, args.profile_output):
+            store = EventStore(folders, args.merge, args.workers, stores, args.scan, cache_from_args(args))
+            writers = store.write_batch(jobs)
+    except ValueError as e:
+        parser.error(str(e))
+    for (query, _, _), writer in zip(jobs, writers):
+        print(f"{writer.count} matches for {query.describe()} written to '{writer.path}'")
+        if getattr(writer, 'next_cursor', None):
+            print(f"  next page: --after {writer.next_cursor}")
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,37 @@
+from atom_cache import ResultCache
+from atom_feed import ask_merge
+from atom_filter import DEPTH_BANDS
+from atom_index import iter_segment_groups
+from atom_output import open_writer
+from atom_query import Query
+from atom_sort import ask_sort, iter_rows
+
+def search_depth(folder_path, depth_option, magnitude_option='', merge=False, output_format='text', sort_key=None):
+    # The depth range is read from each feed's sorted depth index and the
+    # magnitude checked on the same rows, so both filters take one pass
+    try:
+        query = Query(magnitude=magnitude_option or None, depth=depth_option, sort=sort_key)
+    except ValueError as e:
+        print(f"Invalid search: {e}")
+        return
+
+    header = f"The following are at depth {depth_option}"
+    if magnitude_option:
+        header += f" and of magnitude {magnitude_option}"
+    with ResultCache() as cache, open_writer('displayfiles\\display_search_results.txt', output_format, header=header, use_link=True) as writer:
+        for segment in iter_segment_groups(folder_path, merge):
+            rows = cache.rows(query.key(), segment, lambda: query.select(segment))
+            writer.write_group(segment.source, iter_rows(segment, rows))
+
+    print(f"Search results written to '{writer.path}'")
+
+def main():
+    depth_option = input(f"Enter the depth band ({', '.join(DEPTH_BANDS)}) or range in km (e.g., <10, >=300, 70-300): ").strip()
+    magnitude_option = input("Enter a magnitude filter too, or leave blank (e.g., >=3): ").strip()
+
+    folder_path = '25-01-28'
+
+    search_depth(folder_path, depth_option, magnitude_option, ask_merge(), sort_key=ask_sort())
+
+if __name__ == "__main__":
+    main()
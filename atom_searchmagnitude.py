@@ -1,94 +1,66 @@
-import os
-import xml.etree.ElementTree as ET
-
-def get_magnitude_entries(magnitude_option, files_path):
-    magnitude_dict = {
-        '0': ['Magnitude 0'],
-        '>=0': ['Magnitude 0', 'Magnitude 1', 'Magnitude 2', 'Magnitude 3', 'Magnitude 4', 'Magnitude 5'],
-        '>0': ['Magnitude 1', 'Magnitude 2', 'Magnitude 3', 'Magnitude 4', 'Magnitude 5'],
-        '1': ['Magnitude 1'],
-        '>=1': ['Magnitude 1', 'Magnitude 2', 'Magnitude 3', 'Magnitude 4', 'Magnitude 5'],
-        '>1': ['Magnitude 2', 'Magnitude 3', 'Magnitude 4', 'Magnitude 5'],
-        '<=1': ['Magnitude 0', 'Magnitude 1'],
-        '<1': ['Magnitude 0'],
-        '2': ['Magnitude 2'],
-        '>=2': ['Magnitude 2', 'Magnitude 3', 'Magnitude 4', 'Magnitude 5'],
-        '>2': ['Magnitude 3', 'Magnitude 4', 'Magnitude 5'],
-        '<=2': ['Magnitude 0', 'Magnitude 1', 'Magnitude 2'],
-        '<2': ['Magnitude 0', 'Magnitude 1'],
-        '3': ['Magnitude 3'],
-        '>=3': ['Magnitude 3', 'Magnitude 4', 'Magnitude 5'],
-        '>3': ['Magnitude 4', 'Magnitude 5'],
-        '<=3': ['Magnitude 0', 'Magnitude 1', 'Magnitude 2', 'Magnitude 3'],
-        '<3': ['Magnitude 0', 'Magnitude 1', 'Magnitude 2'],
-        '4': ['Magnitude 4'],
-        '>=4': ['Magnitude 4', 'Magnitude 5'],
-        '>4': ['Magnitude 5'],
-        '<=4': ['Magnitude 0', 'Magnitude 1', 'Magnitude 2', 'Magnitude 3', 'Magnitude 4'],
-        '<4': ['Magnitude 0', 'Magnitude 1', 'Magnitude 2', 'Magnitude 3'],
-        '5': ['Magnitude 5'],
-        '<=5': ['Magnitude 0', 'Magnitude 1', 'Magnitude 2', 'Magnitude 3', 'Magnitude 4', 'Magnitude 5'],
-        '<5': ['Magnitude 0', 'Magnitude 1', 'Magnitude 2', 'Magnitude 3', 'Magnitude 4']
-    }
-
-    if magnitude_option not in magnitude_dict:
-        return  
-
-    valid_magnitudes = magnitude_dict[magnitude_option]
-    all_entries = []
-
-    for filename in os.listdir(files_path):
-        if filename.endswith(".atom"):
-            file_path = os.path.join(files_path, filename)
-
-            try:
-                tree = ET.parse(file_path)
-                root = tree.getroot()
-            except ET.ParseError as e:
-                continue
-
-            namespace = {
-                'atom': 'http://www.w3.org/2005/Atom',
-                'georss': 'http://www.georss.org/georss'
-            }
-
-            for entry in root.findall('atom:entry', namespace):
-                title = entry.find('atom:title', namespace).text
-                link = entry.find('atom:link', namespace).get('href')
-                published = entry.find('atom:updated', namespace).text
-                coordinates = entry.find('georss:point', namespace).text
-                elevation = entry.find('georss:elev', namespace).text
-
-                age = None
-                for category in entry.findall('atom:category', namespace):
-                    if category.get('label') == 'Age':
-                        age = category.get('term')
-
-                magnitude = None
-                for category in entry.findall('atom:category', namespace):
-                    if category.get('label') == 'Magnitude':
-                        magnitude = category.get('term')
-
-                if magnitude in valid_magnitudes:
-                    event_data = f"Title: {title}\nID: {link}\nPublished: {published}\nCoordinates: {coordinates}\nElevation/Depth: {elevation}\nOccurred: {age if age else 'N/A'}\nMagnitude: {magnitude if magnitude else 'N/A'}\n{'-'*120}"
-                    all_entries.append((file_path, event_data))
-
-    if not all_entries:
+import math
+
+from atom_cache import ResultCache
+from atom_feed import ask_merge
+from atom_filter import magnitude_bounds, parse_magnitude, select_magnitude
+from atom_index import iter_segment_groups
+from atom_output import open_writer
+from atom_sort import iter_rows
+
+
+def magnitude_range(magnitude_option):
+    """(low, high, low_inclusive, high_inclusive) for an option such as '3', '>=1', '<3' or '1.0-3.7'.
+
+    Whole numbers name the feed's 'Magnitude N' categories, which hold
+    magnitudes from N up to but excluding N + 1, so '>3' starts at 4. The
+    feeds file negative magnitudes under 'Magnitude 0'. Anything else is an
+    exact magnitude expression. Raises ValueError for an invalid option.
+
+    The lower bound is always a number (-inf when there is none), so events
+    without a magnitude never match.
+    """
+    for operator in ('<=', '>=', '<', '>', ''):
+        if magnitude_option.startswith(operator):
+            break
+    try:
+        bucket = int(magnitude_option[len(operator):])
+    except ValueError:
+        low, high, low_inclusive, high_inclusive = magnitude_bounds([parse_magnitude(magnitude_option)])
+        return (-math.inf if low is None else low), high, low_inclusive, high_inclusive
+    low, high = {
+        '': (bucket, bucket + 1),
+        '>=': (bucket, None),
+        '>': (bucket + 1, None),
+        '<=': (None, bucket + 1),
+        '<': (None, bucket),
+    }[operator]
+    if low is None or low <= 0:
+        low = -math.inf
+    return low, high, True, False
+
+
+def get_magnitude_entries(magnitude_option, files_path, merge=False, output_format='text'):
+    try:
+        bounds = magnitude_range(magnitude_option)
+    except ValueError:
+        print(f"Invalid magnitude option: {magnitude_option}")
         return
 
-    output_file = 'displayfiles//display_search_results.txt'
-    with open(output_file, 'w') as file:
-        file.write(f"\nThe following are of magnitude {magnitude_option}\n")
-        file.write("="*50 + "\n")
+    header = f"The following are of magnitude {magnitude_option}"
+    key = ['magnitude_range', *bounds]
+    with ResultCache() as cache, open_writer('displayfiles\\display_search_results.txt', output_format, header=header, use_link=True) as writer:
+        for segment in iter_segment_groups(files_path, merge):
+            rows = cache.rows(key, segment, lambda: select_magnitude(segment, *bounds))
+            writer.write_group(segment.source, iter_rows(segment, rows))
+
+    print(f"Search results written to '{writer.path}'")
 
-        for file_path, entry_data in all_entries:
-            file.write(f"\nFile path data was retrieved from: {file_path}\n")
-            file.write("-"*40 + "\n")
-            file.write(entry_data + "\n")
-            file.write("*" * 40 + "\n")
+def main():
+    magnitude_option = input("Enter the magnitude option (e.g., >=1, <3, 2.5-4, etc.): ").strip()
 
-magnitude_option = input("Enter the magnitude option (e.g., >=1, <3, etc.): ").strip()
+    folder_path = '25-01-28'
 
-folder_path = '25-01-28'  
+    get_magnitude_entries(magnitude_option, folder_path, ask_merge())
 
-get_magnitude_entries(magnitude_option, folder_path)
+if __name__ == "__main__":
+    main()
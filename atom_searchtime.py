@@ -1,93 +1,65 @@
-import os
-import xml.etree.ElementTree as ET
+import calendar
+import re
+from datetime import date
+from atom_cache import ResultCache
+from atom_feed import ask_merge
+from atom_index import iter_segment_groups
+from atom_output import open_writer
+from atom_sort import ask_sort, iter_rows, ordered, select_datetime
 
-def write_matching_entries(results, search_option, user_input):
-    with open('displayfiles\\display_search_results.txt', 'w') as file:
-        if search_option == 'date':
-            file.write(f"\nThe following took place on {user_input}\n")
-        elif search_option == 'time':
-            file.write(f"\nThe following took place at {user_input}\n")
-        elif search_option == 'both':
-            file.write(f"\nThe following took place on {user_input}\n")
-        
-        file.write("\n=========================================\n")
-        
-        for result in results:
-            file.write(f"File path data was retrieved from: {result['file_path']}\n")
-            file.write("\n----------------------------------------\n")
-            file.write("All matching entries\n")
-            file.write("***************************************\n")
-            
-            for entry in result['entries']:
-                file.write(f"Title: {entry['title']}\n")
-                file.write(f"ID: {entry['id']}\n")
-                file.write(f"Published: {entry['published']}\n")
-                file.write(f"Coordinates: {entry['coordinates']}\n")
-                file.write(f"Elevation/Depth: {entry['elevation']}\n")
-                file.write(f"Occurred: {entry['age']}\n")
-                file.write(f"Magnitude: {entry['magnitude']}\n")
-                file.write("-" * 120 + "\n")
+def date_prefix_window(text):
+    """[start, end) epoch seconds covered by a YYYY, YYYY-MM or YYYY-MM-DD prefix."""
+    parts = [int(part) for part in text.strip().split('-')]
+    if len(parts) == 1:
+        start, end = date(parts[0], 1, 1), date(parts[0] + 1, 1, 1)
+    elif len(parts) == 2:
+        year, month = parts
+        start = date(year, month, 1)
+        end = date(year + month // 12, month % 12 + 1, 1)
+    elif len(parts) == 3:
+        start = date(*parts)
+        end = date.fromordinal(start.toordinal() + 1)
+    else:
+        raise ValueError(f"Unrecognised date: {text}")
+    return calendar.timegm(start.timetuple()), calendar.timegm(end.timetuple())
 
-def search_atom_files(folder_path, search_option, user_input):
-    results = []
-    
-    for filename in os.listdir(folder_path):
-        if filename.endswith('.atom'):
-            file_path = os.path.join(folder_path, filename)
-            tree = ET.parse(file_path)
-            root = tree.getroot()
+def time_prefix_window(text):
+    """Inclusive [start, end] seconds of the day covered by an HH, HH-MM or HH:MM prefix."""
+    parts = [int(part) for part in re.split('[-:]', text.strip())]
+    if len(parts) == 1 and 0 <= parts[0] < 24:
+        start, span = parts[0] * 3600, 3600
+    elif len(parts) == 2 and 0 <= parts[0] < 24 and 0 <= parts[1] < 60:
+        start, span = parts[0] * 3600 + parts[1] * 60, 60
+    else:
+        raise ValueError(f"Unrecognised time: {text}")
+    return start, start + span - 1e-6
 
-            namespace = {'atom': 'http://www.w3.org/2005/Atom', 'georss': 'http://www.georss.org/georss'}
-            
-            matching_entries = []
-            
-            for entry in root.findall('atom:entry', namespace):
-                updated = entry.find('atom:updated', namespace).text
-                date, time = updated.split('T')
-                
-                if search_option == 'date' and date.startswith(user_input):
-                    matching_entries.append(parse_entry(entry, namespace))
-                elif search_option == 'time' and time.startswith(user_input):
-                    matching_entries.append(parse_entry(entry, namespace))
-                elif search_option == 'both' and (date.startswith(user_input[:10]) and time.startswith(user_input[11:])):
-                    matching_entries.append(parse_entry(entry, namespace))
+def search_atom_files(folder_path, search_option, user_input, merge=False, output_format='text', sort_key=None):
+    start = end = day_start = day_end = None
+    try:
+        if search_option in ('date', 'both'):
+            start, end = date_prefix_window(user_input[:10] if search_option == 'both' else user_input)
+        if search_option in ('time', 'both'):
+            day_start, day_end = time_prefix_window(user_input[11:] if search_option == 'both' else user_input)
+    except ValueError:
+        print(f"Invalid date or time: {user_input}")
+        return
 
-            if matching_entries:
-                results.append({
-                    'file_path': file_path,
-                    'entries': matching_entries
-                })
-    
-  
-    if results:
-        write_matching_entries(results, search_option, user_input)
+    if search_option == 'time':
+        header = f"The following took place at {user_input}"
     else:
-        print("No matching entries found.")
+        header = f"The following took place on {user_input}"
 
-def parse_entry(entry, namespace):
-    title = entry.find('atom:title', namespace).text
-    id = entry.find('atom:id', namespace).text
-    published = entry.find('atom:updated', namespace).text
-    coordinates = entry.find('georss:point', namespace).text
-    elevation = entry.find('georss:elev', namespace).text
+    key = ['datetime', start, end, day_start, day_end]
+    with ResultCache() as cache, open_writer('displayfiles\\display_search_results.txt', output_format, header=header) as writer:
+        for segment in iter_segment_groups(folder_path, merge):
+            rows = cache.rows(key, segment, lambda: select_datetime(segment, start, end, day_start, day_end))
+            writer.write_group(segment.source, iter_rows(segment, ordered(segment, rows, sort_key)))
 
-    age = None
-    magnitude = None
-    for category in entry.findall('atom:category', namespace):
-        if category.get('label') == 'Age':
-            age = category.get('term')
-        if category.get('label') == 'Magnitude':
-            magnitude = category.get('term')
-
-    return {
-        'title': title,
-        'id': id,
-        'published': published,
-        'coordinates': coordinates,
-        'elevation': elevation,
-        'age': age,
-        'magnitude': magnitude
-    }
+    if writer.count:
+        print(f"Search results written to '{writer.path}'")
+    else:
+        print("No matching entries found.")
 
 
 def get_user_input_and_search():
@@ -112,6 +84,7 @@ def get_user_input_and_search():
         print("Invalid choice. Exiting.")
         return
 
-    search_atom_files(folder_path, search_option, user_input)
+    search_atom_files(folder_path, search_option, user_input, ask_merge(), sort_key=ask_sort())
 
-get_user_input_and_search()
+if __name__ == "__main__":
+    get_user_input_and_search()
@@ -0,0 +1,328 @@
+import argparse
+import asyncio
+import json
+import sys
+import time
+from collections import OrderedDict, deque
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import parse_qsl, urlsplit
+
+from atom_aggregate import aggregate
+from atom_cache import add_cache_arguments, cache_from_args
+from atom_parallel import find_feed_folders
+from atom_profile import counters
+from atom_query import EventStore, add_query_arguments, page_groups, query_from_args
+
+CACHE_SIZE = 256
+RELOAD_INTERVAL = 2.0
+LATENCY_WINDOW = 10000
+_STATUS = {200: 'OK', 400: 'Bad Request', 404: 'Not Found', 405: 'Method Not Allowed'}
+
+
+class QueryError(ValueError):
+    pass
+
+
+class _QueryParser(argparse.ArgumentParser):
+    def error(self, message):
+        raise QueryError(message)
+
+
+def query_from_params(parser, params):
+    """Build a Query from URL parameters named like the atom_query options, e.g. ?magnitude=>=2.5&place=CA."""
+    argv = []
+    for name, value in params:
+        if name == 'desc':
+            if value.lower() not in ('', '0', 'false', 'no'):
+                argv.append('--desc')
+            continue
+        argv += [f"--{name.replace('_', '-')}", value]
+    args = parser.parse_args(argv)
+    try:
+        return query_from_args(args)
+    except ValueError as e:
+        raise QueryError(str(e))
+
+
+def percentile(values, fraction):
+    ordered = sorted(values)
+    if not ordered:
+        return None
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+
+class QueryService:
+    """An EventStore held in memory, answering queries as JSON through an LRU cache of encoded results.
+
+    Cache hits are answered on the event loop. Anything that reads the store
+    (a cache miss, a reload, the stats) runs on one worker thread, so slow
+    queries never stall other connections and the store is only ever used
+    by one thread at a time. With `patterns` (the folder arguments) each
+    reload expands them again, so new snapshot folders are picked up.
+    """
+
+    def __init__(self, store, cache_size=CACHE_SIZE, patterns=None):
+        self.store = store
+        self.cache_size = cache_size
+        self.patterns = patterns
+        self.cache = OrderedDict()
+        self.hits = self.misses = self.reloads = 0
+        self.latencies = deque(maxlen=LATENCY_WINDOW)
+        self.parser = _QueryParser(prog='query', add_help=False)
+        add_query_arguments(self.parser)
+        self.executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='store')
+
+    def run(self, function, *args):
+        """Run function(*args) on the store's worker thread."""
+        return asyncio.get_running_loop().run_in_executor(self.executor, function, *args)
+
+    def _encode(self, build):
+        body = json.dumps(build()).encode('utf-8')
+        self.store.save_cache()
+        return body
+
+    async def cached(self, key, build, relative=False):
+        """The encoded body stored under `key`, building it with build() on the worker thread on a miss.
+
+        A relative query (over the last hours or days) is built every time
+        and never kept, since its window moves with the clock.
+        """
+        if relative:
+            self.misses += 1
+            return await self.run(self._encode, build)
+        body = self.cache.get(key)
+        if body is not None:
+            self.hits += 1
+            self.cache.move_to_end(key)
+            return body
+        self.misses += 1
+        reloads = self.reloads
+        body = await self.run(self._encode, build)
+        # A body built from the store as it was before a reload is not kept
+        if reloads == self.reloads:
+            self.cache[key] = body
+            if len(self.cache) > self.cache_size:
+                self.cache.popitem(last=False)
+        return body
+
+    async def answer(self, query):
+        """JSON body for `query`, served from the cache when the same normalized query was seen."""
+        def build():
+            events = []
+            cursor = None
+            if query.paged():
+                results, cursor = self.store.page(query)
+                groups = page_groups(results)
+            else:
+                groups = self.store.run(query)
+            for source, matches in groups:
+                for event in matches:
+                    record = {'source': source}
+                    record.update(event._asdict())
+                    events.append(record)
+            return {'query': query.to_dict(), 'count': len(events), 'events': events, 'next': cursor}
+        return await self.cached(query.key(), build, query.relative())
+
+    async def answer_aggregate(self, query, by, width=1.0):
+        """JSON group table for `query`, cached like plain results."""
+        def build():
+            return {'query': query.to_dict(), 'by': by, 'groups': aggregate(self.store, query, by, width)}
+        return await self.cached(json.dumps(['aggregate', query.key(), by, width]), build, query.relative())
+
+    def refresh(self):
+        """Pick up new, removed and changed folders and feeds; returns how many were (re)indexed or dropped."""
+        # Snapshot folders may be rotated away while serving, so a pattern that matches nothing is not an error here
+        changed = 0 if self.patterns is None else self.store.set_folders(find_feed_folders(self.patterns, strict=False))
+        return changed + self.store.refresh()
+
+    async def reload(self):
+        """Refresh the store on the worker thread; the cache is dropped only when something changed."""
+        rebuilt = await self.run(self.refresh)
+        if rebuilt:
+            self.cache.clear()
+            self.reloads += 1
+        return rebuilt
+
+    def stats(self):
+        latencies = list(self.latencies)
+        p50, p99 = percentile(latencies, 0.5), percentile(latencies, 0.99)
+        return {
+            'requests': len(latencies),
+            'p50_ms': None if p50 is None else round(p50 * 1000, 3),
+            'p99_ms': None if p99 is None else round(p99 * 1000, 3),
+            'cache_entries': len(self.cache),
+            'cache_hits': self.hits,
+            'cache_misses': self.misses,
+            'reloads': self.reloads,
+            'events': sum(len(segment) for segment in self.store.segments()),
+            'pipeline': counters.snapshot(files=False),
+            'result_cache': None if self.store.cache is None else self.store.cache.stats(),
+        }
+
+    async def handle(self, method, target):
+        """Route one request; returns (status, body)."""
+        if method != 'GET':
+            return 405, {'error': 'only GET is supported'}
+        url = urlsplit(target)
+        if url.path == '/query':
+            try:
+                query = query_from_params(self.parser, parse_qsl(url.query, keep_blank_values=True))
+            except QueryError as e:
+                return 400, {'error': str(e)}
+            return 200, await self.answer(query)
+        if url.path == '/aggregate':
+            params = parse_qsl(url.query, keep_blank_values=True)
+            by = [value for name, value in params if name == 'by']
+            try:
+                width = float(dict(params).get('width', 1.0))
+                query = query_from_params(self.parser, [(name, value) for name, value in params
+                                                        if name not in ('by', 'width')])
+                return 200, await self.answer_aggregate(query, by, width)
+            except ValueError as e:
+                return 400, {'error': str(e)}
+        if url.path == '/stats':
+            return 200, await self.run(self.stats)
+        if url.path == '/reload':
+            return 200, {'rebuilt': await self.reload()}
+        return 404, {'error': f'no route for {url.path}'}
+
+
+async def _read_request(reader):
+    line = await reader.readline()
+    if not line:
+        return None
+    method, target, version = line.decode('latin-1').split()
+    headers = {}
+    while True:
+        line = await reader.readline()
+        if line in (b'\r\n', b'\n', b''):
+            break
+        name, _, value = line.decode('latin-1').partition(':')
+        headers[name.strip().lower()] = value.strip()
+    length = int(headers.get('content-length', 0))
+    if length:
+        await reader.readexactly(length)
+    keep_alive = headers.get('connection', '').lower() != 'close' and version == 'HTTP/1.1'
+    return method, target, keep_alive
+
+
+async def _handle_connection(service, reader, writer):
+    try:
+        while True:
+            try:
+                request = await _read_request(reader)
+            except (ValueError, asyncio.IncompleteReadError):
+                request = None
+            if request is None:
+                break
+            method, target, keep_alive = request
+            started = time.perf_counter()
+            status, body = await service.handle(method, target)
+            if not isinstance(body, bytes):
+                body = json.dumps(body).encode('utf-8')
+            service.latencies.append(time.perf_counter() - started)
+            writer.write(f"HTTP/1.1 {status} {_STATUS[status]}\r\n"
+                         f"Content-Type: application/json\r\nContent-Length: {len(body)}\r\n"
+                         f"Connection: {'keep-alive' if keep_alive else 'close'}\r\n\r\n".encode('latin-1') + body)
+            await writer.drain()
+            if not keep_alive:
+                break
+    except ConnectionError:
+        pass
+    finally:
+        writer.close()
+
+
+async def _reload_loop(service, interval):
+    while True:
+        await asyncio.sleep(interval)
+        await service.reload()
+
+
+async def serve(service, host='127.0.0.1', port=8765, reload_interval=RELOAD_INTERVAL):
+    server = await asyncio.start_server(lambda r, w: _handle_connection(service, r, w), host, port)
+    print(f"Serving {service.stats()['events']} events on http://{host}:{port}/query")
+    reloader = asyncio.ensure_future(_reload_loop(service, reload_interval)) if reload_interval else None
+    try:
+        async with server:
+            await server.serve_forever()
+    finally:
+        if reloader is not None:
+            reloader.cancel()
+
+
+async def load_test(url, requests=1000, concurrency=16):
+    """Issue `requests` GETs for `url` over `concurrency` keep-alive connections; returns latency stats."""
+    parts = urlsplit(url)
+    target = parts.path + (f'?{parts.query}' if parts.query else '')
+    request = f"GET {target} HTTP/1.1\r\nHost: {parts.netloc}\r\n\r\n".encode('latin-1')
+    latencies = []
+    remaining = [requests]
+
+    async def client():
+        reader, writer = await asyncio.open_connection(parts.hostname, parts.port or 80)
+        try:
+            while remaining[0] > 0:
+                remaining[0] -= 1
+                started = time.perf_counter()
+                writer.write(request)
+                await writer.drain()
+                length = 0
+                while True:
+                    line = await reader.readline()
+                    if line in (b'\r\n', b''):
+                        break
+                    if line.lower().startswith(b'content-length:'):
+                        length = int(line.split(b':')[1])
+                await reader.readexactly(length)
+                latencies.append(time.perf_counter() - started)
+        finally:
+            writer.close()
+
+    started = time.perf_counter()
+    await asyncio.gather(*(client() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - started
+    return {
+        'requests': len(latencies),
+        'concurrency': concurrency,
+        'requests_per_second': round(len(latencies) / elapsed, 1),
+        'p50_ms': round(percentile(latencies, 0.5) * 1000, 3),
+        'p99_ms': round(percentile(latencies, 0.99) * 1000, 3),
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Serve feed queries as JSON over local HTTP.")
+    parser.add_argument('folders', nargs='*', help="snapshot folders, folder globs or a root directory")
+    parser.add_argument('--merge', action='store_true', help="de-duplicate events across every feed")
+    parser.add_argument('--workers', type=int, help="processes used to (re)index feeds at start-up")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--cache-size', type=int, default=CACHE_SIZE, help="results kept in the in-memory LRU cache")
+    parser.add_argument('--reload-interval', type=float, default=RELOAD_INTERVAL,
+                        help="seconds between checks for changed feeds; 0 disables reloading")
+    add_cache_arguments(parser)
+    parser.add_argument('--load-test', metavar='URL', help="instead of serving, measure p50/p99 latency of URL")
+    parser.add_argument('--requests', type=int, default=1000)
+    parser.add_argument('--concurrency', type=int, default=16)
+    args = parser.parse_args(argv)
+
+    if args.load_test:
+        print(json.dumps(asyncio.run(load_test(args.load_test, args.requests, args.concurrency))))
+        return
+    if not args.folders:
+        parser.error("give the folders to serve")
+    try:
+        folders = find_feed_folders(args.folders)
+    except ValueError as e:
+        parser.error(str(e))
+    store = EventStore(folders, args.merge, args.workers, cache=cache_from_args(args))
+    service = QueryService(store, args.cache_size, args.folders)
+    try:
+        asyncio.run(serve(service, args.host, args.port, args.reload_interval))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    sys.exit(main())
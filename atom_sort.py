@@ -0,0 +1,204 @@
+import weakref
+from operator import attrgetter
+
+import numpy as np
+
+from atom_filter import SECONDS_PER_DAY, segment_columns
+
+SORT_KEYS = ('time', 'magnitude', 'depth')
+
+# Above this many days a combined date + time-of-day query scans the
+# time-of-day index once instead of bisecting every day separately.
+MAX_DAY_SLICES = 366
+
+
+class SortedColumn:
+    """Row numbers ordered by one column, answering range queries by binary search.
+
+    With presorted=True the values are already in ascending order with the
+    missing ones last, so the rows are taken in order and the keys are a view
+    of the column: nothing is sorted or copied.
+    """
+
+    def __init__(self, values, presorted=False):
+        if presorted:
+            # NaN sorts after every number, so this counts the rows with a value
+            present = int(np.searchsorted(values, np.inf, 'right'))
+            self.rows = np.arange(present)
+            self.keys = values[:present]
+            self.missing = np.arange(present, len(values))
+        else:
+            missing = np.isnan(values)
+            present = np.flatnonzero(~missing)
+            self.rows = present[np.argsort(values[present], kind='stable')]
+            self.keys = values[self.rows]
+            self.missing = np.flatnonzero(missing)
+        self.count = len(values)
+
+    def range(self, low=None, high=None, inclusive=False):
+        """Rows with low <= value < high (value <= high when inclusive), in value order."""
+        lo = 0 if low is None else np.searchsorted(self.keys, low, 'left')
+        hi = len(self.keys) if high is None else np.searchsorted(self.keys, high, 'right' if inclusive else 'left')
+        return self.rows[lo:hi]
+
+    def order(self, rows, descending=False):
+        """`rows` re-ordered by this column in O(n), without sorting; rows without a value go last."""
+        mask = np.zeros(self.count, dtype=bool)
+        mask[rows] = True
+        ordered = self.rows[mask[self.rows]]
+        if descending:
+            ordered = ordered[::-1]
+        return np.concatenate([ordered, self.missing[mask[self.missing]]])
+
+
+_sorted_columns = weakref.WeakKeyDictionary()
+
+
+def sorted_column(segment, name):
+    """SortedColumn for 'time', 'time_of_day', 'magnitude' or 'depth', cached per segment.
+
+    A segment whose rows are already ordered by a column (a memory-mapped
+    store is written in time order) names it in `sorted_by`.
+    """
+    cache = _sorted_columns.setdefault(segment, {})
+    if name not in cache:
+        columns = segment_columns(segment)
+        if name == 'time_of_day':
+            values = np.mod(columns['time'], SECONDS_PER_DAY)
+        else:
+            values = columns[name]
+        cache[name] = SortedColumn(values, presorted=getattr(segment, 'sorted_by', None) == name)
+    return cache[name]
+
+
+def select_time(segment, start=None, end=None):
+    """Rows updated in [start, end) epoch seconds, in time order."""
+    return sorted_column(segment, 'time').range(start, end)
+
+
+def select_depth(segment, low=None, high=None, low_inclusive=True, high_inclusive=True):
+    """Rows whose depth in km is between `low` and `high` (either may be None), in depth order."""
+    index = sorted_column(segment, 'depth')
+    lo = 0 if low is None else np.searchsorted(index.keys, low, 'left' if low_inclusive else 'right')
+    hi = len(index.keys) if high is None else np.searchsorted(index.keys, high, 'right' if high_inclusive else 'left')
+    return index.rows[lo:max(lo, hi)]
+
+
+def select_time_of_day(segment, day_start, day_end):
+    """Rows whose UTC time of day is within [day_start, day_end] seconds, in time order."""
+    rows = sorted_column(segment, 'time_of_day').range(day_start, day_end, inclusive=True)
+    return sorted_column(segment, 'time').order(rows)
+
+
+def select_datetime(segment, start=None, end=None, day_start=None, day_end=None):
+    """Rows in [start, end) whose time of day is within [day_start, day_end], in time order.
+
+    Short date ranges are answered with one pair of binary searches per day
+    over the primary time index.
+    """
+    if day_start is None:
+        return select_time(segment, start, end)
+    day_end = min(day_end, SECONDS_PER_DAY)
+    if start is None or end is None or (end - start) / SECONDS_PER_DAY > MAX_DAY_SLICES:
+        rows = select_time_of_day(segment, day_start, day_end)
+        times = segment_columns(segment)['time'][rows]
+        keep = np.ones(len(rows), dtype=bool)
+        if start is not None:
+            keep &= times >= start
+        if end is not None:
+            keep &= times < end
+        return rows[keep]
+
+    index = sorted_column(segment, 'time')
+    midnights = np.arange(start // SECONDS_PER_DAY, -(-end // SECONDS_PER_DAY)) * SECONDS_PER_DAY
+    lo = np.searchsorted(index.keys, np.maximum(midnights + day_start, start), 'left')
+    hi = np.minimum(np.searchsorted(index.keys, midnights + day_end, 'right'),
+                    np.searchsorted(index.keys, end, 'left'))
+    slices = [index.rows[a:b] for a, b in zip(lo, hi) if a < b]
+    return np.concatenate(slices) if slices else index.rows[:0]
+
+
+def ordered(segment, rows, sort_key=None):
+    """Rows in feed order, or ordered by a SORT_KEYS column ('-magnitude' for descending)."""
+    if not sort_key:
+        return np.sort(rows)
+    descending = sort_key.startswith('-')
+    return sorted_column(segment, sort_key.lstrip('-')).order(rows, descending)
+
+
+def sort_events(events, sort_key=None):
+    """A list of Events in the order ordered() gives rows: by a SORT_KEYS field, missing values last."""
+    if not sort_key:
+        return list(events)
+    name = sort_key.lstrip('-')
+    present = sorted((event for event in events if getattr(event, name) is not None), key=attrgetter(name))
+    if sort_key.startswith('-'):
+        present.reverse()
+    return present + [event for event in events if getattr(event, name) is None]
+
+
+def row_key(segment, sort_key, row):
+    """Position of a row in the global result order: (missing, value, source, row).
+
+    Across segments, rows with equal values are ordered by source then row
+    number; the cursor of a paginated query is the key of its last row.
+    """
+    if not sort_key:
+        return (0, 0.0, segment.source, int(row))
+    value = float(segment_columns(segment)[sort_key.lstrip('-')][row])
+    if value != value:
+        return (1, 0.0, segment.source, int(row))
+    return (0, value, segment.source, int(row))
+
+
+def _after(rows, source, cursor_source, cursor_row, descending):
+    """How many of `rows` (ascending row numbers sharing the cursor's value) precede the cursor."""
+    if source != cursor_source:
+        return len(rows) if source < cursor_source else 0
+    return np.searchsorted(rows, cursor_row, 'left' if descending else 'right')
+
+
+def sort_sequence(segment, sort_key=None, after=None):
+    """Row arrays that, read in turn, list a segment in `sort_key` order after the cursor key `after`.
+
+    This is the order of ordered() (feed order when sort_key is None), with
+    ties broken by row number, but produced as views of the sorted index so a
+    caller can stop reading as soon as it has enough rows.
+    """
+    count = len(segment)
+    if not sort_key:
+        if after is None or segment.source > after[2]:
+            return [np.arange(count)]
+        if segment.source < after[2]:
+            return []
+        return [np.arange(after[3] + 1, count)]
+
+    descending = sort_key.startswith('-')
+    index = sorted_column(segment, sort_key.lstrip('-'))
+    present, missing = index.rows, index.missing
+    if after is not None:
+        cursor_missing, value, cursor_source, cursor_row = after
+        if cursor_missing:
+            present = present[:0]
+            missing = missing[_after(missing, segment.source, cursor_source, cursor_row, False):]
+        else:
+            lo = np.searchsorted(index.keys, value, 'left')
+            hi = np.searchsorted(index.keys, value, 'right')
+            split = lo + _after(present[lo:hi], segment.source, cursor_source, cursor_row, descending)
+            present = present[:split] if descending else present[split:]
+    # Rows without a value come last in row order, in both directions
+    if descending:
+        return [present[::-1], missing]
+    return [present, missing]
+
+
+def iter_rows(segment, rows):
+    for row in rows:
+        yield segment.event(int(row))
+
+
+def ask_sort():
+    """Prompt shared by the interactive scripts for the result order."""
+    answer = input("Sort results by time, magnitude or depth (prefix '-' for descending, blank for feed order): ")
+    answer = answer.strip().lower()
+    return answer if answer.lstrip('-') in SORT_KEYS else None
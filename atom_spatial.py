@@ -0,0 +1,142 @@
+import math
+import weakref
+
+import numpy as np
+
+from atom_filter import Predicate, RowColumns, segment_columns
+
+EARTH_RADIUS_KM = 6371.0088
+CELL_DEGREES = 1.0
+
+
+def haversine_km(latitude, longitude, latitudes, longitudes):
+    """Great-circle distance in km from one point to arrays of points."""
+    lat1 = math.radians(latitude)
+    lats = np.radians(latitudes)
+    dlat = lats - lat1
+    dlon = np.radians(longitudes) - math.radians(longitude)
+    a = np.sin(dlat / 2) ** 2 + math.cos(lat1) * np.cos(lats) * np.sin(dlon / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(np.minimum(a, 1.0)))
+
+
+def longitude_ranges(west, east):
+    """Split a west-to-east span into ranges inside [-180, 180], wrapping the antimeridian."""
+    if east - west >= 360:
+        return [(-180.0, 180.0)]
+    west = (west + 180) % 360 - 180
+    east = (east + 180) % 360 - 180
+    if west <= east:
+        return [(west, east)]
+    return [(west, 180.0), (-180.0, east)]
+
+
+class Within(Predicate):
+    """Events within `radius_km` of a point, by haversine distance."""
+
+    def __init__(self, latitude, longitude, radius_km):
+        self.latitude = latitude
+        self.longitude = longitude
+        self.radius_km = radius_km
+
+    def mask(self, columns):
+        distance = haversine_km(self.latitude, self.longitude, columns['latitude'], columns['longitude'])
+        return distance <= self.radius_km
+
+    def bounds(self):
+        """(south, north, longitude ranges) enclosing the circle."""
+        angle = self.radius_km / EARTH_RADIUS_KM
+        dlat = math.degrees(angle)
+        south = max(-90.0, self.latitude - dlat)
+        north = min(90.0, self.latitude + dlat)
+        cos_lat = math.cos(math.radians(self.latitude))
+        if south <= -90 or north >= 90 or math.sin(angle) >= cos_lat:
+            return south, north, [(-180.0, 180.0)]
+        dlon = math.degrees(math.asin(math.sin(angle) / cos_lat))
+        return south, north, longitude_ranges(self.longitude - dlon, self.longitude + dlon)
+
+
+class BoundingBox(Predicate):
+    """Events inside a lat/lon box; west > east describes a box across the antimeridian."""
+
+    def __init__(self, south, west, north, east):
+        self.south = south
+        self.west = west
+        self.north = north
+        self.east = east
+
+    def mask(self, columns):
+        lats = columns['latitude']
+        lons = columns['longitude']
+        result = (lats >= self.south) & (lats <= self.north)
+        if self.west <= self.east:
+            return result & (lons >= self.west) & (lons <= self.east)
+        return result & ((lons >= self.west) | (lons <= self.east))
+
+    def bounds(self):
+        if self.west <= self.east:
+            return self.south, self.north, [(self.west, self.east)]
+        return self.south, self.north, [(self.west, 180.0), (-180.0, self.east)]
+
+
+class GridIndex:
+    """Bucket index over coordinates: row numbers sorted by fixed-size lat/lon cell."""
+
+    def __init__(self, latitudes, longitudes, cell_degrees=CELL_DEGREES):
+        self.cell_degrees = cell_degrees
+        self.columns_per_band = int(math.ceil(360 / cell_degrees))
+        self.bands = int(math.ceil(180 / cell_degrees))
+        rows = np.flatnonzero(~(np.isnan(latitudes) | np.isnan(longitudes)))
+        cells = self.cell_of(latitudes[rows], longitudes[rows])
+        order = np.argsort(cells, kind='stable')
+        self.rows = rows[order]
+        self.cells = cells[order]
+
+    def band_of(self, latitudes):
+        return np.clip(np.floor((np.asarray(latitudes) + 90) / self.cell_degrees), 0, self.bands - 1).astype(np.int64)
+
+    def column_of(self, longitudes):
+        return np.clip(np.floor((np.asarray(longitudes) + 180) / self.cell_degrees), 0, self.columns_per_band - 1).astype(np.int64)
+
+    def cell_of(self, latitudes, longitudes):
+        return self.band_of(latitudes) * self.columns_per_band + self.column_of(longitudes)
+
+    def candidates(self, south, north, lon_ranges):
+        """Row numbers in every cell overlapping the given bounds."""
+        first_band, last_band = int(self.band_of(south)), int(self.band_of(north))
+        spans = [(int(self.column_of(west)), int(self.column_of(east))) for west, east in lon_ranges]
+        bands = np.arange(first_band, last_band + 1) * self.columns_per_band
+        starts = np.concatenate([bands + west for west, _ in spans])
+        ends = np.concatenate([bands + east + 1 for _, east in spans])
+        lo = np.searchsorted(self.cells, starts, side='left')
+        hi = np.searchsorted(self.cells, ends, side='left')
+        if not len(lo):
+            return self.rows[:0]
+        return np.concatenate([self.rows[a:b] for a, b in zip(lo, hi)])
+
+    def query(self, region, latitudes, longitudes):
+        """Rows inside `region` (a Within or BoundingBox), in ascending row order."""
+        rows = self.candidates(*region.bounds())
+        keep = region.mask({'latitude': latitudes[rows], 'longitude': longitudes[rows]})
+        return np.sort(rows[keep])
+
+
+_grids = weakref.WeakKeyDictionary()
+
+
+def segment_grid(segment):
+    """GridIndex for a segment, built on first use and cached for the segment's lifetime."""
+    grid = _grids.get(segment)
+    if grid is None:
+        columns = segment_columns(segment)
+        grid = GridIndex(columns['latitude'], columns['longitude'])
+        _grids[segment] = grid
+    return grid
+
+
+def select_region(segment, region, predicate=None):
+    """Rows of a segment inside `region`, optionally refined by another predicate."""
+    columns = segment_columns(segment)
+    rows = segment_grid(segment).query(region, columns['latitude'], columns['longitude'])
+    if predicate is not None and len(rows):
+        rows = rows[predicate.mask(RowColumns(columns, rows))]
+    return rows
@@ -0,0 +1,222 @@
+import argparse
+import json
+import mmap
+import os
+import struct
+
+import numpy as np
+
+from atom_feed import Event
+from atom_index import NUMERIC_COLUMNS, STRING_FIELDS
+
+STORE_SUFFIX = '.evs'
+_MAGIC = b'ATOMEVS1'
+# magic, record count, then (offset, size) of the metadata, records, heap,
+# posting offsets and postings sections
+_HEADER = struct.Struct('<8sQ10Q')
+
+RECORD_DTYPE = np.dtype([
+    ('time', '<f8'),
+    ('magnitude', '<f8'),
+    ('latitude', '<f8'),
+    ('longitude', '<f8'),
+    ('depth', '<f8'),
+    ('heap_offset', '<u8'),
+    ('lengths', '<u4', (len(STRING_FIELDS),)),
+    ('place', '<i4'),
+    ('source', '<i4'),
+])
+
+
+def _align(offset):
+    return (offset + 7) & ~7
+
+
+def build_store(path, segments):
+    """Write the events of `segments` to one memory-mappable store file, sorted by time.
+
+    Every event becomes a fixed-width RECORD_DTYPE record; its text fields are
+    copied into a shared heap and the location-word postings are merged, so a
+    store supports the same queries as the segments it was built from.
+    """
+    segments = list(segments)
+    count = sum(len(segment) for segment in segments)
+    records = np.zeros(count, dtype=RECORD_DTYPE)
+    places, place_ids = [], {}
+    sources = []
+    token_rows = {}
+    heap_parts = []
+    row = heap_size = 0
+    width = len(STRING_FIELDS)
+
+    for source_id, segment in enumerate(segments):
+        n = len(segment)
+        sources.append(segment.source)
+        part = records[row:row + n]
+        for name in NUMERIC_COLUMNS:
+            part[name] = np.asarray(segment.columns[name], dtype=np.float64)
+        offsets = np.asarray(segment.offsets, dtype=np.int64)
+        part['heap_offset'] = offsets[:-1:width][:n] + heap_size
+        part['lengths'] = np.diff(offsets).reshape(n, width)
+        remap = []
+        for name in segment.places:
+            if name not in place_ids:
+                place_ids[name] = len(places)
+                places.append(name)
+            remap.append(place_ids[name])
+        if n:
+            part['place'] = np.array(remap, dtype=np.int32)[np.asarray(segment.place, dtype=np.int32)]
+        part['source'] = source_id
+        postings = np.asarray(segment.postings, dtype=np.int32)
+        for i, token in enumerate(segment.tokens):
+            token_rows.setdefault(token, []).append(
+                postings[segment.posting_offsets[i]:segment.posting_offsets[i + 1]] + row)
+        heap_parts.append(segment.heap)
+        heap_size += len(segment.heap)
+        row += n
+
+    # In time order the records are their own time index: a time range is a
+    # contiguous run of rows found by binary search, with nothing to sort
+    order = np.argsort(records['time'], kind='stable')
+    records = records[order]
+    new_row = np.empty(count, dtype=np.int32)
+    new_row[order] = np.arange(count, dtype=np.int32)
+    tokens = sorted(token_rows)
+    posting_lists = [np.sort(new_row[np.concatenate(token_rows[token])]) for token in tokens]
+    posting_offsets = np.zeros(len(tokens) + 1, dtype=np.int64)
+    np.cumsum([len(rows) for rows in posting_lists], out=posting_offsets[1:])
+    postings = np.concatenate(posting_lists) if posting_lists else np.zeros(0, dtype=np.int32)
+
+    meta = json.dumps({'places': places, 'sources': sources, 'tokens': tokens}).encode('utf-8')
+    meta_offset = _HEADER.size
+    records_offset = _align(meta_offset + len(meta))
+    heap_offset = records_offset + records.nbytes
+    posting_offsets_offset = _align(heap_offset + heap_size)
+    postings_offset = posting_offsets_offset + posting_offsets.nbytes
+
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'wb') as store_file:
+        store_file.write(_HEADER.pack(
+            _MAGIC, count,
+            meta_offset, len(meta), records_offset, records.nbytes, heap_offset, heap_size,
+            posting_offsets_offset, posting_offsets.nbytes, postings_offset, postings.nbytes))
+        store_file.write(meta)
+        store_file.write(b'\0' * (records_offset - meta_offset - len(meta)))
+        store_file.write(records.tobytes())
+        for part in heap_parts:
+            store_file.write(part)
+        store_file.write(b'\0' * (posting_offsets_offset - heap_offset - heap_size))
+        store_file.write(posting_offsets.tobytes())
+        store_file.write(postings.astype('<i4').tobytes())
+    os.replace(tmp_path, path)
+    return count
+
+
+class MappedStore:
+    """Read-only, memory-mapped view of a store file.
+
+    The records are a NumPy structured array over the page cache, so opening a
+    store costs a header read and any number of processes share one copy.
+    A MappedStore offers the same attributes as an index Segment, so filter,
+    sort, spatial, text and Query selection work on it unchanged.
+    """
+
+    # Records are written in time order (see build_store), so atom_sort uses
+    # them as the time index as they are
+    sorted_by = 'time'
+
+    def __init__(self, path):
+        self.source = path
+        self._file = open(path, 'rb')
+        stat = os.fstat(self._file.fileno())
+        self.mtime, self.size = stat.st_mtime_ns, stat.st_size
+        self._map = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        (magic, count, meta_offset, meta_size, records_offset, _, heap_offset, heap_size,
+         posting_offsets_offset, posting_offsets_size, postings_offset, postings_size) = _HEADER.unpack_from(self._map)
+        if magic != _MAGIC:
+            raise ValueError(f"{path} is not an event store")
+        meta = json.loads(self._map[meta_offset:meta_offset + meta_size])
+        self.places = meta['places']
+        self.sources = meta['sources']
+        self.tokens = meta['tokens']
+        self.records = np.frombuffer(self._map, dtype=RECORD_DTYPE, count=count, offset=records_offset)
+        self.columns = {name: self.records[name] for name in NUMERIC_COLUMNS}
+        self.place = self.records['place']
+        self.heap = memoryview(self._map)[heap_offset:heap_offset + heap_size]
+        self.posting_offsets = np.frombuffer(self._map, dtype='<i8', count=posting_offsets_size // 8,
+                                             offset=posting_offsets_offset)
+        self.postings = np.frombuffer(self._map, dtype='<i4', count=postings_size // 4, offset=postings_offset)
+
+    def __len__(self):
+        return len(self.records)
+
+    def __iter__(self):
+        for i in range(len(self)):
+            yield self.event(i)
+
+    def event(self, i):
+        record = self.records[i]
+        start = int(record['heap_offset'])
+        texts = []
+        for length in record['lengths']:
+            end = start + int(length)
+            texts.append(bytes(self.heap[start:end]).decode('utf-8') or None)
+            start = end
+        numbers = [float(record[name]) for name in NUMERIC_COLUMNS]
+        return Event(*texts, *[None if value != value else value for value in numbers])
+
+    def close(self):
+        self.records = self.columns = self.place = self.postings = self.posting_offsets = None
+        self.heap.release()
+        self._file.close()
+        try:
+            self._map.close()
+        except BufferError:
+            # Arrays viewing the records (such as a cached time index) are
+            # still alive; the mapping is released with the last of them.
+            pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+def open_store(path):
+    return MappedStore(path)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Build or inspect a memory-mapped event store.")
+    commands = parser.add_subparsers(dest='command', required=True)
+    build = commands.add_parser('build', help="index folders and write them to a store file")
+    build.add_argument('store', help=f"output file, conventionally *{STORE_SUFFIX}")
+    build.add_argument('folders', nargs='+', help="snapshot folders, folder globs or a root directory")
+    build.add_argument('--merge', action='store_true', help="de-duplicate events across every feed")
+    build.add_argument('--workers', type=int)
+    info = commands.add_parser('info', help="summarise a store file")
+    info.add_argument('store')
+    args = parser.parse_args()
+
+    if args.command == 'build':
+        from atom_parallel import find_feed_folders
+        from atom_query import EventStore
+        try:
+            folders = find_feed_folders(args.folders)
+        except ValueError as e:
+            parser.error(str(e))
+        store = EventStore(folders, args.merge, args.workers)
+        count = build_store(args.store, store.segments())
+        print(f"Wrote {count} events from {len(store.folders)} folders to '{args.store}'")
+    else:
+        with open_store(args.store) as store:
+            times = store.records['time']
+            print(f"{args.store}: {len(store)} events from {len(store.sources)} feeds, "
+                  f"{len(store.places)} places, {len(store.tokens)} location words")
+            if len(store):
+                print(f"updated {np.nanmin(times):.0f} .. {np.nanmax(times):.0f} (epoch seconds)")
+
+
+if __name__ == "__main__":
+    main()
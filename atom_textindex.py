@@ -0,0 +1,58 @@
+from bisect import bisect_left
+
+import numpy as np
+
+from atom_feed import tokenize
+from atom_filter import RowColumns, segment_columns
+
+
+def _postings(segment, first, last):
+    """Rows for tokens[first:last] as a sorted, de-duplicated array."""
+    offsets = segment.posting_offsets
+    postings = np.asarray(segment.postings, dtype=np.int32)
+    if last - first == 1:
+        return postings[offsets[first]:offsets[last]]
+    return np.unique(postings[offsets[first]:offsets[last]])
+
+
+def lookup(segment, term, prefix=False):
+    """Rows whose location text contains `term`, or any word starting with it when prefix=True."""
+    tokens = segment.tokens
+    first = bisect_left(tokens, term)
+    if prefix:
+        last = bisect_left(tokens, term + '\uffff', first)
+    else:
+        last = first + 1 if first < len(tokens) and tokens[first] == term else first
+    if first == last:
+        return np.empty(0, dtype=np.int32)
+    return _postings(segment, first, last)
+
+
+def select_text(segment, query, prefix=True, predicate=None):
+    """Rows matching every word of `query` (case-insensitive), by posting-list intersection.
+
+    With prefix=True each word also matches longer words, so 'gey ca' finds
+    'NNE of The Geysers, CA'. Shortest posting lists are intersected first.
+    """
+    terms = tokenize(query)
+    if not terms:
+        return np.empty(0, dtype=np.int32)
+    lists = sorted((lookup(segment, term, prefix) for term in set(terms)), key=len)
+    rows = lists[0]
+    for other in lists[1:]:
+        if not len(rows):
+            break
+        rows = np.intersect1d(rows, other, assume_unique=True)
+    if predicate is not None and len(rows):
+        columns = segment_columns(segment)
+        rows = rows[predicate.mask(RowColumns(columns, rows))]
+    return rows
+
+
+def select_place(segment, place):
+    """Rows whose title ends in exactly `place` (case-insensitive), via the interned place ids."""
+    place = place.lower()
+    ids = [i for i, name in enumerate(segment.places) if name.lower() == place]
+    if not ids:
+        return np.empty(0, dtype=np.int32)
+    return np.flatnonzero(np.isin(np.asarray(segment.place, dtype=np.int32), ids))
@@ -0,0 +1,243 @@
+import argparse
+import ctypes
+import ctypes.util
+import os
+import select
+import shlex
+import struct
+import sys
+import time
+
+from atom_feed import is_feed_file, iter_events
+from atom_index import INDEX_DIR, open_index, pack_events
+from atom_output import open_writer, result_path
+from atom_query import add_query_arguments, query_from_args
+
+# inotify(7) event masks
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_ISDIR = 0x40000000
+_INOTIFY_EVENT = struct.Struct('iIII')
+
+POLL_INTERVAL = 0.5
+
+
+def watched_dirs(paths):
+    """The given folders plus their snapshot sub-folders."""
+    dirs = []
+    for path in paths:
+        dirs.append(path)
+        for name in sorted(os.listdir(path)):
+            child = os.path.join(path, name)
+            if name != INDEX_DIR and os.path.isdir(child):
+                dirs.append(child)
+    return dirs
+
+
+class PollingWatcher:
+    """Detects new or rewritten feeds by comparing mtime and size between scans."""
+
+    def __init__(self, paths, interval=POLL_INTERVAL):
+        self.paths = list(paths)
+        self.interval = interval
+        self.seen = self.scan()
+
+    def scan(self):
+        stats = {}
+        for dir_path in watched_dirs(self.paths):
+            for name in os.listdir(dir_path):
+                file_path = os.path.join(dir_path, name)
+                if is_feed_file(file_path):
+                    try:
+                        stat = os.stat(file_path)
+                    except OSError:
+                        continue
+                    stats[file_path] = (stat.st_mtime_ns, stat.st_size)
+        return stats
+
+    def wait(self, timeout=None):
+        """Block until feeds change (or `timeout` seconds pass); returns the changed paths."""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            stats = self.scan()
+            changed = sorted(path for path, stat in stats.items() if self.seen.get(path) != stat)
+            self.seen = stats
+            if changed or (deadline is not None and time.monotonic() >= deadline):
+                return changed
+            time.sleep(self.interval)
+
+    def close(self):
+        pass
+
+
+class InotifyWatcher:
+    """Linux inotify through ctypes: feeds are reported as soon as they are closed or moved in."""
+
+    MASK = IN_CLOSE_WRITE | IN_MOVED_TO | IN_CREATE
+
+    def __init__(self, paths):
+        self.libc = ctypes.CDLL(ctypes.util.find_library('c'), use_errno=True)
+        self.fd = self.libc.inotify_init()
+        if self.fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init failed")
+        self.paths = set(paths)
+        self.dirs = {}
+        for dir_path in watched_dirs(paths):
+            self.add(dir_path)
+
+    def add(self, dir_path):
+        wd = self.libc.inotify_add_watch(self.fd, os.fsencode(dir_path), self.MASK)
+        if wd < 0:
+            raise OSError(ctypes.get_errno(), f"Cannot watch {dir_path}")
+        self.dirs[wd] = dir_path
+
+    def wait(self, timeout=None):
+        """Block until feeds change (or `timeout` seconds pass); returns the changed paths."""
+        ready, _, _ = select.select([self.fd], [], [], timeout)
+        if not ready:
+            return []
+        data = os.read(self.fd, 1 << 16)
+        changed = []
+        offset = 0
+        while offset < len(data):
+            wd, mask, _, length = _INOTIFY_EVENT.unpack_from(data, offset)
+            offset += _INOTIFY_EVENT.size
+            name = data[offset:offset + length].rstrip(b'\0').decode()
+            offset += length
+            path = os.path.join(self.dirs.get(wd, ''), name)
+            if mask & IN_ISDIR:
+                # A new snapshot folder under a watched root: watch it and pick
+                # up anything that landed before the watch was in place
+                if mask & (IN_CREATE | IN_MOVED_TO) and self.dirs.get(wd) in self.paths and name != INDEX_DIR:
+                    self.add(path)
+                    changed.extend(os.path.join(path, child) for child in sorted(os.listdir(path))
+                                   if is_feed_file(child))
+            elif mask & (IN_CLOSE_WRITE | IN_MOVED_TO) and is_feed_file(path):
+                changed.append(path)
+        return sorted(set(changed))
+
+    def close(self):
+        os.close(self.fd)
+
+
+def open_watcher(paths, poll=False, interval=POLL_INTERVAL):
+    """inotify where the platform has it, mtime polling otherwise."""
+    if not poll and sys.platform.startswith('linux'):
+        try:
+            return InotifyWatcher(paths)
+        except (OSError, AttributeError) as e:
+            print(f"inotify unavailable ({e}); polling every {interval}s instead")
+    return PollingWatcher(paths, interval)
+
+
+class StandingQuery:
+    """A query evaluated against every batch of new events, appending matches to its output."""
+
+    def __init__(self, query, path, output_format='text'):
+        self.query = query
+        self.path = path
+        self.output_format = output_format
+        self.count = 0
+
+    def evaluate(self, segment):
+        rows = self.query.select(segment)
+        if not len(rows):
+            return 0
+        with open_writer(self.path, self.output_format, append=True,
+                         header=f"New events matching {self.query.describe()}") as writer:
+            writer.write_group(segment.source, (segment.event(int(row)) for row in rows))
+        self.count += writer.count
+        return writer.count
+
+
+class FeedWatcher:
+    """Incrementally ingests feeds as they change and runs standing queries over the new events.
+
+    Event ids already present when the watcher starts are loaded from the
+    folder indexes, so only entries with an unseen atom:id are decoded.
+    """
+
+    def __init__(self, paths, standing_queries, poll=False, interval=POLL_INTERVAL):
+        self.paths = list(paths)
+        self.standing_queries = list(standing_queries)
+        self.known_ids = set()
+        for dir_path in watched_dirs(self.paths):
+            for segment in open_index(dir_path).segments:
+                self.known_ids.update(segment.text(i, 'id') for i in range(len(segment)))
+        self.watcher = open_watcher(self.paths, poll, interval)
+
+    def ingest(self, file_path):
+        """Decode the unseen entries of one feed and evaluate every standing query on them."""
+        events = list(iter_events(file_path, self.known_ids))
+        if not events:
+            return 0, []
+        self.known_ids.update(event.id for event in events)
+        segment = pack_events(events, file_path)
+        return len(events), [standing.evaluate(segment) for standing in self.standing_queries]
+
+    def poll(self, timeout=None):
+        """Wait for one batch of changed feeds and ingest it; returns [(path, new, matches)]."""
+        results = []
+        for file_path in self.watcher.wait(timeout):
+            if os.path.exists(file_path):
+                new, matches = self.ingest(file_path)
+                results.append((file_path, new, matches))
+        return results
+
+    def run(self):
+        while True:
+            for file_path, new, matches in self.poll():
+                if new:
+                    print(f"{file_path}: {new} new events, "
+                          + ', '.join(f"{count} for {standing.query.describe()}"
+                                      for standing, count in zip(self.standing_queries, matches)))
+                    sys.stdout.flush()
+
+    def close(self):
+        self.watcher.close()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Watch feed folders and append new events matching standing queries to their outputs.")
+    parser.add_argument('folders', nargs='+', help="snapshot folders or a root directory of dated folders")
+    parser.add_argument('--queries', help="file with one standing query per line, in the atom_query option syntax")
+    parser.add_argument('--poll', action='store_true', help="use mtime polling even where inotify is available")
+    parser.add_argument('--interval', type=float, default=POLL_INTERVAL, help="polling interval in seconds")
+    add_query_arguments(parser)
+    args = parser.parse_args(argv)
+
+    query_parser = argparse.ArgumentParser(prog='query line')
+    add_query_arguments(query_parser)
+    try:
+        query_args = [args]
+        if args.queries:
+            with open(args.queries, encoding='utf-8') as query_file:
+                query_args = [query_parser.parse_args(shlex.split(line)) for line in query_file
+                              if line.strip() and not line.lstrip().startswith('#')]
+        standing_queries = [StandingQuery(query_from_args(line_args), line_args.output, line_args.format)
+                            for line_args in query_args]
+    except ValueError as e:
+        parser.error(str(e))
+    if any(standing.output_format == 'binary' for standing in standing_queries):
+        parser.error("standing queries append to their outputs; use the text, jsonl or csv format")
+    if len({result_path(s.path, s.output_format) for s in standing_queries}) != len(standing_queries):
+        parser.error("every standing query needs its own --output")
+    for folder_path in args.folders:
+        if not os.path.isdir(folder_path):
+            parser.error(f"not a folder: {folder_path}")
+
+    watcher = FeedWatcher(args.folders, standing_queries, args.poll, args.interval)
+    print(f"Watching {', '.join(args.folders)} for {len(standing_queries)} standing queries "
+          f"({type(watcher.watcher).__name__}, {len(watcher.known_ids)} known events)")
+    try:
+        watcher.run()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        watcher.close()
+
+
+if __name__ == "__main__":
+    sys.exit(main())
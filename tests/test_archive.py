@@ -0,0 +1,93 @@
+import bz2
+import gzip
+import lzma
+import os
+import tarfile
+import zipfile
+
+import pytest
+
+from atom_feed import iter_events, list_feed_files, open_feed
+from atom_index import FeedIndex, open_index
+from atom_query import EventStore, Query
+
+HEADER = b'''<?xml version="1.0" encoding="utf-8"?>
+<feed xmlns="http://www.w3.org/2005/Atom" xmlns:georss="http://www.georss.org/georss">
+'''
+
+
+def feed(*entries):
+    return HEADER + b''.join(
+        b'<entry><id>urn:test:%d</id><title>M %.1f - 10 km N of Town %d, CA</title>'
+        b'<updated>2025-02-04T0%d:00:00.000Z</updated><georss:point>36.5 -121.1</georss:point>'
+        b'<georss:elev>-%d000</georss:elev></entry>\n' % (number, magnitude, number, hour, number)
+        for number, magnitude, hour in entries) + b'</feed>'
+
+
+FEEDS = {
+    'all_hour.atom': (open, feed((1, 2.5, 1), (2, 3.5, 2))),
+    'all_day.atom.gz': (gzip.open, feed((1, 2.6, 3), (3, 4.1, 1))),
+    'all_week.atom.bz2': (bz2.open, feed((3, 4.0, 0), (4, 1.2, 5))),
+    'all_month.atom.xz': (lzma.open, feed((5, 5.3, 4), (2, 3.4, 1))),
+}
+QUERIES = [Query(), Query(magnitude='>=3', sort='-magnitude'), Query(place='CA', depth='<3')]
+
+
+@pytest.fixture
+def folders(tmp_path):
+    """The same snapshot as a folder of plain and compressed feeds, a tar.xz and a zip."""
+    folder = tmp_path / '25-02-04'
+    folder.mkdir()
+    for name, (opener, data) in FEEDS.items():
+        with opener(folder / name, 'wb') as feed_file:
+            feed_file.write(data)
+    with tarfile.open(tmp_path / '25-02-04.tar.xz', 'w:xz') as archive:
+        archive.add(folder, arcname='25-02-04')
+    with zipfile.ZipFile(tmp_path / '25-02-04.zip', 'w') as archive:
+        for name in FEEDS:
+            archive.write(folder / name, f'25-02-04/{name}')
+    return [str(folder), str(tmp_path / '25-02-04.tar.xz'), str(tmp_path / '25-02-04.zip')]
+
+
+def results(store, query):
+    return {os.path.basename(source): list(events) for source, events in store.run(query)}
+
+
+def merged_results(store, query):
+    [(_, events)] = store.run(query)
+    return sorted(events)
+
+
+def test_compressed_feeds_and_archive_members_read_alike(folders):
+    for folder_path in folders:
+        file_paths = list_feed_files(folder_path)
+        assert sorted(map(os.path.basename, file_paths)) == sorted(FEEDS)
+        for file_path in file_paths:
+            with open_feed(file_path) as stream:
+                assert stream.read() == FEEDS[os.path.basename(file_path)][1]
+            assert list(iter_events(file_path)) == list(iter_events(os.path.join(folders[0],
+                                                                                 os.path.basename(file_path))))
+
+
+@pytest.mark.parametrize('query', QUERIES, ids=['all', 'magnitude', 'place'])
+def test_index_scan_and_merge_agree_with_the_plain_folder(folders, query):
+    expected = results(EventStore(folders[:1], workers=1), query)
+    assert sum(map(len, expected.values()))
+    merged = merged_results(EventStore(folders[:1], merge=True, workers=1), query)
+    assert len(merged) == len({event.id for events in expected.values() for event in events})
+    for folder_path in folders:
+        assert results(EventStore([folder_path], workers=1), query) == expected
+        assert results(EventStore([folder_path], workers=1, scan=True), query) == expected
+        assert merged_results(EventStore([folder_path], merge=True, workers=1), query) == merged
+
+
+def test_archive_index_is_kept_until_the_archive_changes(folders):
+    archive_path = folders[1]
+    assert FeedIndex(archive_path).archive_members() is None
+    assert len(open_index(archive_path).segments) == len(FEEDS)
+    assert sorted(FeedIndex(archive_path).archive_members()) == sorted(list_feed_files(archive_path))
+    assert FeedIndex(archive_path).refresh() == 0
+    stat = os.stat(archive_path)
+    os.utime(archive_path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10 ** 9))
+    assert FeedIndex(archive_path).archive_members() is None
+    assert FeedIndex(archive_path).refresh() == len(FEEDS)
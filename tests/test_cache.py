@@ -0,0 +1,92 @@
+import os
+from types import SimpleNamespace
+
+import numpy as np
+
+import atom_cache
+from atom_cache import ResultCache
+from atom_feed import Event
+from atom_index import pack_events
+
+KEY = '{"magnitude": [">=2"]}'
+
+
+def segment(source, mtime, count=3):
+    events = [Event(f'{source}{i}', f'M 3.0 - Town {i}, CA', None, None, None, None, None, None,
+                    float(i), 3.0, None, None, None) for i in range(count)]
+    return pack_events(events, source, mtime, 100)
+
+
+class Selections:
+    """select() callbacks that record which sources were computed rather than read from the cache."""
+
+    def __init__(self):
+        self.computed = []
+
+    def __call__(self, segment):
+        def select():
+            self.computed.append(segment.source)
+            return np.arange(len(segment))
+        return select
+
+
+def test_a_changed_feed_only_misses_its_own_entries(tmp_path):
+    path = str(tmp_path / 'cache')
+    selections = Selections()
+    with ResultCache(path) as cache:
+        for source in ('hour', 'day'):
+            cache.rows(KEY, segment(source, 1), selections(segment(source, 1)))
+            cache.rows('other', segment(source, 1), selections(segment(source, 1)))
+    assert len(selections.computed) == 4
+
+    selections.computed = []
+    with ResultCache(path) as cache:
+        changed, same = segment('hour', 2), segment('day', 1)
+        assert list(cache.rows(KEY, changed, selections(changed))) == [0, 1, 2]
+        assert list(cache.rows(KEY, same, selections(same))) == [0, 1, 2]
+        assert selections.computed == ['hour']
+        assert (cache.hits, cache.misses) == (1, 1)
+        # Finding the change dropped the feed's other entries too
+        assert sorted(entry['source'] for entry in cache.entries.values()) == ['day', 'day', 'hour']
+
+
+def test_save_evicts_the_least_recently_used_entries(tmp_path, monkeypatch):
+    clock = iter(range(100))
+    monkeypatch.setattr(atom_cache, 'time', SimpleNamespace(time=lambda: next(clock)))
+    path = str(tmp_path / 'cache')
+    cache = ResultCache(path)
+    selections = Selections()
+    feeds = [segment(source, 1) for source in ('a', 'b', 'c')]
+    for feed in feeds:
+        cache.rows(KEY, feed, selections(feed))
+    entry_bytes = max(entry['bytes'] for entry in cache.entries.values())
+    cache.max_bytes = 2 * entry_bytes
+    cache.rows(KEY, feeds[0], selections(feeds[0]))
+    cache.save()
+    assert sorted(entry['source'] for entry in cache.entries.values()) == ['a', 'c']
+    assert sorted(entry['source'] for entry in ResultCache(path).entries.values()) == ['a', 'c']
+    assert len(os.listdir(path)) == 3
+
+
+def test_save_keeps_entries_added_by_another_process(tmp_path):
+    path = str(tmp_path / 'cache')
+    first, second = ResultCache(path), ResultCache(path)
+    first.rows(KEY, segment('hour', 1), lambda: np.arange(3))
+    second.rows(KEY, segment('day', 1), lambda: np.arange(3))
+    first.save()
+    second.save()
+    assert sorted(entry['source'] for entry in ResultCache(path).entries.values()) == ['day', 'hour']
+
+
+def test_scanned_events_follow_the_feed_file(tmp_path):
+    feed_path = str(tmp_path / 'all_hour.atom')
+    with open(feed_path, 'w', encoding='utf-8') as feed:
+        feed.write('<feed/>')
+    events = list(segment('hour', 1))
+    cache = ResultCache(str(tmp_path / 'cache'))
+    assert cache.cached_events(KEY, feed_path) is None
+    cache.store_events(KEY, feed_path, events)
+    assert cache.cached_events(KEY, feed_path) == events
+    os.utime(feed_path, ns=(0, 0))
+    assert cache.cached_events(KEY, feed_path) is None
+    assert cache.entries == {}
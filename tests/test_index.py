@@ -0,0 +1,20 @@
+import os
+
+from atom_index import FeedIndex, open_index
+from atom_parallel import refresh_folders
+from test_scan import FEEDS
+
+
+def test_refresh_rebuilds_only_stale_feeds(tmp_path):
+    for i, name in enumerate(sorted(FEEDS)):
+        (tmp_path / f'{i}.atom').write_bytes(FEEDS[name])
+    folder = str(tmp_path)
+    assert refresh_folders([folder], workers=1) == len(FEEDS)
+    assert refresh_folders([folder], workers=1) == 0
+
+    stat = os.stat(tmp_path / '0.atom')
+    os.utime(tmp_path / '0.atom', ns=(stat.st_atime_ns, stat.st_mtime_ns + 1))
+    index = FeedIndex(folder)
+    assert [index.is_fresh(str(tmp_path / f'{i}.atom')) for i in range(2)] == [False, True]
+    assert refresh_folders([folder], workers=1) == 1
+    assert sum(len(segment) for segment in open_index(folder).segments) == 8
@@ -0,0 +1,51 @@
+import time
+from datetime import datetime, timedelta
+
+import atom_query
+from atom_cache import ResultCache
+from atom_feed import Event
+from atom_index import pack_events
+from atom_query import EventStore, Query
+
+NOW = time.time()
+
+
+def segment(*ages):
+    """A segment of events updated `ages` seconds ago."""
+    return pack_events([Event(f'id{i}', f'M 3.0 - Town {i}, CA', None, None, None, None, None, None,
+                              NOW - age, 3.0, None, None, None) for i, age in enumerate(ages)], 'feed')
+
+
+def test_last_stays_a_duration_in_the_key():
+    query = Query(last='24h')
+    assert query.start is None and query.relative()
+    assert query.key() == Query(last='24h').key()
+    assert Query.from_dict(query.to_dict()).key() == query.key()
+
+
+def test_last_counts_back_from_each_evaluation(monkeypatch):
+    events = segment(3600, 3 * 86400)
+    query = Query(last='2h')
+    assert list(query.select(events)) == [0]
+    assert [int(row) for row in query.iter_select(events)] == [0]
+
+    class Later(datetime):
+        @classmethod
+        def now(cls, tz=None):
+            return datetime.now(tz) + timedelta(hours=2)
+
+    monkeypatch.setattr(atom_query, 'datetime', Later)
+    assert list(query.select(events)) == []
+
+
+def test_last_past_the_end_matches_nothing():
+    assert list(Query(last='2h', end=NOW - 86400).select(segment(3600, 3 * 86400))) == []
+
+
+def test_relative_queries_bypass_the_result_cache(tmp_path):
+    events = segment(3600)
+    store = EventStore([], cache=ResultCache(str(tmp_path)))
+    store.select(Query(last='24h'), events)
+    assert store.cache.entries == {}
+    store.select(Query(magnitude='>=2'), events)
+    assert len(store.cache.entries) == 1
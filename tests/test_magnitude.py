@@ -0,0 +1,28 @@
+import pytest
+
+from atom_feed import Event
+from atom_filter import select_magnitude
+from atom_index import pack_events
+from atom_searchmagnitude import magnitude_range
+
+MAGNITUDES = [None, -0.5, 0.4, None, 1.2, 2.0, 2.9, None, 3.0, 4.7]
+
+
+def segment(magnitudes):
+    return pack_events([Event(f'id{i}', None, None, None, None, None, None, None, None, magnitude, None, None, None)
+                        for i, magnitude in enumerate(magnitudes)], 'feed')
+
+
+@pytest.mark.parametrize('option, accept', [
+    ('>=0', lambda value: True),
+    ('0', lambda value: value < 1),
+    ('<3', lambda value: value < 3),
+    ('<=2', lambda value: value < 3),
+    ('<2.5', lambda value: value < 2.5),
+    ('>2', lambda value: value >= 3),
+])
+def test_magnitude_options_skip_events_without_a_magnitude(option, accept):
+    # Both the partition path and, for wide ranges, the column scan fallback
+    for magnitudes in (MAGNITUDES, MAGNITUDES + [None] * 40, MAGNITUDES + [1.5] * 40):
+        rows = select_magnitude(segment(magnitudes), *magnitude_range(option))
+        assert [magnitudes[row] for row in rows] == [value for value in magnitudes if value is not None and accept(value)]
@@ -0,0 +1,28 @@
+import numpy as np
+
+from atom_feed import Event, merge_events
+from atom_index import merge_segments, pack_events
+
+
+def event(entry_id, time, magnitude, title):
+    return Event(entry_id, title, None, None, None, None, None, None, time, magnitude, None, None, None)
+
+
+HOUR = [event('a', 10.0, 2.5, 'M 2.5 - 5 km N of Anza, CA'), event('b', 20.0, None, 'M ? - Alaska')]
+DAY = [event('b', 25.0, 3.1, 'M 3.1 - 9 km S of Nikiski, Alaska'), event('a', 10.0, 2.6, 'M 2.6 - Anza, CA'),
+       event('c', None, 4.0, 'M 4.0 - Fiji region')]
+
+
+def test_merge_segments_matches_merge_events():
+    segments = [pack_events(HOUR, 'hour'), pack_events(DAY, 'day')]
+    merged = merge_segments(segments, 'both')
+    expected = pack_events(merge_events([HOUR, DAY]), 'both')
+    assert list(merged) == list(expected)
+    assert merged.places == expected.places and merged.tokens == expected.tokens
+    assert merged.buckets == expected.buckets
+    for name in ('postings', 'posting_offsets', 'bucket_rows', 'bucket_offsets', 'place'):
+        assert np.array_equal(np.asarray(getattr(merged, name)), np.asarray(getattr(expected, name)))
+
+
+def test_merge_segments_of_nothing():
+    assert len(merge_segments([], 'none')) == 0
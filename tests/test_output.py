@@ -0,0 +1,31 @@
+import os
+
+from atom_feed import Event
+from atom_index import iter_segment_blocks
+from atom_output import open_writer
+
+
+def event(entry_id, time, magnitude, title):
+    return Event(entry_id, title, None, None, None, None, None, None, time, magnitude, None, None, None)
+
+
+EVENTS = [event('a', 10.0, 2.5, 'M 2.5 - 5 km N of Anza, CA'), event('b', 20.0, None, 'M ? - Alaska')]
+
+
+def test_results_folder_is_created(tmp_path):
+    path = os.path.join(tmp_path, 'displayfiles', 'display_search_results.txt')
+    with open_writer(path, header="The following match everything") as writer:
+        writer.write_group('feed.atom', EVENTS)
+    with open(path, encoding='utf-8') as results:
+        assert 'Anza' in results.read()
+
+
+def test_binary_output_keeps_each_group_and_its_source(tmp_path):
+    path = os.path.join(tmp_path, 'results.idx')
+    with open_writer(path, 'binary') as writer:
+        writer.write_group('hour.atom', EVENTS)
+        writer.write_group('empty.atom', [])
+        writer.write_group('day.atom', EVENTS[:1])
+    blocks = list(iter_segment_blocks(path))
+    assert [block.source for block in blocks] == ['hour.atom', 'day.atom']
+    assert list(blocks[0]) == EVENTS and list(blocks[1]) == EVENTS[:1]
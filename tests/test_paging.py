@@ -0,0 +1,44 @@
+import pytest
+
+from atom_query import EventStore, Query
+from atom_sort import sort_events
+
+HEADER = (b'<?xml version="1.0" encoding="utf-8"?>\n'
+          b'<feed xmlns="http://www.w3.org/2005/Atom" xmlns:georss="http://www.georss.org/georss">\n')
+
+
+def feed(prefix, rows):
+    """A feed of (magnitude, depth km) entries; None leaves the value out."""
+    entries = []
+    for i, (magnitude, depth) in enumerate(rows):
+        title = b'M %.1f - Town, CA' % magnitude if magnitude is not None else b'Quarry blast - Town, CA'
+        elev = b'<georss:elev>-%d</georss:elev>' % (depth * 1000) if depth is not None else b''
+        entries.append(b'<entry><id>urn:%s:%d</id><title>%s</title><updated>2025-02-04T00:%02d:00.000Z</updated>'
+                       b'<georss:point>36.5 -121.1</georss:point>%s</entry>\n' % (prefix, i, title, i, elev))
+    return HEADER + b''.join(entries) + b'</feed>'
+
+
+@pytest.fixture
+def store(tmp_path):
+    (tmp_path / 'day.atom').write_bytes(feed(b'd', [(2.0, 5), (None, 3), (3.5, None), (2.0, None), (None, 5)]))
+    (tmp_path / 'hour.atom').write_bytes(feed(b'h', [(None, None), (3.5, 5), (1.0, 12), (None, 3)]))
+    return EventStore([str(tmp_path)], workers=1)
+
+
+@pytest.mark.parametrize('sort', ['magnitude', '-magnitude', 'depth', '-depth', None])
+@pytest.mark.parametrize('limit', [1, 2, 3])
+def test_pages_follow_the_unpaged_order(store, sort, limit):
+    # The unpaged results, each feed in order, agree with sort_events on the
+    # feed order; pages merge the feeds with ties broken by source then row
+    feeds = sorted((source, list(events)) for source, events in store.run(Query()))
+    assert sorted((source, list(events)) for source, events in store.run(Query(sort=sort))) == \
+        [(source, sort_events(events, sort)) for source, events in feeds]
+    expected = sort_events([event for _, events in feeds for event in events], sort)
+
+    paged, cursor = [], None
+    while True:
+        results, cursor = store.page(Query(sort=sort, limit=limit, after=cursor))
+        paged.extend(segment.event(row) for segment, row in results)
+        if cursor is None:
+            break
+    assert paged == expected
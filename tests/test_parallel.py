@@ -0,0 +1,30 @@
+import os
+
+import pytest
+
+from atom_parallel import find_feed_folders
+
+
+def feed_folder(root, name):
+    path = os.path.join(root, name)
+    os.makedirs(path)
+    with open(os.path.join(path, 'all_hour.atom'), 'w', encoding='utf-8') as feed:
+        feed.write('<feed xmlns="http://www.w3.org/2005/Atom"></feed>')
+    return path
+
+
+def test_root_and_glob_patterns_find_snapshot_folders(tmp_path):
+    first, second = feed_folder(tmp_path, '25-02-01'), feed_folder(tmp_path, '25-02-02')
+    assert find_feed_folders([str(tmp_path)]) == [first, second]
+    assert find_feed_folders([os.path.join(tmp_path, '25-02-0*')]) == [first, second]
+
+
+def test_patterns_without_feeds_are_reported(tmp_path):
+    folder = feed_folder(tmp_path, '25-02-01')
+    os.makedirs(os.path.join(tmp_path, 'empty'))
+    missing = [os.path.join(tmp_path, 'nonexistent_folder'), os.path.join(tmp_path, '26-*'),
+               os.path.join(tmp_path, 'empty')]
+    with pytest.raises(ValueError) as error:
+        find_feed_folders([folder] + missing)
+    assert all(pattern in str(error.value) for pattern in missing)
+    assert find_feed_folders([folder] + missing, strict=False) == [folder]
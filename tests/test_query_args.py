@@ -0,0 +1,42 @@
+import argparse
+
+import pytest
+
+from atom_query import Query, add_query_arguments, query_from_args
+
+
+def parse(*argv):
+    parser = argparse.ArgumentParser()
+    add_query_arguments(parser)
+    return query_from_args(parser.parse_args(argv))
+
+
+@pytest.mark.parametrize('argv', [
+    ('--time-from', '22', '--time-to', '02'),
+    ('--from', '2025-02-03', '--to', '2025-02-01'),
+])
+def test_reversed_windows_are_rejected(argv):
+    with pytest.raises(ValueError):
+        parse(*argv)
+
+
+def test_one_day_and_one_hour_windows():
+    query = parse('--from', '2025-02-03', '--to', '2025-02-03', '--time-from', '02', '--time-to', '02')
+    assert query.end - query.start == 86400
+    assert query.day_start == query.day_end == 7200
+
+
+@pytest.mark.parametrize('options', [
+    {'day_start': 7200, 'day_end': 3600},
+    {'day_start': 90000},
+    {'start': 86400, 'end': 3600},
+    {'start': 3600, 'end': 3600},
+])
+def test_query_rejects_reversed_windows(options):
+    with pytest.raises(ValueError):
+        Query(**options)
+
+
+def test_query_fills_in_a_missing_side_of_the_day_window():
+    assert (Query(day_start=3600).day_start, Query(day_start=3600).day_end) == (3600, 86400)
+    assert (Query(day_end=3600).day_start, Query(day_end=3600).day_end) == (0, 3600)
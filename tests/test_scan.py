@@ -0,0 +1,80 @@
+import tarfile
+
+import pytest
+
+from atom_cache import ResultCache
+from atom_feed import RawFeed, iter_events
+from atom_index import build_segment
+from atom_query import EventStore, Query
+
+HEADER = b'''<?xml version="1.0" encoding="utf-8"?>
+<feed xmlns="http://www.w3.org/2005/Atom" xmlns:georss="http://www.georss.org/georss">
+<title>USGS Magnitude 2.5+ Earthquakes, Past Day</title>
+'''
+
+
+def entry(number, magnitude, summary=b''):
+    return (b'<entry><id>urn:test:%d</id><title>M %.1f - 10 km N of Town %d, CA</title>'
+            b'<updated>2025-02-04T0%d:00:00.000Z</updated>'
+            b'<link rel="alternate" type="text/html" href="https://example.com/%d"/>%s'
+            b'<georss:point>36.5 -121.1</georss:point><georss:elev>-%d000</georss:elev></entry>\n'
+            % (number, magnitude, number, number, number, summary, number))
+
+
+FEEDS = {
+    'comment before the first entry': HEADER + b'<!-- <entry> -->\n' + entry(1, 3.1) + entry(2, 1.2) + b'</feed>',
+    'entry quoted in a summary': HEADER + entry(1, 3.1, b'<summary type="html"><![CDATA[<entry>oops</entry>]]></summary>')
+                                 + entry(2, 4.5) + b'</feed>',
+    'commented-out entry': HEADER + entry(1, 3.1) + b'<!--\n' + entry(7, 6.0) + b'-->\n' + entry(2, 4.5) + b'</feed>',
+    'fields quoted before the real ones': HEADER + entry(1, 3.1, b'<summary><![CDATA[<georss:elev>-1</georss:elev>'
+                                                                b'<title>M 9.9 - fake</title>]]></summary>')
+                                          + b'<?pi <entry> ?>' + entry(2, 2.0) + b'</feed>',
+}
+
+
+@pytest.fixture(params=sorted(FEEDS))
+def feed_path(request, tmp_path):
+    path = tmp_path / 'feed.atom'
+    path.write_bytes(FEEDS[request.param])
+    return str(path)
+
+
+def test_raw_feed_finds_the_parsed_entries(feed_path):
+    with open(feed_path, 'rb') as feed_file:
+        feed = RawFeed(feed_file.read())
+    parsed = list(iter_events(feed_path))
+    assert [feed.event(i) for i in range(len(feed))] == parsed
+    for field in ('magnitude', 'depth', 'time'):
+        assert feed.values(field, range(len(feed))) == [getattr(event, field) for event in parsed]
+
+
+@pytest.mark.parametrize('options', [{}, {'magnitude': '>=3'}, {'depth': '<5'}, {'magnitude': '<4', 'sort': '-depth'}])
+def test_scan_matches_index(feed_path, options):
+    query = Query(**options)
+    segment = build_segment(feed_path)
+    assert query.scan(feed_path, feed_path) == [segment.event(row) for row in query.select(segment)]
+
+
+def scan_batch(tmp_path, folders, workers, cache=None):
+    queries = [Query(), Query(magnitude='>=3', sort='-magnitude'), Query(depth='<5')]
+    jobs = [(query, str(tmp_path / f'out{workers}' / f'{i}.jsonl'), 'jsonl') for i, query in enumerate(queries)]
+    EventStore(folders, workers=workers, scan=True, cache=cache).write_batch(jobs)
+    return [open(path, encoding='utf-8').read() for _, path, _ in jobs]
+
+
+def test_pooled_scan_matches_serial_scan(tmp_path):
+    for name, numbers in (('25-02-04', (1, 2, 3)), ('25-02-05', (4, 5))):
+        (tmp_path / name).mkdir()
+        for number in numbers:
+            (tmp_path / name / f'all_hour_{number}.atom').write_bytes(
+                HEADER + entry(number, number * 0.9) + entry(number + 5, 4.4) + b'</feed>')
+    with tarfile.open(tmp_path / '25-02-06.tar.gz', 'w:gz') as archive:
+        archive.add(tmp_path / '25-02-05', arcname='25-02-06')
+    folders = [str(tmp_path / '25-02-04'), str(tmp_path / '25-02-06.tar.gz'), str(tmp_path / '25-02-05')]
+    serial = scan_batch(tmp_path, folders, 1)
+    assert scan_batch(tmp_path, folders, 2) == serial
+    cache = ResultCache(str(tmp_path / 'cache'))
+    assert scan_batch(tmp_path, folders, 2, cache) == serial
+    assert cache.hits == 0 and cache.misses
+    assert scan_batch(tmp_path, folders, 2, cache) == serial
+    assert cache.hits
@@ -0,0 +1,52 @@
+import numpy as np
+import pytest
+
+from atom_spatial import BoundingBox, GridIndex, Within, haversine_km
+
+RNG = np.random.default_rng(5)
+# Points spread over the globe, plus clusters at the poles and along the antimeridian
+LATITUDES = np.concatenate([RNG.uniform(-90, 90, 2000), RNG.uniform(85, 90, 300), RNG.uniform(-90, -85, 300),
+                            RNG.uniform(-30, 30, 300), [np.nan, 10.0]])
+LONGITUDES = np.concatenate([RNG.uniform(-180, 180, 2600), RNG.choice([-1, 1], 300) * RNG.uniform(175, 180, 300),
+                             [10.0, np.nan]])
+
+REGIONS = {
+    'box': BoundingBox(30, -125, 45, -110),
+    'box across the antimeridian': BoundingBox(-20, 170, 20, -170),
+    'circle across the antimeridian': Within(0, 179.5, 400),
+    'circle near the north pole': Within(89, 20, 500),
+    'circle near the south pole': Within(-88.5, -60, 300),
+    'circle wider than its latitude': Within(60, 0, 3500),
+    'circle around the globe': Within(0, 0, 30000),
+}
+
+
+@pytest.mark.parametrize('name', sorted(REGIONS))
+def test_grid_matches_a_full_scan(name):
+    region = REGIONS[name]
+    expected = np.flatnonzero(region.mask({'latitude': LATITUDES, 'longitude': LONGITUDES}))
+    assert len(expected)
+    for cell_degrees in (1.0, 7.5):
+        grid = GridIndex(LATITUDES, LONGITUDES, cell_degrees)
+        assert np.array_equal(grid.query(region, LATITUDES, LONGITUDES), expected)
+
+
+def test_circle_bounds_enclose_the_circle():
+    for circle in (Within(0, 179.5, 400), Within(70, -170, 900), Within(-45, 0, 100)):
+        south, north, lon_ranges = circle.bounds()
+        bearings = np.radians(np.arange(0, 360, 2.0))
+        angle = circle.radius_km / 6371.0088
+        lat = np.radians(circle.latitude)
+        edge_lats = np.arcsin(np.sin(lat) * np.cos(angle) + np.cos(lat) * np.sin(angle) * np.cos(bearings))
+        edge_lons = np.radians(circle.longitude) + np.arctan2(np.sin(bearings) * np.sin(angle) * np.cos(lat),
+                                                              np.cos(angle) - np.sin(lat) * np.sin(edge_lats))
+        edge_lats, edge_lons = np.degrees(edge_lats), (np.degrees(edge_lons) + 180) % 360 - 180
+        assert np.allclose(haversine_km(circle.latitude, circle.longitude, edge_lats, edge_lons), circle.radius_km)
+        assert np.all((edge_lats >= south - 1e-9) & (edge_lats <= north + 1e-9))
+        assert all(any(west - 1e-9 <= lon <= east + 1e-9 for west, east in lon_ranges) for lon in edge_lons)
+
+
+def test_bounds_across_the_antimeridian_and_near_the_poles():
+    assert len(Within(0, 179.5, 400).bounds()[2]) == 2
+    assert BoundingBox(-20, 170, 20, -170).bounds()[2] == [(170, 180.0), (-180.0, -170)]
+    assert Within(89, 20, 500).bounds()[1:] == (90.0, [(-180.0, 180.0)])
@@ -0,0 +1,32 @@
+import numpy as np
+
+from atom_feed import Event
+from atom_index import pack_events
+from atom_query import Query
+from atom_sort import SortedColumn, sorted_column
+from atom_store import build_store, open_store
+
+
+def event(number, time, magnitude):
+    return Event(f'id{number}', f'M {magnitude} - {number} km N of Anza, CA', None, None, None, None, None, None,
+                 time, magnitude, 33.5, -116.6, 10.0)
+
+
+SEGMENTS = [pack_events([event(1, 300.0, 2.5), event(2, None, 3.0), event(3, 100.0, 4.1)], 'hour'),
+            pack_events([event(4, 200.0, 1.0), event(5, 100.0, 2.2), event(6, None, 5.0)], 'day')]
+
+
+def test_store_time_index_is_the_records_in_order(tmp_path):
+    path = str(tmp_path / 'events.evs')
+    build_store(path, SEGMENTS)
+    with open_store(path) as store:
+        times = store.columns['time']
+        index, reference = sorted_column(store, 'time'), SortedColumn(np.asarray(times))
+        assert np.shares_memory(index.keys, store.records)
+        for name in ('rows', 'keys', 'missing'):
+            assert np.array_equal(getattr(index, name), getattr(reference, name))
+        expected = sorted(event for segment in SEGMENTS for event in segment
+                          if event.time is not None and 100.0 <= event.time < 300.0)
+        assert sorted(store.event(int(row)) for row in Query(start=100, end=300).select(store)) == expected
+        assert [store.event(int(row)).time for row in Query(sort='-time').select(store)] == \
+            [300.0, 200.0, 100.0, 100.0, None, None]
@@ -0,0 +1,41 @@
+import numpy as np
+import pytest
+
+from atom_feed import Event, location_tokens, tokenize
+from atom_index import pack_events
+from atom_textindex import lookup, select_place, select_text
+
+TITLES = ['M 1.0 - 2 km NNE of The Geysers, CA', 'M 2.1 - 10 km N of Geyserville, CA', 'M 4.5 - Fiji region',
+          'M 3.0 - 5 km SSE of Nikiski, Alaska', 'M 1.4 - 7 km NNW of The Geysers, CA', 'M ? - Northern California',
+          'M 2.2 - 15 km N of Nikolski, Alaska', 'M 5.0 - south of the Fiji Islands', None, 'M 1.1 - The Geysers, CA']
+SEGMENT = pack_events([Event(f'id{i}', title, None, None, None, None, None, None, None, None, None, None, None)
+                       for i, title in enumerate(TITLES)], 'feed')
+
+
+def reference(query, prefix):
+    """Rows matching every word of `query`, found by reading every title."""
+    terms = tokenize(query)
+    return [row for row, title in enumerate(TITLES) if terms and all(
+        any(word == term or (prefix and word.startswith(term)) for word in location_tokens(title))
+        for term in terms)]
+
+
+@pytest.mark.parametrize('query', ['geysers', 'gey', 'nne geysers', 'GEY ca', 'n ca', 'nik alaska', 'fiji fiji',
+                                   'fij isl', 'geysers ca km', 'of', 'km', 'alaska fiji', 'zzz', '', '12'])
+@pytest.mark.parametrize('prefix', [True, False])
+def test_text_search_matches_reading_every_title(query, prefix):
+    assert list(select_text(SEGMENT, query, prefix)) == reference(query, prefix)
+
+
+def test_lookup_exact_and_prefix():
+    assert list(lookup(SEGMENT, 'geysers')) == [0, 4, 9]
+    assert list(lookup(SEGMENT, 'geyser')) == []
+    assert list(lookup(SEGMENT, 'geyser', prefix=True)) == [0, 1, 4, 9]
+    assert list(lookup(SEGMENT, 'zz', prefix=True)) == []
+    assert lookup(SEGMENT, 'a', prefix=True).dtype == np.int32
+
+
+def test_place_is_matched_exactly_and_case_insensitively():
+    assert list(select_place(SEGMENT, 'ca')) == [0, 1, 4, 9]
+    assert list(select_place(SEGMENT, 'Alaska')) == [3, 6]
+    assert list(select_place(SEGMENT, 'Alask')) == []